@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/1.7/ref/settings/
 # Imports
 ##########################
 from django.utils.translation import ugettext_lazy as _
+from datetime import timedelta
 import os
 #from celery.schedules import crontab
 
@@ -164,7 +165,31 @@ INSTALLED_APPS = DEFAULT_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 # Celery settings
 #######################################
 CELERY_RESULT_BACKEND = 'djcelery.backends.database:DatabaseBackend'
-CELERYBEAT_SCHEDULE = {}
+
+# Catalogues are warmed in the worker's cache, so it has no effect on the web
+# processes while CACHES is the local memory cache (point it to a shared backend)
+CELERYBEAT_SCHEDULE = {
+    'warm-tour-catalogues': {
+        'task': 'vron.connector.tasks.warm_tour_catalogues',
+        'schedule': timedelta( minutes = 10 ),
+    },
+}
+
+
+
+
+
+########################################
+# Cache settings
+########################################
+# Local memory cache by default (per process). Point it to a shared backend
+# (memcached, redis) in production so all workers share RON sessions and catalogues
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'vron',
+    }
+}
 
 
 
@@ -184,4 +209,134 @@ ID_CONFIG_BASE_API_KEY = 7
 ID_LOG_STATUS_PENDING = 1
 ID_LOG_STATUS_COMPLETE_APPROVED = 2
 ID_LOG_STATUS_COMPLETE_REJECTED = 3
-ID_LOG_STATUS_ERROR = 4
\ No newline at end of file
+ID_LOG_STATUS_ERROR = 4
+
+
+
+
+########################################
+# RON Connection Settings
+########################################
+# Max idle keep-alive connections kept per RON url
+RON_POOL_SIZE = 10
+
+# Seconds an idle RON connection is kept before being dropped
+RON_POOL_IDLE_TIMEOUT = 60
+
+# Max seconds a RON connection waits to connect or for each read (socket timeout), so a hung call fails
+# well before BOOKING_LOCK_TIMEOUT
+RON_SOCKET_TIMEOUT = 15
+
+# Seconds a RON session id is shared between requests (keep it below RON's own session lifetime)
+RON_SESSION_TIMEOUT = 600
+
+# RON fault strings meaning the session has expired, matched as the whole fault string (case and a trailing
+# dot ignored). Login is done again and the call repeated, except for writeReservation (see Ron.call)
+RON_SESSION_EXPIRED_FAULTS = ( 'session expired', 'not logged in' )
+
+# Max concurrent RON calls per RON host (per process) when fanning out tour reads
+RON_MAX_IN_FLIGHT = 8
+
+# Threads of the pool (shared by all requests of a process) the concurrent RON calls run on
+RON_EXECUTOR_THREADS = 32
+
+# Seconds a tour catalogue (tour list of a host) is fresh, and extra seconds it's still served while reloading
+TOUR_CATALOGUE_TIMEOUT = 900
+TOUR_CATALOGUE_STALE_TIMEOUT = 86400
+
+# Max seconds a catalogue reload holds its lock
+TOUR_CATALOGUE_LOCK_TIMEOUT = 300
+
+# Reseller the catalogue of a host is warmed for until one is recorded on its key
+TOUR_CATALOGUE_DEFAULT_RESELLER_ID = ''
+
+# Max calls sent in a single RON system.multicall request
+RON_MULTICALL_SIZE = 60
+
+# Texts in a fault string meaning a method doesn't exist on the server (besides the -32601 fault code), and
+# seconds multicall isn't used for a RON server after answering system.multicall with one of them
+RON_UNKNOWN_METHOD_FAULTS = ( 'method not found', 'unknown method', 'not supported' )
+RON_MULTICALL_UNSUPPORTED_TIMEOUT = 3600
+
+# Max options sent in a single RON readTourAvailabilityRange call
+RON_AVAILABILITY_CHUNK_SIZE = 200
+
+# Seconds an availability result (per tour, basis, sub basis, tour time and date) is cached. A booking only
+# clears the slot on the cache of its own process while CACHES is the local memory cache, so other
+# processes may answer with the availability from before it for up to this long (keep it short)
+AVAILABILITY_CACHE_TIMEOUT = 10
+
+# Max seconds before a config/key change made on the admin reaches all processes (each process reads the
+# snapshot versions from the DB at most that often)
+SNAPSHOT_CHECK_INTERVAL = 1
+
+# Upper bounds (seconds) of the RON call latency histograms
+RON_METRICS_BUCKETS = ( 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30 )
+
+# Texts in a RON fault string and the class it's counted as (first match wins, 'other' otherwise)
+RON_FAULT_CLASSES = (
+    ( 'session expired', 'session_expired' ),
+    ( 'not logged in', 'session_expired' ),
+    ( 'insufficient pickup', 'insufficient_pickup' ),
+    ( 'availability', 'availability' ),
+    ( 'invalid', 'invalid_data' ),
+)
+
+
+
+
+
+########################################
+# Booking Settings
+########################################
+# Max seconds a booking is considered in flight. Keep it above 6 x RON_SOCKET_TIMEOUT, the RON calls of a
+# booking at worst (login and readTourPickups, again if the session expired, writeReservation and the pickup retry)
+BOOKING_LOCK_TIMEOUT = 120
+
+# Max seconds a retry of a booking in flight waits for it, and seconds between checks
+BOOKING_WAIT_TIMEOUT = 30
+BOOKING_POLL_INTERVAL = 0.2
+
+# Seconds a tour pickup list (per tour, time and basis) is cached
+PICKUP_CACHE_TIMEOUT = 300
+
+# Seconds a confirmation number is cached to answer retries (the request log is checked after that)
+BOOKING_CONFIRMATION_TIMEOUT = 86400
+
+# Queues bookings (answered as PENDING) to be written in RON by a celery worker. Requests with
+# 'sync' in the query string are still written right away (e.g. to get a confirmation number)
+BOOKING_ASYNC = False
+
+# Seconds before the first retry of a queued booking (doubled on each retry), and max seconds it's kept in flight
+BOOKING_RETRY_DELAY = 10
+BOOKING_ASYNC_LOCK_TIMEOUT = 3600
+
+
+
+
+
+########################################
+# Request Log Settings
+########################################
+# Writes request logs in a background thread (batched), instead of inside the request
+LOG_ASYNC = True
+
+# Max seconds a log event waits to be written, and max events written at once
+LOG_FLUSH_INTERVAL = 0.5
+LOG_BATCH_SIZE = 200
+
+
+
+
+
+########################################
+# Tracing Settings
+########################################
+# JSON lines file the request traces are written to, size it's rotated at and rotated files kept
+TRACE_FILE = os.path.join( BASE_DIR, '..', 'logs', 'traces.jsonl' )
+TRACE_MAX_BYTES = 10 * 1024 * 1024
+TRACE_BACKUP_COUNT = 5
+
+# Share of the requests traced (0 to 1), and seconds after which a request is always traced
+TRACE_SAMPLE_RATE = 0.05
+TRACE_SLOW_THRESHOLD = 2.0
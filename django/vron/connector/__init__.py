@@ -0,0 +1 @@
+default_app_config = 'vron.connector.apps.ConnectorConfig'
\ No newline at end of file
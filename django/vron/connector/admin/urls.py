@@ -42,6 +42,9 @@ urlpatterns = patterns('',
     url( r'^logs/details/(?P<log_id>\d+)$', views.log_details, name = 'log_details' ),
     url( r'^logs/delete/(?P<log_id>\d+)$', views.log_delete, name = 'log_delete' ),
 
+    # RON calls
+    url( r'^ron_calls/$', views.ron_call_list, name = 'ron_calls' ),
+
     # Test Request
     url( r'^test$', views.test, name = 'test' ),
 
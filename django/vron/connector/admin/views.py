@@ -11,6 +11,9 @@ from vron.core.decorators import restrict_internal_ips
 from vron.admin.views import admin_check
 from vron.connector.models import Config, Log, LogStatus, Key
 from vron.connector.admin.forms import ConfigForm, KeyForm, TestForm
+from vron.connector.api.ron_metrics import ron_metrics
+from vron.connector.api.ron_session import ron_sessions
+from vron.connector.tracing import tracer
 from django.conf import settings
 from vron.core.util import get_object_or_false
 from django.utils.html import strip_spaces_between_tags
@@ -401,8 +404,11 @@ def log_list_json( request ):
 
     # settings
     info = {
-        'fields_to_select': [ 'id', 'modified_date', 'external_reference', 'log_status.name' ],
-        'fields_to_search': [ 'id', 'external_reference', 'error_message', 'ron_confirmation_number' ],
+        'fields_to_select': [
+            'id', 'modified_date', 'external_reference', 'log_status.name', 'request_type',
+            'host_id', 'duration', 'ron_time', 'ron_calls', 'response_size'
+        ],
+        'fields_to_search': [ 'id', 'external_reference', 'error_message', 'ron_confirmation_number', 'request_type', 'host_id' ],
         'default_order_by': 'id',
         'url_base_name': 'log',
         'namespace': 'admin:connector:'
@@ -428,8 +434,9 @@ def log_details( request, log_id ):
     # Identifies database record
     log = get_object_or_404( Log, pk = log_id )
 
-    # Template data
-    context = { 'log': log }
+    # Template data (including the request traces written for it)
+    traces = tracer.read( log.external_reference ) if log.external_reference else []
+    context = { 'log': log, 'traces': traces }
 
     # Prints Template
     return render( request, 'connector/admin/log/details.html', context )
@@ -460,6 +467,30 @@ def log_delete( request, log_id ):
 
 
 
+#######################
+# RON CALL VIEWS
+#######################
+@restrict_internal_ips
+@permission_required( 'connector.admin_view_log', login_url = 'admin:login' )
+@user_passes_test( admin_check )
+def ron_call_list( request ):
+    """
+    Summarizes the RON calls made by this process (per method)
+
+    :param: request
+    :return: String
+    """
+
+    # Template data
+    context = { 'ron_calls': ron_metrics.get_summary(), 'ron_sessions': ron_sessions.get_stats() }
+
+    # Prints Template
+    return render( request, 'connector/admin/ron_call/list.html', context )
+
+
+
+
+
 #######################
 # TEST VIEWS
 #######################
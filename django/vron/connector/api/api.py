@@ -8,17 +8,22 @@ API Handling Class
 ##########################
 from lxml import etree, objectify
 from django.conf import settings
-from vron.core.util import get_object_or_false
-from vron.connector.models import Config, Key
-from vron.connector.tasks import log_request
+from django.utils import six
+from vron.connector.tasks import log_request, write_booking
+from vron.connector.snapshots import config_snapshot, key_snapshot
+from vron.connector.tracing import span, traced
 from vron.connector.api.xml_manager import XmlManager
 from vron.connector.api.ron import Ron
-from vron.connector.api.viator import Viator
-from vron.core.util import date_range
-from datetime import timedelta, date
-from operator import itemgetter
+from vron.connector.api.catalogue import tour_catalogue, iter_tour_list
+from vron.connector.api.viator import Viator, append_comment
+from vron.connector.api.booking_guard import booking_guard
+from vron.connector.api.pickups import pickup_cache, match_pickup_key
+from vron.connector.api.availability import AvailabilityOptions, availability_cache, get_tour_dates, parse_date
+import itertools
 import datetime
+import logging
 import codecs
+import time
 
 
 
@@ -34,26 +39,30 @@ class Api( object ):
 
     """
 
-    def __init__( self, xml_raw, mode = 'train' ):
+    def __init__( self, xml_raw, mode = 'train', async_booking = False ):
         """
         Constructor responsible to set class attributes and
         to process the right request
 
         :param: xml_raw
         :param: mode
+        :param: Boolean async_booking - queues bookings (answered as PENDING) instead of writing them in RON right away
         :return: None
         """
+        self.started = time.time()
 
-        # Gets all config from the DB
-        config_options = Config.objects.all()
-        config = {}
-        for config_option in config_options:
-            config[config_option.id] = config_option.value
+        # Gets all config (process-local snapshot, reloaded when changed on the admin)
+        with span( 'config' ):
+            config = config_snapshot.get()
 
         # Instantiates class attributes
         self.mode = mode
+        self.async_booking = async_booking
+        self.request_type = None
+        self.deferred_log = None
         self.config_info = config
-        self.request_xml = XmlManager( xml_raw )
+        with span( 'parse' ):
+            self.request_xml = XmlManager( xml_raw )
         self.response_xml = XmlManager()
         self.ron = Ron( config, mode )
         self.viator = Viator( self.request_xml, self.response_xml )
@@ -64,23 +73,46 @@ class Api( object ):
             'VRONERR002': 'Invalid API KEY',
             'VRONERR003': 'RON authentication failed',
             'VRONERR004': 'Nothing returned',
+            'VRONERR005': 'Booking already in progress',
         }
 
     def process( self ):
         """
         Executes the API actions and returns formatted
-        xml response.
+        xml response. The result of the request is logged once
+        the response is built, with the request stats
 
-        :return: XML
+        :return: XML - String, or a generator of strings for streamed responses
+        """
+        self.deferred_log = []
+        try:
+            response = self.process_request()
+        except Exception:
+            self.write_deferred_log()
+            raise
+
+        # Streamed responses log as pending when returned, and update it once they're sent
+        if isinstance( response, six.binary_type ):
+            self.write_deferred_log( len( response ) )
+        return response
+
+    def process_request( self ):
+        """
+        Calls the API method of the request
+
+        :return: XML - String, or a generator of strings for streamed responses
         """
         # If XML is valid, gets root tag name to call appropriate API method
         if self.request_xml.validated:
             tag = self.request_xml.get_tag_name()
             if 'BookingRequest' in tag:
+                self.request_type = 'booking'
                 return self.booking_request()
             elif 'AvailabilityRequest' in tag:
+                self.request_type = 'availability'
                 return self.availability_request()
             elif 'TourListRequest' in tag:
+                self.request_type = 'tour_list'
                 return self.tour_list_request()
             else:
                 return self.basic_error_response( 'Request not supported - ' + tag )
@@ -106,8 +138,8 @@ class Api( object ):
 
         :return: XML
         """
-        # Logs request in the background (using celery) and mark it as 'pending'
-        self.log_request( settings.ID_LOG_STATUS_PENDING, self.viator.get_external_reference() )
+        # Logs request and mark it as 'pending' (right away, the booking guard claims this log)
+        self.log_request( settings.ID_LOG_STATUS_PENDING, self.viator.get_external_reference(), wait = True )
 
         # Gets all required viator data and checks if any is empty
         booking_empty_check = self.viator.check_booking_data()
@@ -120,42 +152,148 @@ class Api( object ):
             self.log_request( settings.ID_LOG_STATUS_ERROR, self.viator.get_external_reference(), self.errors['VRONERR002'] )
             return self.viator.booking_response( '', '', 'VRONERR002', 'ApiKey', self.errors['VRONERR002'] )
 
-        # Logs in RON
-        if not self.ron.login( self.viator.get_distributor_id() ):
-            self.log_request( settings.ID_LOG_STATUS_ERROR, self.viator.get_external_reference(), self.errors['VRONERR003'] )
+        # Retries of a booking are answered with its confirmation number, without calling
+        # RON again (a retry arriving while the booking is being made waits for it)
+        external_reference = self.viator.get_external_reference()
+        if not booking_guard.acquire( external_reference, not self.async_booking ):
+            confirmation_number = booking_guard.get_confirmation( external_reference )
+            if confirmation_number:
+                self.log_request( settings.ID_LOG_STATUS_COMPLETE_APPROVED, external_reference, '', confirmation_number )
+                return self.viator.booking_response( confirmation_number, '' )
+            if self.async_booking:
+                return self.viator.booking_response( '', '', transaction_status = 'PENDING' )
+            self.log_request( settings.ID_LOG_STATUS_ERROR, external_reference, self.errors['VRONERR005'] )
+            return self.viator.booking_response( '', '', 'VRONERR005', 'ExternalReference', self.errors['VRONERR005'] )
+
+        # Queues the booking to be made by a worker and acknowledges it right away
+        record = self.viator.get_booking_record()
+        if self.async_booking and self.queue_booking( record ):
+            return self.viator.booking_response( '', '', transaction_status = 'PENDING' )
+
+        # Writes booking in RON
+        try:
+            booking_result = self.complete_booking( record )
+        finally:
+            booking_guard.release( external_reference )
+        if booking_result is None:
             return self.viator.booking_response( '', '', 'VRONERR003', 'ResellerId', self.errors['VRONERR003'] )
 
-        # Get tour pickups details if needed
-        pickup_point = self.viator.get_pickup_point()
+        # Returnx XML formatted response
+        return self.viator.booking_response( booking_result, self.ron.error_message )
+
+    def queue_booking( self, record ):
+        """
+        Sends the booking to the write_booking task (the booking
+        stays in flight until the task finishes)
+
+        :param: BookingRecord record
+        :return: Boolean - False when it couldn't be queued
+        """
+        booking_guard.hold( record.external_reference, settings.BOOKING_ASYNC_LOCK_TIMEOUT )
+        try:
+            write_booking.delay( dict( record._asdict() ), self.mode )
+        except Exception:
+            logging.getLogger( __name__ ).exception( 'Could not queue booking %s, writing it now', record.external_reference )
+            return False
+        return True
+
+    def queued_booking( self, record ):
+        """
+        Makes a booking queued by booking_request (called by the write_booking
+        task). RON connection errors are raised, so the task can retry it. The
+        task may run again for a booking already made (e.g. a worker died before
+        acknowledging it), which is then only logged with its confirmation number
+
+        :param: BookingRecord record
+        :return: None
+        """
+        self.request_type = 'booking'
+        confirmation_number = booking_guard.get_confirmation( record.external_reference )
+        if confirmation_number:
+            self.log_request( settings.ID_LOG_STATUS_COMPLETE_APPROVED, record.external_reference, '', confirmation_number )
+        elif not self.validate_api_key( record.api_key ):
+            self.log_request( settings.ID_LOG_STATUS_ERROR, record.external_reference, self.errors['VRONERR002'] )
+        else:
+            self.complete_booking( record )
+        booking_guard.release( record.external_reference )
+
+    def fail_queued_booking( self, record, error_message ):
+        """
+        Gives up a queued booking (the write_booking task ran out of attempts)
+
+        :param: BookingRecord record
+        :param: String error_message
+        :return: None
+        """
+        self.request_type = 'booking'
+        self.log_request( settings.ID_LOG_STATUS_ERROR, record.external_reference, error_message )
+        booking_guard.release( record.external_reference )
+
+    def complete_booking( self, record ):
+        """
+        Logs in RON, writes the booking (see write_booking) and logs the result
+
+        :param: BookingRecord record
+        :return: Mixed - None when RON login fails, confirmation number on success, False on failure
+        """
+        external_reference = record.external_reference
+
+        # Logs in RON
+        if not self.ron.login( record.distributor_id ):
+            self.log_request( settings.ID_LOG_STATUS_ERROR, external_reference, self.errors['VRONERR003'] )
+            return None
+
+        # Writes booking in RON
+        booking_result = self.write_booking( record )
+
+        # Logs response
+        if booking_result:
+            booking_guard.set_confirmation( external_reference, booking_result )
+            self.log_request( settings.ID_LOG_STATUS_COMPLETE_APPROVED, external_reference, '', booking_result )
+        else:
+            self.log_request( settings.ID_LOG_STATUS_COMPLETE_REJECTED, external_reference, 'Rejected or Error on RON request' )
+        return booking_result
+
+    def write_booking( self, record ):
+        """
+        Writes the reservation of a booking in RON (ron must be
+        logged in), retrying with a pickup when RON requires one
+
+        :param: BookingRecord record
+        :return: Mixed - confirmation number on success, False on failure
+        """
+        # Get tour pickups details if needed (pickup points not found default to the first pickup)
         pickup_key = ''
-        if pickup_point:
-            tour_pickups = self.ron.read_tour_pickups(
-                self.viator.get_tour_code(),
-                self.viator.get_tour_time_id(),
-                self.viator.get_basis_id()
-            )
-            pickup_key = self.viator.get_pickup_key( tour_pickups )
+        general_comments = record.general_comments
+        if record.pickup_point:
+            tour_pickups = pickup_cache.read( self.ron, record.tour_code, record.tour_time_id, record.basis_id )
+            pickup_key = match_pickup_key( tour_pickups, record.pickup_point )
+            if pickup_key is None:
+                pickup_key = ''
+                if tour_pickups and tour_pickups['pickups']:
+                    pickup_key = tour_pickups['pickups'][0]['strPickupKey']
+                general_comments = append_comment( general_comments, 'Pickup point: ' + str( record.pickup_point ) )
 
         # Creates reservation dictionary for RON
         reservation = {
-            'strCfmNo_Ext': self.viator.get_external_reference(),
-            'strTourCode': self.viator.get_tour_code(),
-            'strVoucherNo': self.viator.get_voucher_number(),
-            'intBasisID': self.viator.get_basis_id(),
-            'intSubBasisID': self.viator.get_sub_basis_id(),
-            'dteTourDate': self.viator.get_tour_date(),
-            'intTourTimeID': self.viator.get_tour_time_id(),
-            'strPaxFirstName': 'TEST PLEASE DELETE' if self.mode == 'live' else self.viator.get_first_name(),
-            'strPaxLastName': self.viator.get_last_name(),
-            'strPaxEmail': self.viator.get_email(),
-            'strPaxMobile': self.viator.get_mobile(),
-            'intNoPax_Adults': self.viator.get_pax_adults(),
-            'intNoPax_Infant': self.viator.get_pax_infants(),
-            'intNoPax_Child': self.viator.get_pax_child(),
-            'intNoPax_FOC': self.viator.get_pax_foc(),
-            'intNoPax_UDef1': self.viator.get_pax_udef1(),
+            'strCfmNo_Ext': record.external_reference,
+            'strTourCode': record.tour_code,
+            'strVoucherNo': record.voucher_number,
+            'intBasisID': record.basis_id,
+            'intSubBasisID': record.sub_basis_id,
+            'dteTourDate': record.tour_date,
+            'intTourTimeID': record.tour_time_id,
+            'strPaxFirstName': 'TEST PLEASE DELETE' if self.mode == 'live' else record.first_name,
+            'strPaxLastName': record.last_name,
+            'strPaxEmail': record.email,
+            'strPaxMobile': record.mobile,
+            'intNoPax_Adults': record.pax_adults,
+            'intNoPax_Infant': record.pax_infants,
+            'intNoPax_Child': record.pax_child,
+            'intNoPax_FOC': record.pax_foc,
+            'intNoPax_UDef1': record.pax_udef1,
             'strPickupKey': pickup_key,
-            'strGeneralComment': self.viator.get_general_comments(),
+            'strGeneralComment': general_comments,
         }
 
         # Writes booking in RON
@@ -177,24 +315,14 @@ class Api( object ):
         so then if we could resubmitt booking attempt, Picking the first Pickup From the readTourPickups list and Insert - "No Pickup Sent" (in the comments)
         """
         if 'insufficient pickup' in self.ron.error_message.lower():
-            # It means pickup is mandatory for this trip on RON
-            tour_pickups = self.ron.read_tour_pickups(
-                self.viator.get_tour_code(),
-                self.viator.get_tour_time_id(),
-                self.viator.get_basis_id()
-            )
-            reservation['strPickupKey'] = tour_pickups[0]['strPickupKey']
-            reservation['strGeneralComment'] += ' - No Pickup Sent'
-            booking_result = self.ron.write_reservation( reservation )
+            # It means pickup is mandatory for this trip on RON (pickups read above are reused)
+            tour_pickups = pickup_cache.read( self.ron, record.tour_code, record.tour_time_id, record.basis_id )
+            if tour_pickups and tour_pickups['pickups']:
+                reservation['strPickupKey'] = tour_pickups['pickups'][0]['strPickupKey']
+                reservation['strGeneralComment'] += ' - No Pickup Sent'
+                booking_result = self.ron.write_reservation( reservation )
 
-        # Logs response
-        if booking_result:
-            self.log_request( settings.ID_LOG_STATUS_COMPLETE_APPROVED, self.viator.get_external_reference(), '', booking_result )
-        else:
-            self.log_request( settings.ID_LOG_STATUS_COMPLETE_REJECTED, self.viator.get_external_reference(), 'Rejected or Error on RON request' )
-
-        # Returnx XML formatted response
-        return self.viator.booking_response( booking_result, self.ron.error_message )
+        return booking_result
 
     def availability_request( self ):
         """
@@ -224,97 +352,47 @@ class Api( object ):
 
 
         # Initial settings for query
-        options = []
         basis_id = self.viator.get_basis_id()
         start_date = self.viator.get_start_date()
         end_date = self.viator.get_end_date()
         tour_code = self.viator.get_tour_code()
-        interval_start_date = ''
-        interval_end_date = ''
 
-        # If there's an end date, we need these 2 dates to calculate the interval
+        # If there's an end date, all dates in the interval are searched (date strings are built only once)
         if end_date:
-            interval_start_date = self.request_xml.get_element_text( 'StartDate' )
-            if interval_start_date:
-                try:
-                    year, month, day = itemgetter( 0, 1, 2) ( interval_start_date.split( '-' ) )
-                    interval_start_date = date( int( year ), int( month ), int( day ) )
-                except ValueError:
-                    interval_start_date = ''
-            interval_end_date = self.request_xml.get_element_text( 'EndDate' )
-            if interval_end_date:
-                try:
-                    year, month, day = itemgetter( 0, 1, 2) ( interval_end_date.split( '-' ) )
-                    interval_end_date = date( int( year ), int( month ), int( day ) )
-                except ValueError:
-                    interval_end_date = ''
+            tour_dates = get_tour_dates(
+                start_date,
+                parse_date( self.viator.get_root_element_text( 'StartDate' ) ),
+                parse_date( self.viator.get_root_element_text( 'EndDate' ) )
+            )
+        else:
+            tour_dates = get_tour_dates( start_date )
+        options = AvailabilityOptions( self.ron.host_id, tour_code, tour_dates )
 
         # Determines what product options should be searched
         if basis_id:
-            base_option = {
-                'strHostID': self.ron.host_id,
-                'strTourCode': tour_code,
-                'intBasisID': basis_id,
-                'intSubBasisID': self.viator.get_sub_basis_id(),
-                'intTourTimeID': self.viator.get_tour_time_id(),
-                'dteTourDate': start_date,
-            }
-            options.append( base_option )
-
-            # if there's and END-DATE here, add all dates in the interval to the options
-            if interval_start_date and interval_end_date:
-                count = 0
-                for single_date in date_range( interval_start_date, interval_end_date ):
-                    if count:
-                        option = {
-                            'strHostID': base_option['strHostID'],
-                            'strTourCode': base_option['strTourCode'],
-                            'intBasisID': base_option['intBasisID'],
-                            'intSubBasisID': base_option['intSubBasisID'],
-                            'intTourTimeID': base_option['intTourTimeID'],
-                            'dteTourDate': single_date.strftime( "%Y-%b-%d" ),
-                        }
-                        options.append( option )
-                    count += 1
+            options.add_product( basis_id, self.viator.get_sub_basis_id(), self.viator.get_tour_time_id() )
         else:
 
             # Gets all options for this product
-            tour_times = self.ron.read_tour_times( tour_code )
-            tour_bases = self.ron.read_tour_bases( tour_code )
+            with self.ron.batch() as batch:
+                tour_times = batch.read_tour_times( tour_code )
+                tour_bases = batch.read_tour_bases( tour_code )
+            tour_times = tour_times.value
+            tour_bases = tour_bases.value
             if not tour_times or not tour_bases:
                 self.log_request( settings.ID_LOG_STATUS_ERROR, self.viator.get_external_reference(), self.errors['VRONERR004'] )
                 return self.viator.availability_response( '', '', 'VRONERR004', 'SupplierProductCode', self.errors['VRONERR004'] )
             for tour_time in tour_times:
                 for tour_base in tour_bases:
-                    base_option = {
-                        'strHostID': self.ron.host_id,
-                        'strTourCode': tour_code,
-                        'intBasisID': tour_base['intBasisID'],
-                        'intSubBasisID': tour_base['intSubBasisID'],
-                        'intTourTimeID': tour_time['intTourTimeID'],
-                        'dteTourDate': start_date,
-                    }
-                    options.append( base_option )
-                    if interval_start_date and interval_end_date:
-                        count = 0
-                        for single_date in date_range( interval_start_date, interval_end_date ):
-                            if count:
-                                option = {
-                                    'strHostID': base_option['strHostID'],
-                                    'strTourCode': base_option['strTourCode'],
-                                    'intBasisID': base_option['intBasisID'],
-                                    'intSubBasisID': base_option['intSubBasisID'],
-                                    'intTourTimeID': base_option['intTourTimeID'],
-                                    'dteTourDate': single_date.strftime( "%Y-%b-%d" ),
-                                }
-                                options.append( option )
-                            count += 1
-
-        # Makes availability request in RON
-        availability_results = self.ron.read_tour_availability_range( options )
+                    options.add_product( tour_base['intBasisID'], tour_base['intSubBasisID'], tour_time['intTourTimeID'] )
 
-        # Logs response
-        self.log_request( settings.ID_LOG_STATUS_COMPLETE_APPROVED, self.viator.get_external_reference() )
+        # Makes availability requests in RON for the slots not cached (concurrent bounded chunks, so payloads stay small)
+        availability_results, errors = availability_cache.read( self.ron, options, settings.RON_AVAILABILITY_CHUNK_SIZE )
+        if errors:
+            self.ron.error_message = '; '.join( errors )
+
+        # Logs response (with the chunks that failed, if any)
+        self.log_request( settings.ID_LOG_STATUS_COMPLETE_APPROVED, self.viator.get_external_reference(), self.ron.error_message or None )
 
         # Returnx XML formatted response
         return self.viator.availability_response( availability_results, self.ron.error_message )
@@ -346,76 +424,164 @@ class Api( object ):
             return self.viator.tour_list_response( '', '', 'VRONERR003', 'ResellerId', self.errors['VRONERR003'] )
 
 
-        # Initial settings for the query
-        tour_list = []
+        # Serves the tour list from the catalogue cache (reloading it in the background when stale)
+        catalogue = tour_catalogue.get( self.mode, self.ron.host_id, self.viator.get_distributor_id() )
+        if catalogue:
+            tours = iter( catalogue['tour_list'] )
+            cache_tour_list = False
+            if not tour_catalogue.is_fresh( catalogue ):
+                tour_catalogue.refresh_in_background( self.config_info, self.mode, self.ron.host_id, self.viator.get_distributor_id() )
+        else:
 
-        # Gets a list of tours for this host/reseller
-        tours = self.ron.read_tours()
-        if not tours:
-            self.log_request( settings.ID_LOG_STATUS_ERROR, self.viator.get_external_reference(), self.errors['VRONERR004'] )
-            return self.viator.tour_list_response( '', '', 'VRONERR004', 'SupplierId', self.errors['VRONERR004'] )
-        for tour in tours:
-
-            # Reads data from this tour
-            tour_info = {}
-            tour_code = tour['strTourCode']
-            tour_name = tour['strTourName']
-
-            # Gets all options for this tour
-            tour_times = self.ron.read_tour_times( tour_code )
-            tour_bases = self.ron.read_tour_bases( tour_code )
-            tour_web_details = self.ron.read_tour_web_details( tour_code )
-            if tour_times and tour_bases and tour_web_details:
-
-                # Stores relevant information from this tour (required for viator response later)
-                tour_info['tour'] = {
-                    'tour_code': tour_code,
-                    'tour_name': tour_name,
-                    'country_code': 'AU', #TODO get this from RON
-                    'destination_code': 'CNS', #TODO get this from RON
-                    'destination_name': 'Cairns', #TODO get this from RON
-                    'tour_description': tour_web_details['strCatchPhrase'].encode( 'ascii', 'ignore' )
-                }
-                tour_info['options'] = []
-
-                # Captures tour options to be stored too
-                for tour_time in tour_times:
-                    for tour_base in tour_bases:
-                        option = {
-                            'option_code': tour_base['intBasisID'],
-                            'option_name': tour_base['strBasisDesc'],
-                            'departure_time': tour_time['dteTourTime']['iso8601'],
-                            'basis_id': tour_base['intBasisID'],
-                            'sub_basis_id': tour_base['intSubBasisID'],
-                            'tour_time_id': tour_time['intTourTimeID'],
-                        }
-                        tour_info['options'].append( option )
-                tour_list.append( tour_info )
-
-        # Nothing found
-        if len( tour_list ) == 0:
+            # Gets a list of tours for this host/reseller (read while the response is sent)
+            tours = iter_tour_list( self.ron )
+            cache_tour_list = True
+            if tours is None:
+                self.log_request( settings.ID_LOG_STATUS_ERROR, self.viator.get_external_reference(), self.errors['VRONERR004'] )
+                return self.viator.tour_list_response( '', '', 'VRONERR004', 'SupplierId', self.errors['VRONERR004'] )
+
+        # Nothing found (waits for the first tour before answering)
+        first_tour = next( tours, None )
+        if first_tour is None:
             self.log_request( settings.ID_LOG_STATUS_ERROR, self.viator.get_external_reference(), self.errors['VRONERR004'] )
             return self.viator.tour_list_response( '', '', 'VRONERR004', 'SupplierProductCode', self.errors['VRONERR004'] )
 
-        # Logs response
-        self.log_request( settings.ID_LOG_STATUS_COMPLETE_APPROVED, self.viator.get_external_reference() )
+        # Returns XML formatted response, streamed while the tours are read
+        return self.stream_tour_list( itertools.chain( [first_tour], tours ), cache_tour_list )
 
-        # Returnx XML formatted response
-        return self.viator.tour_list_response( tour_list, self.ron.error_message )
+    def stream_tour_list( self, tours, cache_tour_list ):
+        """
+        Returns the tour list response, streamed in parts (see iter_tour_list_parts)
+
+        The request is logged as pending, with its stats so far, before the
+        response is returned: the stream may never be read (e.g. the client
+        disconnected first), so it only updates that log
+
+        :param: Iterator tours
+        :param: Boolean cache_tour_list
+        :return: Generator
+        """
+        self.write_log( settings.ID_LOG_STATUS_PENDING, self.viator.get_external_reference(), stats = self.get_stats() )
+        return self.iter_tour_list_parts( tours, cache_tour_list )
+
+    def iter_tour_list_parts( self, tours, cache_tour_list ):
+        """
+        Yields the tour list response in parts, one Tour at a time, then
+        stores the tour list in the catalogue and logs the request
+
+        HTTP 200 and the SUCCESS status go out with the first part, so errors
+        after it can't be reported as an error response: the list ends early
+        (as a well formed document), isn't cached and the error is logged. The
+        request is also logged (as an error, with the bytes sent) when the
+        stream is closed before the end, e.g. the client disconnected
+
+        :param: Iterator tours
+        :param: Boolean cache_tour_list
+        :return: Generator
+        """
+        tour_list = []
+        def read_tours():
+            for tour in tours:
+                tour_list.append( tour )
+                yield tour
+        errors = []
+        def tour_list_failed( error ):
+            logging.getLogger( __name__ ).exception( 'Tour list %s ended early', self.viator.get_external_reference() )
+            errors.append( error )
+        response_size = 0
+        completed = False
+        try:
+            for part in self.viator.iter_tour_list_response( read_tours(), self.ron.error_message, on_error = tour_list_failed ):
+                response_size += len( part )
+                yield part
+            completed = not errors
+        finally:
+
+            # Logs response
+            if completed:
+                self.log_request( settings.ID_LOG_STATUS_COMPLETE_APPROVED, self.viator.get_external_reference() )
+            elif errors:
+                self.log_request( settings.ID_LOG_STATUS_ERROR, self.viator.get_external_reference(),
+                                  u'Tour list ended early ({0} tours read): {1}'.format( len( tour_list ), six.text_type( errors[0] ) ) )
+            else:
+                self.log_request( settings.ID_LOG_STATUS_ERROR, self.viator.get_external_reference(),
+                                  u'Tour list not sent completely ({0} tours read)'.format( len( tour_list ) ) )
+            self.write_deferred_log( response_size )
+
+        # Stores tour list (only when complete)
+        if completed and cache_tour_list:
+            tour_catalogue.set( self.mode, self.ron.host_id, self.viator.get_distributor_id(), tour_list )
 
-    def log_request( self, log_status_id, external_reference, error_message = None, confirmation_number = None ):
+    def log_request( self, log_status_id, external_reference, error_message = None, confirmation_number = None, wait = False ):
         """
-        Saves request info to the database
+        Saves request info to the database. While a request is processed (see
+        process), its result is only written once the response is built (and
+        requests without an external reference only log their result)
 
         :param: log_status_id
         :param: external_reference
         :param: error_message
         :param: confirmation_number
+        :param: Boolean wait - writes a pending log right away (not in the background)
         :return: Boolean
         """
+        if log_status_id == settings.ID_LOG_STATUS_PENDING and ( external_reference is not None or self.deferred_log is None ):
+            self.write_log( log_status_id, external_reference, error_message, confirmation_number, wait = wait )
+        elif self.deferred_log is not None:
+            self.deferred_log.append( ( log_status_id, external_reference, error_message, confirmation_number ) )
+        else:
+            self.write_log( log_status_id, external_reference, error_message, confirmation_number, self.get_stats() )
+
+    def write_deferred_log( self, response_size = None ):
+        """
+        Writes the log events held while the request was processed
+
+        :param: Integer response_size - bytes of the response (None when unknown)
+        :return: None
+        """
+        events, self.deferred_log = self.deferred_log or [], None
+
+        # Events without an external reference can't update each other, only the last one is written
+        anonymous = [event for event in events if event[1] is None]
+        events = [event for event in events if event[1] is not None] + anonymous[-1:]
+        for log_status_id, external_reference, error_message, confirmation_number in events:
+            self.write_log( log_status_id, external_reference, error_message, confirmation_number, self.get_stats( response_size ) )
+
+    @traced( 'log' )
+    def write_log( self, log_status_id, external_reference, error_message = None, confirmation_number = None, stats = None,
+                   wait = False ):
+        """
+        Sends a log event to the log writer
+
+        :param: log_status_id
+        :param: external_reference
+        :param: error_message
+        :param: confirmation_number
+        :param: Dictionary stats - see get_stats
+        :param: Boolean wait - writes it right away
+        :return: None
+        """
         # sends to the background with celery
-        log_request( external_reference, log_status_id, error_message, confirmation_number )
+        log_request( external_reference, log_status_id, error_message, confirmation_number, stats, wait )
+
+    def get_stats( self, response_size = None ):
+        """
+        Returns the stats of the request so far, stored with its log
+
+        :param: Integer response_size - bytes of the response (None when unknown)
+        :return: Dictionary - request_type, host_id, duration and ron_time (seconds),
+                 ron_calls (made by this request, executor threads included) and response_size
+        """
+        return {
+            'request_type': self.request_type,
+            'host_id': self.ron.host_id or None,
+            'duration': round( time.time() - self.started, 3 ),
+            'ron_time': round( self.ron.call_time, 3 ),
+            'ron_calls': self.ron.call_count,
+            'response_size': response_size,
+        }
 
+    @traced( 'validate_api_key' )
     def validate_api_key( self, api_key ):
         """
         Checks if API key is valid
@@ -426,11 +592,10 @@ class Api( object ):
         base_key = self.config_info[settings.ID_CONFIG_BASE_API_KEY]
         if api_key is not None and base_key in api_key:
             host_id = api_key.replace( base_key, '' )
-            self.viator.host_id = host_id
+            self.viator.record.host_id = host_id
             self.ron.host_id = host_id
 
-            # Searches for key/host_id in the DB
-            key = get_object_or_false( Key, name = self.ron.host_id )
-            if key:
-                return True
+            # Searches for key/host_id in the in-memory index (keys added or deleted on the
+            # admin reach every process within SNAPSHOT_CHECK_INTERVAL)
+            return host_id in key_snapshot.get()
         return False
\ No newline at end of file
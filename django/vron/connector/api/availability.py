@@ -0,0 +1,304 @@
+"""
+Availability Options
+
+Expands the product options (basis, sub basis and tour time) of an
+availability request over its dates into the options expected by RON's
+readTourAvailabilityRange, lazily and in bounded chunks, and reads their
+availability from RON concurrently.
+
+Availability results are cached per slot for a short time, so repeated
+polls only read the slots missing from the cache. Bookings clear the slot
+they booked, but only on every process when CACHES is a shared backend,
+which is why results are kept for a few seconds only.
+
+"""
+
+##########################
+# Imports
+##########################
+from django.conf import settings
+from django.core.cache import cache
+from vron.core.util import date_range
+from vron.connector.api.ron_executor import ron_executor
+from datetime import date
+from itertools import islice
+from collections import OrderedDict, deque
+import xmlrpclib
+
+
+
+
+
+##########################
+# Function definitions
+##########################
+def parse_date( text ):
+    """
+    Converts a 'YYYY-MM-DD' string to a date
+
+    :param: String text
+    :return: Mixed - date on success, None on failure
+    """
+    if not text:
+        return None
+    try:
+        year, month, day = text.split( '-' )[:3]
+        return date( int( year ), int( month ), int( day ) )
+    except ValueError:
+        return None
+
+
+def get_tour_dates( start_date, interval_start_date = None, interval_end_date = None ):
+    """
+    Returns the RON formatted dates to be searched: the start date (already
+    formatted) and every following date of the interval, if there's one
+
+    :param: String start_date
+    :param: date interval_start_date
+    :param: date interval_end_date
+    :return: List
+    """
+    tour_dates = [start_date]
+    if interval_start_date and interval_end_date:
+        for single_date in islice( date_range( interval_start_date, interval_end_date ), 1, None ):
+            tour_dates.append( single_date.strftime( "%Y-%b-%d" ) )
+    return tour_dates
+
+
+def chunked( options, size ):
+    """
+    Yields lists of up to 'size' options
+
+    :param: Iterable options
+    :param: Integer size
+    :return: Generator
+    """
+    options = iter( options )
+    chunk = list( islice( options, size ) )
+    while chunk:
+        yield chunk
+        chunk = list( islice( options, size ) )
+
+
+def read_availability( ron, chunks ):
+    """
+    Reads the availability of chunks of options from RON, sending them
+    concurrently (up to RON_MAX_IN_FLIGHT per host). Chunks are taken in
+    waves, so only a few of them are in memory at once. Yields the results
+    and error of every chunk, in the chunks order (empty chunks aren't sent)
+
+    :param: Ron ron
+    :param: Iterable chunks - lists of options
+    :return: Generator of tuples ( List results, String error )
+    """
+    def read_chunk( chunk ):
+        if not chunk:
+            return [], None
+        try:
+            return ron.call( 'readTourAvailabilityRange', chunk ) or [], None
+        except xmlrpclib.Fault as error:
+            return [], error.faultString
+
+    chunks = iter( chunks )
+    wave = list( islice( chunks, ron_executor.max_in_flight ) )
+    while wave:
+        for chunk_results, error in ron_executor.map( ron.url, read_chunk, wave ):
+            yield chunk_results, error
+        wave = list( islice( chunks, ron_executor.max_in_flight ) )
+
+
+
+
+
+##########################
+# Class definitions
+##########################
+class AvailabilityOptions( object ):
+    """
+    Product options x dates of an availability request,
+    generated on demand
+
+    """
+
+    def __init__( self, host_id, tour_code, tour_dates ):
+        """
+        Constructor responsible to set class attributes
+
+        :param: String host_id
+        :param: String tour_code
+        :param: List tour_dates - RON formatted dates
+        :return: None
+        """
+        self.host_id = host_id
+        self.tour_code = tour_code
+        self.tour_dates = tour_dates
+        self.products = []
+
+    def add_product( self, basis_id, sub_basis_id, tour_time_id ):
+        """
+        Adds a product option to be searched on all dates
+
+        :param: basis_id
+        :param: sub_basis_id
+        :param: tour_time_id
+        :return: None
+        """
+        self.products.append( ( basis_id, sub_basis_id, tour_time_id ) )
+
+    def __len__( self ):
+        return len( self.products ) * len( self.tour_dates )
+
+    def __iter__( self ):
+        """
+        Yields the RON options, product by product, date by date
+
+        :return: Generator
+        """
+        for basis_id, sub_basis_id, tour_time_id in self.products:
+            for tour_date in self.tour_dates:
+                yield {
+                    'strHostID': self.host_id,
+                    'strTourCode': self.tour_code,
+                    'intBasisID': basis_id,
+                    'intSubBasisID': sub_basis_id,
+                    'intTourTimeID': tour_time_id,
+                    'dteTourDate': tour_date,
+                }
+
+    def chunks( self, size ):
+        """
+        Yields lists of up to 'size' options
+
+        :param: Integer size
+        :return: Generator
+        """
+        return chunked( self, size )
+
+
+class AvailabilityCache( object ):
+    """
+    Short lived cache of RON availability results, per slot
+    (mode, host, tour code, basis, sub basis, tour time and date)
+
+    """
+
+    def __init__( self, timeout ):
+        """
+        Constructor responsible to set class attributes
+
+        :param: Integer timeout - seconds a result is kept
+        :return: None
+        """
+        self.timeout = timeout
+
+    def get_key( self, mode, host_id, tour_code, basis_id, sub_basis_id, tour_time_id, tour_date ):
+        """
+        Returns the cache key of a slot (ids are compared as strings
+        and dates ignoring case, as RON and Viator format them differently)
+
+        :return: String
+        """
+        key = u'availability:{0}:{1}:{2}:{3}:{4}:{5}:{6}'.format(
+            mode, host_id, tour_code, basis_id, sub_basis_id, tour_time_id, str( tour_date ).lower()
+        )
+        return key.replace( ' ', '_' ).encode( 'utf-8' )
+
+    def get_option_key( self, mode, option ):
+        """
+        Returns the cache key of a RON option (or result)
+
+        :param: String mode
+        :param: Dictionary option
+        :return: String
+        """
+        return self.get_key(
+            mode, option['strHostID'], option['strTourCode'], option['intBasisID'],
+            option['intSubBasisID'], option['intTourTimeID'], option['dteTourDate']
+        )
+
+    def set_many( self, mode, host_id, tour_code, results ):
+        """
+        Stores RON results
+
+        :param: String mode
+        :param: String host_id
+        :param: String tour_code
+        :param: List results
+        :return: None
+        """
+        values = {}
+        for result in results:
+            key = self.get_key(
+                mode, host_id, tour_code, result['intBasisID'], result['intSubBasisID'],
+                result['intTourTimeID'], result['dteTourDate']
+            )
+            values[key] = result
+        if values:
+            cache.set_many( values, self.timeout )
+
+    def delete( self, mode, host_id, tour_code, basis_id, sub_basis_id, tour_time_id, tour_date ):
+        """
+        Removes a slot (e.g. after a reservation)
+
+        :return: None
+        """
+        cache.delete( self.get_key( mode, host_id, tour_code, basis_id, sub_basis_id, tour_time_id, tour_date ) )
+
+    def read( self, ron, options, chunk_size ):
+        """
+        Returns the availability of the options, reading
+        from RON only the slots that are not cached
+
+        The options are expanded once, a chunk at a time: each chunk is looked
+        up in the cache and only its missing slots are sent to RON
+
+        :param: Ron ron
+        :param: AvailabilityOptions options
+        :param: Integer chunk_size
+        :return: Tuple ( List results, List errors )
+        """
+        lookups = deque()
+        def get_missing():
+            for chunk in options.chunks( chunk_size ):
+                keys = [self.get_option_key( ron.mode, option ) for option in chunk]
+                cached = cache.get_many( keys )
+                lookups.append( ( keys, cached ) )
+                yield [option for option, key in zip( chunk, keys ) if key not in cached]
+
+        results = []
+        errors = []
+        total_chunks = ( len( options ) + chunk_size - 1 ) // chunk_size
+        for number, ( chunk_results, error ) in enumerate( read_availability( ron, get_missing() ), 1 ):
+            keys, cached = lookups.popleft()
+            if error is not None:
+                errors.append( 'Chunk {0}/{1}: {2}'.format( number, total_chunks, error ) )
+            self.set_many( ron.mode, options.host_id, options.tour_code, chunk_results )
+            if not cached:
+                results.extend( chunk_results )
+                continue
+
+            # Merges cached and new results in the options order (results RON returned
+            # for slots that don't match any option are kept at the end of the chunk)
+            fetched = OrderedDict()
+            for result in chunk_results:
+                key = self.get_key(
+                    ron.mode, options.host_id, options.tour_code, result['intBasisID'],
+                    result['intSubBasisID'], result['intTourTimeID'], result['dteTourDate']
+                )
+                fetched[key] = result
+            for key in keys:
+                if key in cached:
+                    results.append( cached[key] )
+                elif key in fetched:
+                    results.append( fetched.pop( key ) )
+            results.extend( fetched.values() )
+        return results, errors
+
+
+
+
+
+##########################
+# Cache instance
+##########################
+availability_cache = AvailabilityCache( settings.AVAILABILITY_CACHE_TIMEOUT )
@@ -0,0 +1,190 @@
+"""
+Booking Guard
+
+Makes BookingRequests idempotent by ExternalReference. Viator retries
+bookings on timeout, so a retry of a confirmed booking is answered with
+its confirmation number instead of writing the reservation in RON again,
+and a retry arriving while the booking is still being made waits for it
+to finish.
+
+Bookings are claimed on their request log (unique by external reference)
+with a conditional UPDATE, so only one request or task of any process can
+make a booking at a time, and the confirmation number is stored on the same
+log before the claim is released. The cache only keeps confirmation numbers
+already read from the DB (the default cache is local to each process).
+
+"""
+
+##########################
+# Imports
+##########################
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction, IntegrityError
+from django.db.models import Q
+from django.utils import timezone
+from vron.connector.models import Log
+import datetime
+import time
+
+
+
+
+
+##########################
+# Class definitions
+##########################
+class BookingGuard( object ):
+    """
+    In-flight and completed bookings by external reference
+
+    """
+
+    def __init__( self, lock_timeout, wait_timeout, poll_interval, confirmation_timeout ):
+        """
+        Constructor responsible to set class attributes
+
+        :param: Integer lock_timeout - max seconds a booking is considered in flight
+        :param: Integer wait_timeout - max seconds a duplicate waits for the booking in flight
+        :param: Float poll_interval - seconds between checks while waiting
+        :param: Integer confirmation_timeout - seconds a confirmation number is cached
+        :return: None
+        """
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.confirmation_timeout = confirmation_timeout
+
+    def get_key( self, external_reference ):
+        """
+        Returns the cache key of a booking confirmation
+
+        :param: String external_reference
+        :return: String
+        """
+        return u'booking:{0}'.format( external_reference ).encode( 'utf-8' )
+
+    def get_confirmation( self, external_reference ):
+        """
+        Returns the confirmation number of a completed booking (or None)
+
+        :param: String external_reference
+        :return: Mixed
+        """
+        confirmation_number = cache.get( self.get_key( external_reference ) )
+        if confirmation_number:
+            return confirmation_number
+
+        # Reads it from the request log (set there by any process)
+        confirmation_number = Log.objects.filter(
+            external_reference = external_reference,
+            ron_confirmation_number__isnull = False
+        ).values_list( 'ron_confirmation_number', flat = True ).first()
+        if confirmation_number:
+            cache.set( self.get_key( external_reference ), confirmation_number, self.confirmation_timeout )
+        return confirmation_number
+
+    def set_confirmation( self, external_reference, confirmation_number ):
+        """
+        Stores the confirmation number of a completed booking on its request
+        log (right away, before the booking is released)
+
+        :param: String external_reference
+        :param: Integer confirmation_number
+        :return: None
+        """
+        Log.objects.filter( external_reference = external_reference ).update( ron_confirmation_number = confirmation_number )
+        cache.set( self.get_key( external_reference ), confirmation_number, self.confirmation_timeout )
+
+    def claim( self, external_reference, timeout ):
+        """
+        Marks a booking as in flight on its request log, unless it's completed
+        or in flight already (a single UPDATE, so only one claim succeeds)
+
+        :param: String external_reference
+        :param: Integer timeout - seconds
+        :return: Boolean
+        """
+        now = timezone.now()
+        return Log.objects.filter(
+            Q( booking_locked_until__isnull = True ) | Q( booking_locked_until__lte = now ),
+            external_reference = external_reference,
+            ron_confirmation_number__isnull = True
+        ).update( booking_locked_until = now + datetime.timedelta( seconds = timeout ) ) > 0
+
+    def create_log( self, external_reference ):
+        """
+        Creates the request log of a booking to be claimed, when the request
+        didn't write one (e.g. its pending log could not be written)
+
+        :param: String external_reference
+        :return: None
+        """
+        try:
+            with transaction.atomic():
+                Log.objects.create(
+                    external_reference = external_reference,
+                    log_status_id = settings.ID_LOG_STATUS_PENDING,
+                    request_type = 'booking',
+                    attempts = 0
+                )
+        except IntegrityError:
+            pass
+
+    def acquire( self, external_reference, wait = True ):
+        """
+        Marks a booking as in flight, waiting (up to wait_timeout) while
+        another request is making it
+
+        :param: String external_reference
+        :param: Boolean wait - False returns right away when the booking is in flight
+        :return: Boolean - False when the booking is already completed (see
+                 get_confirmation) or still in flight after waiting
+        """
+        deadline = time.time() + ( self.wait_timeout if wait else 0 )
+        while True:
+            if self.get_confirmation( external_reference ):
+                return False
+            if self.claim( external_reference, self.lock_timeout ):
+                return True
+            if not Log.objects.filter( external_reference = external_reference ).exists():
+                self.create_log( external_reference )
+                continue
+            if time.time() >= deadline:
+                return False
+            time.sleep( self.poll_interval )
+
+    def hold( self, external_reference, timeout ):
+        """
+        Keeps a booking in flight for longer (e.g. while it's queued)
+
+        :param: String external_reference
+        :param: Integer timeout - seconds
+        :return: None
+        """
+        Log.objects.filter( external_reference = external_reference ).update(
+            booking_locked_until = timezone.now() + datetime.timedelta( seconds = timeout )
+        )
+
+    def release( self, external_reference ):
+        """
+        Marks a booking as no longer in flight
+
+        :param: String external_reference
+        :return: None
+        """
+        Log.objects.filter( external_reference = external_reference ).update( booking_locked_until = None )
+
+
+
+
+
+##########################
+# Guard instance
+##########################
+booking_guard = BookingGuard(
+    settings.BOOKING_LOCK_TIMEOUT,
+    settings.BOOKING_WAIT_TIMEOUT,
+    settings.BOOKING_POLL_INTERVAL,
+    settings.BOOKING_CONFIRMATION_TIMEOUT
+)
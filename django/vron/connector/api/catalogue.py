@@ -0,0 +1,282 @@
+"""
+Tour Catalogue
+
+Caches the tour list of each RON host (tours, times, bases and web details),
+which rarely changes, so TourListRequests can be answered without reading
+the whole catalogue from RON every time. Tour lists are kept per reseller,
+as RON answers with what the reseller logged in is allowed to see.
+
+Entries are fresh for TOUR_CATALOGUE_TIMEOUT seconds. After that they are
+still served for TOUR_CATALOGUE_STALE_TIMEOUT seconds while being reloaded
+in the background (stale-while-revalidate).
+
+Catalogues live in the default cache, so they are only shared by all
+processes (and warmed by the periodic task) when CACHES is a shared backend.
+
+"""
+
+##########################
+# Imports
+##########################
+from django.conf import settings
+from django.core.cache import cache
+from vron.connector.api.ron import Ron
+from vron.connector.api.ron_executor import ron_executor
+from vron.connector.models import Key
+import threading
+import time
+
+
+
+
+
+##########################
+# Function definitions
+##########################
+def build_tour_info( tour, tour_times, tour_bases, tour_web_details ):
+    """
+    Builds the tour list entry of a tour from its RON data
+
+    :param: Dictionary tour
+    :param: List tour_times
+    :param: List tour_bases
+    :param: Dictionary tour_web_details
+    :return: Mixed - Dictionary on success, None when any data is missing
+    """
+    if not tour_times or not tour_bases or not tour_web_details:
+        return None
+
+    # Stores relevant information from this tour (required for viator response later)
+    tour_info = {}
+    tour_info['tour'] = {
+        'tour_code': tour['strTourCode'],
+        'tour_name': tour['strTourName'],
+        'country_code': 'AU', #TODO get this from RON
+        'destination_code': 'CNS', #TODO get this from RON
+        'destination_name': 'Cairns', #TODO get this from RON
+        'tour_description': tour_web_details['strCatchPhrase'].encode( 'ascii', 'ignore' )
+    }
+    tour_info['options'] = []
+
+    # Captures tour options to be stored too
+    for tour_time in tour_times:
+        for tour_base in tour_bases:
+            option = {
+                'option_code': tour_base['intBasisID'],
+                'option_name': tour_base['strBasisDesc'],
+                'departure_time': tour_time['dteTourTime']['iso8601'],
+                'basis_id': tour_base['intBasisID'],
+                'sub_basis_id': tour_base['intSubBasisID'],
+                'tour_time_id': tour_time['intTourTimeID'],
+            }
+            tour_info['options'].append( option )
+    return tour_info
+
+
+def read_tour_infos( ron, tours ):
+    """
+    Reads all options and details of a group of tours from RON
+    (in a single multicall when the server supports it)
+
+    :param: Ron ron
+    :param: List tours
+    :return: List - one entry (or None) per tour
+    """
+    calls = []
+    with ron.batch() as batch:
+        for tour in tours:
+            tour_code = tour['strTourCode']
+            calls.append( (
+                tour,
+                batch.read_tour_times( tour_code ),
+                batch.read_tour_bases( tour_code ),
+                batch.read_tour_web_details( tour_code ),
+            ) )
+    return [
+        build_tour_info( tour, tour_times.value, tour_bases.value, tour_web_details.value )
+        for tour, tour_times, tour_bases, tour_web_details in calls
+    ]
+
+
+def iter_tour_list( ron ):
+    """
+    Reads the whole tour list of a host from RON (ron must be logged in).
+    The tours are read first, then their details in multicall groups (or
+    one by one when multicall isn't supported), concurrently. Tours with
+    missing data are skipped.
+
+    :param: Ron ron
+    :return: Mixed - None when RON returns no tours, otherwise a generator
+             yielding each tour (in order) as soon as its data arrives
+    """
+    tours = ron.read_tours()
+    if not tours:
+        return None
+
+    # Splits tours in groups of 3 calls per tour
+    group_size = 1
+    if ron.supports_multicall():
+        group_size = max( 1, settings.RON_MULTICALL_SIZE // 3 )
+    groups = [tours[i:i + group_size] for i in range( 0, len( tours ), group_size )]
+    return read_tour_groups( ron, groups )
+
+
+def read_tour_groups( ron, groups ):
+    """
+    Reads groups of tours concurrently, yielding their entries in order
+
+    :param: Ron ron
+    :param: List groups
+    :return: Generator
+    """
+    for tour_infos in ron_executor.imap( ron.url, lambda group: read_tour_infos( ron, group ), groups ):
+        for tour_info in tour_infos:
+            if tour_info:
+                yield tour_info
+
+
+def load_tour_list( ron ):
+    """
+    Reads the whole tour list of a host from RON (see iter_tour_list)
+
+    :param: Ron ron
+    :return: Mixed - None when RON returns no tours, List otherwise
+    """
+    tour_list = iter_tour_list( ron )
+    if tour_list is None:
+        return None
+    return list( tour_list )
+
+
+
+
+
+##########################
+# Class definitions
+##########################
+class TourCatalogue( object ):
+    """
+    Tour list cache per (mode, host_id, reseller_id)
+
+    """
+
+    def __init__( self, timeout, stale_timeout ):
+        """
+        Constructor responsible to set class attributes
+
+        :param: Integer timeout - seconds an entry is fresh
+        :param: Integer stale_timeout - extra seconds a stale entry can be served
+        :return: None
+        """
+        self.timeout = timeout
+        self.stale_timeout = stale_timeout
+
+    def get_key( self, mode, host_id, reseller_id ):
+        """
+        Returns the cache key of a host catalogue, as seen by a reseller
+
+        :param: String mode
+        :param: String host_id
+        :param: String reseller_id
+        :return: String
+        """
+        return u'tour_catalogue:{0}:{1}:{2}'.format( mode, host_id, reseller_id ).encode( 'utf-8' )
+
+    def get( self, mode, host_id, reseller_id ):
+        """
+        Returns the cached entry of a host and reseller (or None). Entries are
+        dictionaries with 'tour_list', 'reseller_id' and 'loaded_at'
+
+        :param: String mode
+        :param: String host_id
+        :param: String reseller_id
+        :return: Mixed
+        """
+        return cache.get( self.get_key( mode, host_id, reseller_id ) )
+
+    def set( self, mode, host_id, reseller_id, tour_list ):
+        """
+        Stores the tour list of a host and reseller
+
+        :param: String mode
+        :param: String host_id
+        :param: String reseller_id
+        :param: List tour_list
+        :return: None
+        """
+        entry = { 'tour_list': tour_list, 'reseller_id': reseller_id, 'loaded_at': time.time() }
+        cache.set( self.get_key( mode, host_id, reseller_id ), entry, self.timeout + self.stale_timeout )
+
+        # Records the reseller on the host key, so the periodic task (another process) warms it
+        Key.objects.filter( name = host_id ).exclude( reseller_id = reseller_id ).update( reseller_id = reseller_id )
+
+    def delete( self, mode, host_id, reseller_id ):
+        """
+        Removes the catalogue of a host and reseller
+
+        :param: String mode
+        :param: String host_id
+        :param: String reseller_id
+        :return: None
+        """
+        cache.delete( self.get_key( mode, host_id, reseller_id ) )
+
+    def is_fresh( self, entry ):
+        """
+        Checks if an entry can be served without reloading it
+
+        :param: Dictionary entry
+        :return: Boolean
+        """
+        return time.time() - entry['loaded_at'] < self.timeout
+
+    def refresh( self, config_info, mode, host_id, reseller_id ):
+        """
+        Reloads the catalogue of a host from RON
+
+        :param: Dictionary config_info
+        :param: String mode
+        :param: String host_id
+        :param: String reseller_id
+        :return: Boolean
+        """
+
+        # Only one process reloads a host catalogue at a time
+        lock_key = self.get_key( mode, host_id, reseller_id ) + b':lock'
+        if not cache.add( lock_key, 1, settings.TOUR_CATALOGUE_LOCK_TIMEOUT ):
+            return False
+        try:
+            ron = Ron( config_info, mode )
+            ron.host_id = host_id
+            if not ron.login( reseller_id ):
+                return False
+            tour_list = load_tour_list( ron )
+            if not tour_list:
+                return False
+            self.set( mode, host_id, reseller_id, tour_list )
+            return True
+        finally:
+            cache.delete( lock_key )
+
+    def refresh_in_background( self, config_info, mode, host_id, reseller_id ):
+        """
+        Reloads the catalogue of a host without blocking the request
+
+        :param: Dictionary config_info
+        :param: String mode
+        :param: String host_id
+        :param: String reseller_id
+        :return: None
+        """
+        thread = threading.Thread( target = self.refresh, args = ( config_info, mode, host_id, reseller_id ) )
+        thread.daemon = True
+        thread.start()
+
+
+
+
+
+##########################
+# Catalogue instance
+##########################
+tour_catalogue = TourCatalogue( settings.TOUR_CATALOGUE_TIMEOUT, settings.TOUR_CATALOGUE_STALE_TIMEOUT )
@@ -0,0 +1,137 @@
+"""
+Tour Pickups
+
+Caches the pickup list of each tour, time and basis combination (read
+with RON's readTourPickups), together with an index of the pickup keys by
+normalized pickup name, so a booking reads the pickups from RON at most
+once (the pickup point lookup and the mandatory pickup retry share them).
+
+"""
+
+##########################
+# Imports
+##########################
+from django.conf import settings
+from django.core.cache import cache
+
+
+
+
+
+##########################
+# Function definitions
+##########################
+def normalize_pickup_name( name ):
+    """
+    Normalizes a pickup name for matching (case and spacing are ignored)
+
+    :param: String name
+    :return: String
+    """
+    return u' '.join( name.lower().split() )
+
+
+def build_tour_pickups( pickups ):
+    """
+    Builds the cache entry of a pickup list
+
+    :param: List pickups - RON pickups
+    :return: Dictionary - 'pickups' (the list) and 'index' (normalized name -> pickup key,
+             the first pickup wins when names are repeated)
+    """
+    index = {}
+    for pickup in pickups:
+        index.setdefault( normalize_pickup_name( pickup['strPickupName'] ), pickup['strPickupKey'] )
+    return { 'pickups': pickups, 'index': index }
+
+
+def match_pickup_key( tour_pickups, pickup_point ):
+    """
+    Returns the pickup key of a pickup point (matched by normalized name)
+
+    :param: Dictionary tour_pickups - see build_tour_pickups (None when they couldn't be read)
+    :param: String pickup_point
+    :return: Mixed - None when there's no pickup with that name
+    """
+    if not tour_pickups:
+        return None
+    return tour_pickups['index'].get( normalize_pickup_name( pickup_point ) )
+
+
+
+
+
+##########################
+# Class definitions
+##########################
+class PickupCache( object ):
+    """
+    Pickup lists per (mode, host_id, tour_code, tour_time_id, basis_id)
+
+    """
+
+    def __init__( self, timeout ):
+        """
+        Constructor responsible to set class attributes
+
+        :param: Integer timeout - seconds a pickup list is cached
+        :return: None
+        """
+        self.timeout = timeout
+
+    def get_key( self, mode, host_id, tour_code, tour_time_id, basis_id ):
+        """
+        Returns the cache key of a pickup list
+
+        :param: String mode
+        :param: String host_id
+        :param: String tour_code
+        :param: String tour_time_id
+        :param: String basis_id
+        :return: String
+        """
+        key = u'tour_pickups:{0}:{1}:{2}:{3}:{4}'.format( mode, host_id, tour_code, tour_time_id, basis_id )
+        return key.encode( 'utf-8' )
+
+    def read( self, ron, tour_code, tour_time_id, basis_id ):
+        """
+        Returns the pickups of a tour, time and basis (ron must be logged in),
+        reading them from RON only when they're not cached
+
+        :param: Ron ron
+        :param: String tour_code
+        :param: String tour_time_id
+        :param: String basis_id
+        :return: Mixed - Dictionary (see build_tour_pickups), False when RON fails
+        """
+        key = self.get_key( ron.mode, ron.host_id, tour_code, tour_time_id, basis_id )
+        tour_pickups = cache.get( key )
+        if tour_pickups is None:
+            pickups = ron.read_tour_pickups( tour_code, tour_time_id, basis_id )
+            if pickups is False:
+                return False
+            tour_pickups = build_tour_pickups( pickups or [] )
+            cache.set( key, tour_pickups, self.timeout )
+        return tour_pickups
+
+    def delete( self, mode, host_id, tour_code, tour_time_id, basis_id ):
+        """
+        Removes a cached pickup list
+
+        :param: String mode
+        :param: String host_id
+        :param: String tour_code
+        :param: String tour_time_id
+        :param: String basis_id
+        :return: None
+        """
+        cache.delete( self.get_key( mode, host_id, tour_code, tour_time_id, basis_id ) )
+
+
+
+
+
+##########################
+# Cache instance
+##########################
+pickup_cache = PickupCache( settings.PICKUP_CACHE_TIMEOUT )
@@ -9,7 +9,16 @@ http://wiki.respax.com.au/respax/ron_api
 # Imports
 ##########################
 from django.conf import settings
+from django.utils.encoding import force_text
+from vron.connector.api.ron_pool import ron_pool
+from vron.connector.api.ron_session import ron_sessions
+from vron.connector.api.ron_metrics import ron_metrics, get_fault_class
+from vron.connector.tracing import tracer, traced
+from vron.connector.snapshots import ExpiringSet
+from vron.connector.api.availability import availability_cache
+import threading
 import xmlrpclib
+import time
 
 
 
@@ -25,6 +34,12 @@ class Ron( object ):
 
     """
 
+    # RON hosts (scheme + host) that answered system.multicall with an unknown method fault (for a while)
+    multicall_unsupported = ExpiringSet( settings.RON_MULTICALL_UNSUPPORTED_TIMEOUT, 1000 )
+
+    # Methods never called again automatically after a fault (they aren't idempotent)
+    unrepeatable_methods = ( 'writeReservation', )
+
     def __init__( self, config_info, mode = 'train' ):
         """
         Constructor responsible to set class attributes
@@ -35,45 +50,213 @@ class Ron( object ):
         :return: None
         """
         self.config_info = config_info
+        self.mode = mode
         self.host_id = ''
+        self.reseller_id = ''
         self.ron_session_id = ''
         self.error_message = ''
+        self.call_count = 0
+        self.call_time = 0.0
+        self.lock = threading.Lock()
+
+        # Set once a writeReservation has been sent (after a connection error it may have been written)
+        self.reservation_sent = False
+
+        # Serializes logins, as executor threads share this instance (and its session)
+        self.session_lock = threading.RLock()
         if mode == 'live':
             self.url = self.config_info[settings.ID_CONFIG_RON_LIVE_URL]
         else:
             self.url = self.config_info[settings.ID_CONFIG_RON_TEST_URL]
 
-    def connect( self ):
+    def get_url( self, session_id = None ):
+        """
+        Returns the RON url, including the session id once logged in
+
+        :param: String session_id - defaults to the current session
+        :return: String
+        """
+        if session_id is None:
+            session_id = self.ron_session_id
+        if not "PHPSESSID" in self.url and session_id:
+            return self.url + '&' + session_id
+        return self.url
+
+    def call( self, method, *params ):
         """
-        Tries to connect to the RON server
+        Calls a RON method, logging in again (once) if the shared session
+        has expired on RON. The call is then repeated, unless it's one of
+        the unrepeatable methods (its fault is raised, as it may have been
+        made, but the next call uses the new session)
 
+        :param: String method
+        :param: List params
         :return: Mixed
         """
-        if not "PHPSESSID" in self.url and self.ron_session_id:
-            self.url += '&' + self.ron_session_id
-        return xmlrpclib.ServerProxy( self.url )
+        session_id = self.ron_session_id
+        try:
+            return self.send( self.get_url( session_id ), method, *params )
+        except xmlrpclib.Fault as error:
+            if method == 'login' or not self.reseller_id or not ron_sessions.is_session_expired( error ):
+                raise
+            fault = error
+        if not self.renew_session( session_id ):
+            raise xmlrpclib.Fault( 0, 'RON session expired and login failed' )
+        if method in self.unrepeatable_methods:
+            raise fault
+        return self.send( self.get_url(), method, *params )
+
+    def send( self, url, method, *params ):
+        """
+        Sends a RON method call using a pooled keep-alive connection
+
+        :param: String url - see get_url
+        :param: String method
+        :param: List params
+        :return: Mixed
+        """
+
+        # Borrows a warm connection from the pool
+        transport = ron_pool.acquire( url )
+        ron = xmlrpclib.ServerProxy( url, transport = transport )
+
+        # Calls ron method (connections in an unknown state are never reused)
+        start = time.time()
+        try:
+            result = getattr( ron, method )( *params )
+        except xmlrpclib.Fault as error:
+            self.record_call( method, start, transport, get_fault_class( error.faultString ) )
+            ron_pool.release( url, transport )
+            raise
+        except Exception as error:
+            self.record_call( method, start, transport, 'error:' + type( error ).__name__ )
+            ron_pool.discard( transport )
+            raise
+        self.record_call( method, start, transport )
+        ron_pool.release( url, transport )
+        return result
+
+    def record_call( self, method, start, transport, fault_class = None ):
+        """
+        Records the latency, payload sizes and outcome of a RON call (also
+        counted on this instance, calls made by the executor threads included)
 
-    def login( self, reseller_id ):
+        :param: String method
+        :param: Float start - time the call started
+        :param: Transport transport
+        :param: String fault_class - None when the call succeeded
+        :return: None
         """
-        Tries to login to the RON api
+        duration = time.time() - start
+        with self.lock:
+            self.call_count += 1
+            self.call_time += duration
+        ron_metrics.record(
+            method, self.mode, self.host_id, duration,
+            transport.request_size, transport.response_size, fault_class
+        )
+        trace = tracer.get_current()
+        if trace is not None:
+            if fault_class is None:
+                trace.add_span( 'ron.' + method, start, duration )
+            else:
+                trace.add_span( 'ron.' + method, start, duration, fault_class = fault_class )
+
+    def supports_multicall( self ):
+        """
+        Checks if this RON server accepts system.multicall (servers are
+        assumed to support it until a multicall is answered as unknown)
 
-        :param: host_id
         :return: Boolean
         """
+        return ron_pool.get_key( self.url ) not in Ron.multicall_unsupported
+
+    def batch( self ):
+        """
+        Returns a batch that collects read calls and sends them
+        to RON as a single multicall. Usage:
+
+            with ron.batch() as batch:
+                tour_times = batch.read_tour_times( tour_code )
+                tour_bases = batch.read_tour_bases( tour_code )
+            tour_times.value, tour_bases.value
+
+        :return: RonBatch
+        """
+        return RonBatch( self )
+
+    def set_error_message( self, error_message ):
+        """
+        Keeps the last RON fault (set by executor threads too)
 
-        # Creates XML-RPC server connection
-        ron = self.connect()
+        :param: String error_message
+        :return: None
+        """
+        with self.lock:
+            self.error_message = error_message
+
+    @traced( 'ron_login' )
+    def login( self, reseller_id, force = False ):
+        """
+        Tries to login to the RON api, reusing a shared session when
+        there's one for this mode, username and reseller
 
-        # Calls login method
+        :param: reseller_id
+        :param: Boolean force - ignores (and replaces) the shared session
+        :return: Boolean
+        """
+        with self.session_lock:
+            self.reseller_id = reseller_id
+            return self.open_session( None if force else '' )
+
+    def renew_session( self, expired_session_id ):
+        """
+        Logs in again after RON answered that a session expired. Threads
+        finding the same expired session wait for a single login and use
+        the new session
+
+        :param: String expired_session_id
+        :return: Boolean
+        """
+        with self.session_lock:
+            if self.ron_session_id != expired_session_id:
+                return True
+            return self.open_session( expired_session_id )
+
+    def open_session( self, expired_session_id ):
+        """
+        Sets the session id, from the shared sessions or a RON login. The
+        session id in use is only replaced once the new one is known
+
+        :param: String expired_session_id - a shared session equal to it is
+                ignored (None ignores any shared session, '' reuses it)
+        :return: Boolean
+        """
+        username = self.config_info[settings.ID_CONFIG_RON_USERNAME]
+
+        # Reuses shared session (another process may have already replaced the expired one)
+        if expired_session_id is not None:
+            session_id = ron_sessions.get( self.mode, username, self.reseller_id )
+            if session_id and session_id != expired_session_id:
+                self.ron_session_id = session_id
+                return True
+
+        # Calls login method (without a session)
         try:
-            self.ron_session_id = ron.login(
-                self.config_info[settings.ID_CONFIG_RON_USERNAME],
+            session_id = self.send(
+                self.get_url( '' ),
+                'login',
+                username,
                 self.config_info[settings.ID_CONFIG_RON_PASSWORD],
-                reseller_id
+                self.reseller_id
             )
-            return True
         except xmlrpclib.Fault:
+            if expired_session_id:
+                ron_sessions.delete( self.mode, username, self.reseller_id )
             return False
+        self.ron_session_id = session_id
+        ron_sessions.set( self.mode, username, self.reseller_id, session_id )
+        return True
 
     def read_tour_pickups( self, tour_code, tour_time_id, basis_id ):
         """
@@ -86,12 +269,9 @@ class Ron( object ):
         :return: List
         """
 
-        # Creates ron XML-RPC server connection
-        ron = self.connect()
-
         # Calls ron method
         try:
-            return ron.readTourPickups( self.host_id, tour_code, tour_time_id, basis_id )
+            return self.call( 'readTourPickups', self.host_id, tour_code, tour_time_id, basis_id )
         except xmlrpclib.Fault:
             return False
 
@@ -104,16 +284,23 @@ class Ron( object ):
         :return: Mixed
         """
 
-        # Creates ron XML-RPC server connection
-        ron = self.connect()
-
         # Calls ron method
+        self.reservation_sent = True
         try:
-            return ron.writeReservation( self.host_id, -1, reservation, { 'strPaymentOption': 'full-agent' }, {} )
+            result = self.call( 'writeReservation', self.host_id, -1, reservation, { 'strPaymentOption': 'full-agent' }, {} )
         except xmlrpclib.Fault as error:
-            self.error_message = error.faultString
+            self.set_error_message( error.faultString )
             return False
 
+        # Availability of the slot booked has changed (only cleared on this process unless the cache is
+        # shared, others expire it after AVAILABILITY_CACHE_TIMEOUT)
+        if result:
+            availability_cache.delete(
+                self.mode, self.host_id, reservation['strTourCode'], reservation['intBasisID'],
+                reservation['intSubBasisID'], reservation['intTourTimeID'], reservation['dteTourDate']
+            )
+        return result
+
     def read_tour_availability_range( self, data ):
         """
         Returns a dictionary containing availability information for the
@@ -123,14 +310,11 @@ class Ron( object ):
         :return: Dictionary
         """
 
-        # Creates ron XML-RPC server connection
-        ron = self.connect()
-
         # Calls ron method
         try:
-            return ron.readTourAvailabilityRange( data )
+            return self.call( 'readTourAvailabilityRange', data )
         except xmlrpclib.Fault as error:
-            self.error_message = error.faultString
+            self.set_error_message( error.faultString )
             return False
 
     def read_tour_times( self, tour_code ):
@@ -141,14 +325,11 @@ class Ron( object ):
         :return: Dictionary
         """
 
-        # Creates ron XML-RPC server connection
-        ron = self.connect()
-
         # Calls ron method
         try:
-            return ron.readTourTimes( self.host_id, tour_code )
+            return self.call( 'readTourTimes', self.host_id, tour_code )
         except xmlrpclib.Fault as error:
-            self.error_message = error.faultString
+            self.set_error_message( error.faultString )
             return False
 
     def read_tours( self ):
@@ -159,14 +340,11 @@ class Ron( object ):
         :return: Dictionary
         """
 
-        # Creates ron XML-RPC server connection
-        ron = self.connect()
-
         # Calls ron method
         try:
-            return ron.readTours( self.host_id )
+            return self.call( 'readTours', self.host_id )
         except xmlrpclib.Fault as error:
-            self.error_message = error.faultString
+            self.set_error_message( error.faultString )
             return False
 
     def read_tour_bases( self, tour_code ):
@@ -177,14 +355,11 @@ class Ron( object ):
         :return: Dictionary
         """
 
-        # Creates ron XML-RPC server connection
-        ron = self.connect()
-
         # Calls ron method
         try:
-            return ron.readTourBases( self.host_id, tour_code )
+            return self.call( 'readTourBases', self.host_id, tour_code )
         except xmlrpclib.Fault as error:
-            self.error_message = error.faultString
+            self.set_error_message( error.faultString )
             return False
 
     def read_tour_web_details( self, tour_code ):
@@ -197,13 +372,176 @@ class Ron( object ):
         :return: Dictionary
         """
 
-        # Creates ron XML-RPC server connection
-        ron = self.connect()
-
         # Calls ron method
         try:
-            return ron.readTourWebDetails( self.host_id, tour_code, False )
+            return self.call( 'readTourWebDetails', self.host_id, tour_code, False )
         except xmlrpclib.Fault as error:
-            self.error_message = error.faultString
+            self.set_error_message( error.faultString )
+            return False
+
+
+class RonBatchResult( object ):
+    """
+    Result of a call made through a RonBatch, available
+    (as 'value') once the batch is flushed
+
+    """
+
+    def __init__( self, method, params ):
+        """
+        Constructor responsible to set class attributes
+
+        :param: String method
+        :param: Tuple params
+        :return: None
+        """
+        self.method = method
+        self.params = params
+        self.value = None
+
+
+class RonBatch( object ):
+    """
+    Collects RON read calls and flushes them as system.multicall requests
+    (falling back to individual calls when the server doesn't support it)
+
+    Calls that fail return False and set the ron error_message,
+    exactly like the Ron methods.
+
+    """
+
+    def __init__( self, ron ):
+        """
+        Constructor responsible to set class attributes
+
+        :param: Ron ron
+        :return: None
+        """
+        self.ron = ron
+        self.results = []
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, exc_type, exc_value, traceback ):
+        if exc_type is None:
+            self.flush()
+        return False
+
+    def add( self, method, *params ):
+        """
+        Adds a call to the batch
+
+        :param: String method
+        :param: List params
+        :return: RonBatchResult
+        """
+        result = RonBatchResult( method, params )
+        self.results.append( result )
+        return result
+
+    def read_tour_times( self, tour_code ):
+        """
+        Batched Ron.read_tour_times
+
+        :param: String tour_code
+        :return: RonBatchResult
+        """
+        return self.add( 'readTourTimes', self.ron.host_id, tour_code )
+
+    def read_tour_bases( self, tour_code ):
+        """
+        Batched Ron.read_tour_bases
+
+        :param: String tour_code
+        :return: RonBatchResult
+        """
+        return self.add( 'readTourBases', self.ron.host_id, tour_code )
+
+    def read_tour_web_details( self, tour_code ):
+        """
+        Batched Ron.read_tour_web_details
+
+        :param: String tour_code
+        :return: RonBatchResult
+        """
+        return self.add( 'readTourWebDetails', self.ron.host_id, tour_code, False )
+
+    def flush( self ):
+        """
+        Sends all pending calls to RON
+
+        :return: None
+        """
+        results, self.results = self.results, []
+        size = settings.RON_MULTICALL_SIZE
+        for i in range( 0, len( results ), size ):
+            chunk = results[i:i + size]
+            if len( chunk ) > 1 and self.ron.supports_multicall():
+                if self.send_multicall( chunk ):
+                    continue
+            self.send_individually( chunk )
+
+    def send_individually( self, results ):
+        """
+        Sends each call as a single RON request
+
+        :param: List results
+        :return: None
+        """
+        for result in results:
+            try:
+                result.value = self.ron.call( result.method, *result.params )
+            except xmlrpclib.Fault as error:
+                self.ron.set_error_message( error.faultString )
+                result.value = False
+
+    def is_unknown_method( self, fault ):
+        """
+        Checks if a fault means the server doesn't know system.multicall
+
+        :param: xmlrpclib.Fault fault
+        :return: Boolean
+        """
+        if fault.faultCode == -32601:
+            return True
+        fault_string = force_text( fault.faultString ).lower()
+        for text in settings.RON_UNKNOWN_METHOD_FAULTS:
+            if text in fault_string:
+                return True
+        return False
+
+    def send_multicall( self, results, retry = True ):
+        """
+        Sends the calls as one system.multicall request
+
+        :param: List results
+        :param: Boolean retry - logs in again (once) if the session expired
+        :return: Boolean - False when the multicall failed (the calls are then sent individually)
+        """
+        calls = [{ 'methodName': result.method, 'params': list( result.params ) } for result in results]
+        session_id = self.ron.ron_session_id
+        try:
+            values = self.ron.call( 'system.multicall', calls )
+        except xmlrpclib.Fault as error:
+
+            # Only an unknown method turns batching off for the host (other faults may be transient)
+            if self.is_unknown_method( error ):
+                Ron.multicall_unsupported.add( ron_pool.get_key( self.ron.url ) )
             return False
 
+        # Each value is a single item list on success or a fault struct
+        faults = [value for value in values if isinstance( value, dict ) and 'faultString' in value]
+        if retry and self.ron.reseller_id:
+            for fault in faults:
+                if ron_sessions.is_session_expired( xmlrpclib.Fault( fault['faultCode'], fault['faultString'] ) ):
+                    if self.ron.renew_session( session_id ):
+                        return self.send_multicall( results, False )
+                    break
+        for result, value in zip( results, values ):
+            if isinstance( value, dict ) and 'faultString' in value:
+                self.ron.set_error_message( value['faultString'] )
+                result.value = False
+            else:
+                result.value = value[0]
+        return True
@@ -0,0 +1,142 @@
+"""
+RON Executor
+
+Runs independent RON calls concurrently (a thread pool shared by all
+requests of the process), while limiting how many calls are in flight
+at the same time for each RON host.
+
+"""
+
+##########################
+# Imports
+##########################
+from django.conf import settings
+from vron.connector.api.ron_pool import ron_pool
+from vron.connector.tracing import tracer
+from multiprocessing.pool import ThreadPool
+import collections
+import threading
+import os
+
+
+
+
+
+##########################
+# Class definitions
+##########################
+class RonExecutor( object ):
+    """
+    Bounded-concurrency executor for RON calls
+
+    """
+
+    def __init__( self, max_in_flight, threads ):
+        """
+        Constructor responsible to set class attributes
+
+        :param: Integer max_in_flight - max concurrent calls per RON host (per process)
+        :param: Integer threads - threads of the pool (all RON hosts)
+        :return: None
+        """
+        self.max_in_flight = max_in_flight
+        self.threads = threads
+        self.lock = threading.Lock()
+        self.semaphores = {}
+        self.pool = None
+        self.pid = None
+
+    def get_pool( self ):
+        """
+        Returns the thread pool of this process (created once per process,
+        so it works after forking)
+
+        :return: ThreadPool
+        """
+        with self.lock:
+            if self.pool is None or self.pid != os.getpid():
+                self.pool = ThreadPool( self.threads )
+                self.pid = os.getpid()
+            return self.pool
+
+    def get_semaphore( self, url ):
+        """
+        Returns the semaphore limiting calls to the RON host of the url
+
+        :param: String url
+        :return: Semaphore
+        """
+        key = ron_pool.get_key( url )
+        with self.lock:
+            if key not in self.semaphores:
+                self.semaphores[key] = threading.BoundedSemaphore( self.max_in_flight )
+            return self.semaphores[key]
+
+    def map( self, url, function, items ):
+        """
+        Calls function for every item concurrently and returns
+        the results in the same order as the items
+
+        :param: String url
+        :param: Function function
+        :param: List items
+        :return: List
+        """
+        return list( self.imap( url, function, items ) )
+
+    def imap( self, url, function, items ):
+        """
+        Like map, but yields each result (in the same order as the items)
+        as soon as it's ready, instead of waiting for all of them
+
+        Calls are only submitted to the pool once they hold a slot of the host
+        semaphore (the calling thread waits for it), so a slow host never
+        takes the pool threads shared with the other hosts
+
+        :param: String url
+        :param: Function function
+        :param: List items
+        :return: Generator
+        """
+        items = list( items )
+        if len( items ) < 2 or self.max_in_flight < 2:
+            for item in items:
+                yield function( item )
+            return
+
+        # Every call runs in the request trace and frees its slot when done
+        semaphore = self.get_semaphore( url )
+        trace = tracer.get_current()
+        def run( item ):
+            try:
+                tracer.activate( trace )
+                try:
+                    return function( item )
+                finally:
+                    tracer.activate( None )
+            finally:
+                semaphore.release()
+
+        # Waits for a slot before each call (only blocks when none of ours is in flight,
+        # otherwise it waits for our oldest call, yielding its result)
+        pool = self.get_pool()
+        pending = collections.deque()
+        for item in items:
+            while not semaphore.acquire( not pending ):
+                yield pending.popleft().get()
+            try:
+                pending.append( pool.apply_async( run, ( item, ) ) )
+            except Exception:
+                semaphore.release()
+                raise
+        while pending:
+            yield pending.popleft().get()
+
+
+
+
+
+##########################
+# Executor instance
+##########################
+ron_executor = RonExecutor( settings.RON_MAX_IN_FLIGHT, settings.RON_EXECUTOR_THREADS )
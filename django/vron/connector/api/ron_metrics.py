@@ -0,0 +1,240 @@
+"""
+RON Metrics
+
+Records every RON call made by this process (method, host id, mode,
+latency, payload sizes and faults), exported in the Prometheus text
+format and summarized on the admin area.
+
+Metrics are kept in memory, per process (each worker exports its own).
+
+"""
+
+##########################
+# Imports
+##########################
+from django.conf import settings
+from django.utils.encoding import force_text
+import threading
+import bisect
+
+
+
+
+
+##########################
+# Function definitions
+##########################
+def get_fault_class( fault_string ):
+    """
+    Classifies a RON fault string (see RON_FAULT_CLASSES), so faults
+    can be counted without a label per distinct message
+
+    :param: String fault_string
+    :return: String
+    """
+    fault_string = force_text( fault_string ).lower()
+    for text, fault_class in settings.RON_FAULT_CLASSES:
+        if text in fault_string:
+            return fault_class
+    return 'other'
+
+
+def format_labels( labels ):
+    """
+    Formats Prometheus labels
+
+    :param: List labels - ( name, value ) tuples
+    :return: String
+    """
+    values = []
+    for name, value in labels:
+        value = u'{0}'.format( value ).replace( '\\', '\\\\' ).replace( '"', '\\"' ).replace( '\n', '\\n' )
+        values.append( u'{0}="{1}"'.format( name, value ) )
+    return u'{' + u','.join( values ) + u'}'
+
+
+
+
+
+##########################
+# Class definitions
+##########################
+class RonMetrics( object ):
+    """
+    Latency histograms, payload sizes and fault counters of the RON calls,
+    per (method, mode, host_id)
+
+    """
+
+    def __init__( self, buckets ):
+        """
+        Constructor responsible to set class attributes
+
+        :param: List buckets - latency histogram upper bounds (seconds)
+        :return: None
+        """
+        self.buckets = sorted( buckets )
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.faults = {}
+
+    def record( self, method, mode, host_id, latency, request_size = 0, response_size = 0, fault_class = None ):
+        """
+        Records a RON call
+
+        :param: String method
+        :param: String mode
+        :param: String host_id
+        :param: Float latency - seconds
+        :param: Integer request_size - bytes sent
+        :param: Integer response_size - bytes received
+        :param: String fault_class - None when the call succeeded
+        :return: None
+        """
+        key = ( method, mode, host_id or '' )
+        bucket = bisect.bisect_left( self.buckets, latency )
+        with self.lock:
+            call = self.calls.get( key )
+            if call is None:
+                call = self.calls[key] = {
+                    'count': 0, 'sum': 0.0, 'buckets': [0] * ( len( self.buckets ) + 1 ),
+                    'request_bytes': 0, 'response_bytes': 0
+                }
+            call['count'] += 1
+            call['sum'] += latency
+            call['buckets'][bucket] += 1
+            call['request_bytes'] += request_size
+            call['response_bytes'] += response_size
+            if fault_class is not None:
+                fault_key = key + ( fault_class, )
+                self.faults[fault_key] = self.faults.get( fault_key, 0 ) + 1
+
+    def reset( self ):
+        """
+        Clears all metrics
+
+        :return: None
+        """
+        with self.lock:
+            self.calls = {}
+            self.faults = {}
+
+    def get_percentile( self, buckets, count, percentile ):
+        """
+        Estimates a latency percentile from histogram buckets (upper bound
+        of the bucket where it falls)
+
+        :param: List buckets - counts per bucket
+        :param: Integer count
+        :param: Float percentile - 0 to 1
+        :return: Mixed - Float, or None when it's above the last bucket
+        """
+        rank = percentile * count
+        total = 0
+        for i, bucket_count in enumerate( buckets ):
+            total += bucket_count
+            if total >= rank and total > 0:
+                if i < len( self.buckets ):
+                    return self.buckets[i]
+                return None
+        return None
+
+    def get_summary( self ):
+        """
+        Returns the calls of each RON method (all hosts and modes),
+        slowest total time first
+
+        :return: List of dictionaries
+        """
+        with self.lock:
+            calls = [( key, dict( call, buckets = list( call['buckets'] ) ) ) for key, call in self.calls.items()]
+            faults = list( self.faults.items() )
+
+        # Sums hosts and modes per method
+        methods = {}
+        for ( method, mode, host_id ), call in calls:
+            summary = methods.setdefault( method, {
+                'method': method, 'count': 0, 'sum': 0.0, 'faults': 0, 'request_bytes': 0,
+                'response_bytes': 0, 'buckets': [0] * ( len( self.buckets ) + 1 ), 'hosts': set()
+            } )
+            summary['count'] += call['count']
+            summary['sum'] += call['sum']
+            summary['request_bytes'] += call['request_bytes']
+            summary['response_bytes'] += call['response_bytes']
+            summary['hosts'].add( host_id )
+            for i, bucket_count in enumerate( call['buckets'] ):
+                summary['buckets'][i] += bucket_count
+        for ( method, mode, host_id, fault_class ), count in faults:
+            if method in methods:
+                methods[method]['faults'] += count
+
+        # Averages and percentiles
+        summaries = []
+        for summary in methods.values():
+            count = summary['count']
+            summaries.append( {
+                'method': summary['method'],
+                'count': count,
+                'hosts': len( summary['hosts'] ),
+                'faults': summary['faults'],
+                'total_time': summary['sum'],
+                'average': summary['sum'] / count if count else 0,
+                'p50': self.get_percentile( summary['buckets'], count, 0.5 ),
+                'p95': self.get_percentile( summary['buckets'], count, 0.95 ),
+                'p99': self.get_percentile( summary['buckets'], count, 0.99 ),
+                'request_bytes': summary['request_bytes'] // count if count else 0,
+                'response_bytes': summary['response_bytes'] // count if count else 0,
+            } )
+        summaries.sort( key = lambda summary: summary['total_time'], reverse = True )
+        return summaries
+
+    def export( self ):
+        """
+        Returns the metrics in the Prometheus text format
+
+        :return: String
+        """
+        with self.lock:
+            calls = sorted( ( key, dict( call, buckets = list( call['buckets'] ) ) ) for key, call in self.calls.items() )
+            faults = sorted( self.faults.items() )
+
+        lines = [
+            u'# HELP vron_ron_call_seconds Latency of the RON calls',
+            u'# TYPE vron_ron_call_seconds histogram',
+        ]
+        for ( method, mode, host_id ), call in calls:
+            labels = [( 'method', method ), ( 'mode', mode ), ( 'host_id', host_id )]
+            total = 0
+            for bound, bucket_count in zip( self.buckets + ['+Inf'], call['buckets'] ):
+                total += bucket_count
+                lines.append( u'vron_ron_call_seconds_bucket{0} {1}'.format( format_labels( labels + [( 'le', bound )] ), total ) )
+            lines.append( u'vron_ron_call_seconds_sum{0} {1}'.format( format_labels( labels ), repr( call['sum'] ) ) )
+            lines.append( u'vron_ron_call_seconds_count{0} {1}'.format( format_labels( labels ), call['count'] ) )
+
+        lines.append( u'# HELP vron_ron_request_bytes_total Bytes sent to RON' )
+        lines.append( u'# TYPE vron_ron_request_bytes_total counter' )
+        for ( method, mode, host_id ), call in calls:
+            labels = [( 'method', method ), ( 'mode', mode ), ( 'host_id', host_id )]
+            lines.append( u'vron_ron_request_bytes_total{0} {1}'.format( format_labels( labels ), call['request_bytes'] ) )
+
+        lines.append( u'# HELP vron_ron_response_bytes_total Bytes received from RON' )
+        lines.append( u'# TYPE vron_ron_response_bytes_total counter' )
+        for ( method, mode, host_id ), call in calls:
+            labels = [( 'method', method ), ( 'mode', mode ), ( 'host_id', host_id )]
+            lines.append( u'vron_ron_response_bytes_total{0} {1}'.format( format_labels( labels ), call['response_bytes'] ) )
+
+        lines.append( u'# HELP vron_ron_faults_total RON calls that failed, by fault class' )
+        lines.append( u'# TYPE vron_ron_faults_total counter' )
+        for ( method, mode, host_id, fault_class ), count in faults:
+            labels = [( 'method', method ), ( 'mode', mode ), ( 'host_id', host_id ), ( 'fault_class', fault_class )]
+            lines.append( u'vron_ron_faults_total{0} {1}'.format( format_labels( labels ), count ) )
+        return u'\n'.join( lines ) + u'\n'
+
+
+
+
+
+##########################
+# Metrics instance
+##########################
+ron_metrics = RonMetrics( settings.RON_METRICS_BUCKETS )
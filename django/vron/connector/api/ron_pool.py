@@ -0,0 +1,233 @@
+"""
+RON Connection Pool
+
+Keeps warm XML-RPC transports (keep-alive HTTP/HTTPS connections) for each
+RON server, so that every Ron instance in this process reuses them instead
+of opening a new TCP + TLS connection for every single method call.
+
+"""
+
+##########################
+# Imports
+##########################
+from django.conf import settings
+import xmlrpclib
+import threading
+import urlparse
+import select
+import socket
+import time
+
+
+
+
+
+##########################
+# Class definitions
+##########################
+class KeepAliveTransportMixin:
+    """
+    Adds idle time tracking and a health check to the xmlrpclib
+    transports (which already keep the HTTP connection open)
+
+    Old-style class, like the xmlrpclib transports: a new-style mixin
+    puts object before them in the MRO, so their __init__ never runs
+
+    """
+
+    last_used = 0
+
+    # Socket timeout (seconds) of the connection, see RonConnectionPool
+    timeout = None
+
+    # Sizes (bytes) of the last request sent and response received
+    request_size = 0
+    response_size = 0
+
+    def send_request( self, connection, handler, request_body ):
+        """
+        Sends the request line, setting the socket timeout first (xmlrpclib
+        connections have none, a hung RON call would block forever)
+
+        :param: HTTPConnection connection
+        :param: String handler
+        :param: String request_body
+        :return: None
+        """
+        connection.timeout = self.timeout
+        if connection.sock is not None:
+            connection.sock.settimeout( self.timeout )
+        return xmlrpclib.Transport.send_request( self, connection, handler, request_body )
+
+    def send_content( self, connection, request_body ):
+        """
+        Sends the request body, keeping its size
+
+        :param: HTTPConnection connection
+        :param: String request_body
+        :return: None
+        """
+        self.request_size = len( request_body )
+        self.response_size = 0
+        return xmlrpclib.Transport.send_content( self, connection, request_body )
+
+    def parse_response( self, response ):
+        """
+        Parses the response, keeping its size (when sent by the server)
+
+        :param: HTTPResponse response
+        :return: Tuple
+        """
+        try:
+            self.response_size = int( response.getheader( 'content-length', 0 ) )
+        except ValueError:
+            self.response_size = 0
+        return xmlrpclib.Transport.parse_response( self, response )
+
+    def is_healthy( self, idle_timeout ):
+        """
+        Checks if the connection held by this transport can be reused
+
+        :param: Integer idle_timeout
+        :return: Boolean
+        """
+
+        # Connection was never opened or it's been idle for too long
+        connection = getattr( self, '_connection', ( None, None ) )[1]
+        if connection is None or connection.sock is None:
+            return False
+        if time.time() - self.last_used > idle_timeout:
+            return False
+
+        # A readable socket while idle means the server closed it (or sent garbage)
+        try:
+            readable, writable, failed = select.select( [connection.sock], [], [], 0 )
+        except ( select.error, socket.error, ValueError ):
+            return False
+        return not readable
+
+
+class KeepAliveTransport( KeepAliveTransportMixin, xmlrpclib.Transport ):
+    """
+    Pooled HTTP transport
+
+    """
+    pass
+
+
+class KeepAliveSafeTransport( KeepAliveTransportMixin, xmlrpclib.SafeTransport ):
+    """
+    Pooled HTTPS transport
+
+    """
+    pass
+
+
+class RonConnectionPool( object ):
+    """
+    Process-wide pool of keep-alive transports, keyed by RON url (scheme + host)
+
+    """
+
+    def __init__( self, size, idle_timeout, socket_timeout ):
+        """
+        Constructor responsible to set class attributes
+
+        :param: Integer size - max idle connections kept per RON url
+        :param: Integer idle_timeout - seconds before an idle connection is dropped
+        :param: Integer socket_timeout - max seconds to connect or wait for each read
+        :return: None
+        """
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.socket_timeout = socket_timeout
+        self.lock = threading.Lock()
+        self.transports = {}
+
+    def get_key( self, url ):
+        """
+        Returns the key used to group connections (scheme + host)
+
+        :param: String url
+        :return: String
+        """
+        parsed_url = urlparse.urlparse( url )
+        return parsed_url.scheme.lower() + '://' + parsed_url.netloc.lower()
+
+    def create_transport( self, url ):
+        """
+        Creates a new transport for the url scheme
+
+        :param: String url
+        :return: Transport
+        """
+        if url.lower().startswith( 'https' ):
+            transport = KeepAliveSafeTransport()
+        else:
+            transport = KeepAliveTransport()
+        transport.timeout = self.socket_timeout
+        return transport
+
+    def acquire( self, url ):
+        """
+        Returns a healthy idle transport for the url or a new one
+
+        :param: String url
+        :return: Transport
+        """
+        key = self.get_key( url )
+        with self.lock:
+            transports = self.transports.get( key, [] )
+            while transports:
+                transport = transports.pop()
+                if transport.is_healthy( self.idle_timeout ):
+                    return transport
+                transport.close()
+        return self.create_transport( url )
+
+    def release( self, url, transport ):
+        """
+        Gives a transport back to the pool (or closes it if the pool is full)
+
+        :param: String url
+        :param: Transport transport
+        :return: None
+        """
+        transport.last_used = time.time()
+        key = self.get_key( url )
+        with self.lock:
+            transports = self.transports.setdefault( key, [] )
+            if len( transports ) < self.size:
+                transports.append( transport )
+                return
+        transport.close()
+
+    def discard( self, transport ):
+        """
+        Closes a transport that failed, so it's never reused
+
+        :param: Transport transport
+        :return: None
+        """
+        transport.close()
+
+    def clear( self ):
+        """
+        Closes all idle connections
+
+        :return: None
+        """
+        with self.lock:
+            transports, self.transports = self.transports, {}
+        for key in transports:
+            for transport in transports[key]:
+                transport.close()
+
+
+
+
+
+##########################
+# Pool instance
+##########################
+ron_pool = RonConnectionPool( settings.RON_POOL_SIZE, settings.RON_POOL_IDLE_TIMEOUT, settings.RON_SOCKET_TIMEOUT )
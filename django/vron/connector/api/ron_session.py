@@ -0,0 +1,122 @@
+"""
+RON Session Store
+
+Shares RON session ids (PHPSESSID) between requests and workers through the
+Django cache, so we don't need to login to RON on every Viator request.
+
+"""
+
+##########################
+# Imports
+##########################
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.encoding import force_text
+import threading
+import hashlib
+
+
+
+
+
+##########################
+# Class definitions
+##########################
+class RonSessionStore( object ):
+    """
+    Stores RON session ids by (mode, username, reseller_id)
+
+    """
+
+    def __init__( self, timeout ):
+        """
+        Constructor responsible to set class attributes
+
+        :param: Integer timeout - seconds a session id is reused for
+        :return: None
+        """
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_key( self, mode, username, reseller_id ):
+        """
+        Returns the cache key for a RON session
+
+        :param: String mode
+        :param: String username
+        :param: String reseller_id
+        :return: String
+        """
+        key = u'{0}|{1}|{2}'.format( mode, username, reseller_id ).encode( 'utf-8' )
+        return 'ron_session:' + hashlib.md5( key ).hexdigest()
+
+    def get( self, mode, username, reseller_id ):
+        """
+        Returns a stored session id (or None)
+
+        :param: String mode
+        :param: String username
+        :param: String reseller_id
+        :return: Mixed
+        """
+        session_id = cache.get( self.get_key( mode, username, reseller_id ) )
+        with self.lock:
+            if session_id:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return session_id
+
+    def set( self, mode, username, reseller_id, session_id ):
+        """
+        Stores a session id
+
+        :param: String mode
+        :param: String username
+        :param: String reseller_id
+        :param: String session_id
+        :return: None
+        """
+        cache.set( self.get_key( mode, username, reseller_id ), session_id, self.timeout )
+
+    def delete( self, mode, username, reseller_id ):
+        """
+        Removes an expired session id
+
+        :param: String mode
+        :param: String username
+        :param: String reseller_id
+        :return: None
+        """
+        cache.delete( self.get_key( mode, username, reseller_id ) )
+
+    def get_stats( self ):
+        """
+        Returns hit/miss counters for this process
+
+        :return: Dictionary
+        """
+        with self.lock:
+            return { 'hits': self.hits, 'misses': self.misses }
+
+    def is_session_expired( self, fault ):
+        """
+        Checks if a RON fault means the session is no longer valid (only the
+        exact RON messages, other faults mentioning a session don't count)
+
+        :param: xmlrpclib.Fault fault
+        :return: Boolean
+        """
+        fault_string = force_text( fault.faultString ).strip().rstrip( '.' ).lower()
+        return fault_string in settings.RON_SESSION_EXPIRED_FAULTS
+
+
+
+
+
+##########################
+# Store instance
+##########################
+ron_sessions = RonSessionStore( settings.RON_SESSION_TIMEOUT )
@@ -8,18 +8,198 @@ http://supplierapitestharness.viatorinc.com/documentation.php
 ##########################
 # Imports
 ##########################
-from vron.connector.api.xml_manager import XmlManager
+from vron.connector.api.xml_manager import XmlManager, XmlWriter
+from vron.connector.tracing import traced
+from lxml import etree
+from collections import namedtuple
 import datetime
-from vron.core.util import convert_date_format
+from vron.core.util import convert_date_format, FrozenDict
+from django.utils.encoding import force_text
 import os
 
 
 
 
 
+##########################
+# Viator/RON mapping
+##########################
+
+# Tag a field is read from and whether it's required (mappings are read-only, shared by all requests)
+MappedField = namedtuple( 'MappedField', ['tag', 'required'] )
+
+BOOKING_MAPPING = FrozenDict( {
+    'api_key': MappedField( 'ApiKey', True ),
+    'external_reference': MappedField( 'ExternalReference', True ),
+    'timestamp': MappedField( 'Timestamp', True ),
+    'distributor_id': MappedField( 'ResellerId', True ),
+    'tour_code': MappedField( 'SupplierProductCode', True ),
+    'tour_date': MappedField( 'TravelDate', True ),
+    'voucher_number': MappedField( 'BookingReference', True ),
+    'tour_options': MappedField( 'TourOptions', True ),
+    'basis_id': MappedField( 'TourOptions', True ),
+    'sub_basis_id': MappedField( 'TourOptions', True ),
+    'tour_time_id': MappedField( 'TourOptions', True ),
+    'basis': MappedField( 'TourOptions', True ),
+    'parameters': MappedField( 'Parameter', True ),
+    'age_band_map': MappedField( 'Parameter', True ),
+    'pax_adults': MappedField( 'TourOptions', True ),
+    'pax_infants': MappedField( 'TourOptions', True ),
+    'pax_child': MappedField( 'TourOptions', True ),
+    'pax_foc': MappedField( 'TourOptions', True ),
+    'pax_udef1': MappedField( 'TourOptions', True ),
+    'pickup_point': MappedField( 'PickupPoint', False ),
+    'lead_traveller': MappedField( 'Traveller', True ),
+    'first_name': MappedField( 'GivenName', True ),
+    'last_name': MappedField( 'SurName', True ),
+    'traveller_identifier': MappedField( 'TravellerIdentifier', True ),
+    'contact_detail': MappedField( 'ContactDetail', False ),
+    'email': MappedField( 'ContactValue', False ),
+    'mobile': MappedField( 'ContactValue', False ),
+    'general_comments': MappedField( '', False )
+} )
+AVAILABILITY_MAPPING = FrozenDict( {
+    'api_key': MappedField( 'ApiKey', True ),
+    'external_reference': MappedField( 'ExternalReference', True ),
+    'timestamp': MappedField( 'Timestamp', True ),
+    'distributor_id': MappedField( 'ResellerId', True ),
+    'tour_code': MappedField( 'SupplierProductCode', True ),
+    'start_date': MappedField( 'StartDate', True ),
+    'end_date': MappedField( 'EndDate', False ),
+    'tour_options': MappedField( 'TourOptions', False ),
+    'basis_id': MappedField( 'TourOptions', False ),
+    'sub_basis_id': MappedField( 'TourOptions', False ),
+    'tour_time_id': MappedField( 'TourOptions', False ),
+    'basis': MappedField( 'TourOptions', False ),
+    'parameters': MappedField( 'Parameter', False ),
+    'age_band_map': MappedField( 'Parameter', False )
+} )
+TOUR_LIST_MAPPING = FrozenDict( {
+    'api_key': MappedField( 'ApiKey', True ),
+    'external_reference': MappedField( 'ExternalReference', True ),
+    'timestamp': MappedField( 'Timestamp', True ),
+    'distributor_id': MappedField( 'ResellerId', True ),
+    'parameters': MappedField( 'Parameter', False ),
+    'age_band_map': MappedField( 'Parameter', False )
+} )
+
+# Tags read from the root of the requests (besides the mapped ones)
+ROOT_TAGS = frozenset(
+    [info.tag for mapping in ( BOOKING_MAPPING, AVAILABILITY_MAPPING, TOUR_LIST_MAPPING )
+     for info in mapping.values() if info.tag] +
+    ['SupplierId', 'TravellerMix', 'RequiredInfo', 'SpecialRequirement', 'Amount', 'SupplierNote', 'AdditionalRemarks']
+)
+
+# Compiled once: selects all those root elements (any namespace) in a single pass
+extract_root_elements = etree.XPath(
+    '*[' + ' or '.join( 'local-name()="{0}"'.format( tag ) for tag in sorted( ROOT_TAGS ) ) + ']'
+)
+
+# Required fields to be checked for each request type: ( getter name, error tag )
+BOOKING_REQUIRED = tuple( ( 'get_' + field, info.tag + ' - ' + field ) for field, info in BOOKING_MAPPING.items() if info.required )
+AVAILABILITY_REQUIRED = tuple( ( 'get_' + field, info.tag + ' - ' + field ) for field, info in AVAILABILITY_MAPPING.items() if info.required )
+TOUR_LIST_REQUIRED = tuple( ( 'get_' + field, info.tag + ' - ' + field ) for field, info in TOUR_LIST_MAPPING.items() if info.required )
+
+
+
+
+
+# Fields read from the requests (all start empty and are filled lazily by the getters)
+REQUEST_FIELDS = (
+    'host_id',
+    'api_key',
+    'external_reference',
+    'timestamp',
+    'distributor_id',
+    'tour_code',
+    'tour_date',
+    'voucher_number',
+    'tour_options',
+    'basis_id',
+    'sub_basis_id',
+    'tour_time_id',
+    'basis',
+    'parameters',
+    'age_band_map',
+    'pax_adults',
+    'pax_infants',
+    'pax_child',
+    'pax_foc',
+    'pax_udef1',
+    'pickup_point',
+    'lead_traveller',
+    'first_name',
+    'last_name',
+    'traveller_identifier',
+    'contact_detail',
+    'email',
+    'mobile',
+    'general_comments',
+    'start_date',
+    'end_date',
+)
+
+# Immutable snapshot of a booking request (only the plain values, no xml elements)
+BookingRecord = namedtuple( 'BookingRecord', [
+    'host_id', 'api_key', 'external_reference', 'timestamp', 'distributor_id', 'tour_code', 'tour_date',
+    'voucher_number', 'basis_id', 'sub_basis_id', 'tour_time_id', 'basis', 'age_band_map', 'pax_adults',
+    'pax_infants', 'pax_child', 'pax_foc', 'pax_udef1', 'pickup_point', 'first_name', 'last_name',
+    'traveller_identifier', 'email', 'mobile', 'general_comments'
+] )
+
+
+
+
+
+##########################
+# Function definitions
+##########################
+def append_comment( general_comments, value ):
+    """
+    Returns general comments with one more line
+
+    :param: String general_comments
+    :param: String value
+    :return: String
+    """
+    if general_comments == '':
+        return value
+    return general_comments + os.linesep + value
+
+
+
+
+
 ##########################
 # Class definitions
 ##########################
+class ViatorRequest( object ):
+    """
+    Fields of a Viator request. Slotted, as one is created per request
+
+    """
+
+    __slots__ = REQUEST_FIELDS
+
+    def __init__( self ):
+        """
+        Constructor responsible to set class attributes
+
+        :return: None
+        """
+        for field in self.__slots__:
+            setattr( self, field, '' )
+
+    def freeze( self, record_class ):
+        """
+        Returns an immutable snapshot of the fields of a request type
+
+        :param: Class record_class - e.g. BookingRecord
+        :return: Tuple
+        """
+        return record_class( *[getattr( self, field ) for field in record_class._fields] )
+
+
 class Viator( XmlManager ):
     """
     Viator Class. Responsible for reading the
@@ -27,6 +207,11 @@ class Viator( XmlManager ):
 
     """
 
+    # Viator/RON mapping
+    booking_mapping = BOOKING_MAPPING
+    availability_mapping = AVAILABILITY_MAPPING
+    tour_list_mapping = TOUR_LIST_MAPPING
+
     def __init__( self, request_xml, response_xml ):
         """
         Constructor responsible to set class attributes
@@ -39,95 +224,8 @@ class Viator( XmlManager ):
         # Declares class attributes
         self.request_xml = request_xml
         self.response_xml = response_xml
-        self.host_id = ''
-        self.api_key = ''
-        self.external_reference = ''
-        self.timestamp = ''
-        self.distributor_id = ''
-        self.tour_code = ''
-        self.tour_date = ''
-        self.voucher_number = ''
-        self.tour_options = ''
-        self.basis_id = ''
-        self.sub_basis_id = ''
-        self.tour_time_id = ''
-        self.basis = ''
-        self.parameters = ''
-        self.age_band_map = ''
-        self.pax_adults = ''
-        self.pax_infants = ''
-        self.pax_child = ''
-        self.pax_foc = ''
-        self.pax_udef1 = ''
-        self.pickup_key = ''
-        self.pickup_point = ''
-        self.lead_traveller = ''
-        self.first_name = ''
-        self.last_name = ''
-        self.traveller_identifier = ''
-        self.contact_detail = ''
-        self.email = ''
-        self.mobile = ''
-        self.general_comments = ''
-        self.start_date = ''
-        self.end_date = ''
-
-        # Viator/RON mapping
-        self.booking_mapping = {
-            'api_key': { 'tag': 'ApiKey', 'required': True },
-            'external_reference': { 'tag': 'ExternalReference', 'required': True },
-            'timestamp': { 'tag': 'Timestamp', 'required': True },
-            'distributor_id': { 'tag': 'ResellerId', 'required': True },
-            'tour_code': { 'tag': 'SupplierProductCode', 'required': True },
-            'tour_date': { 'tag': 'TravelDate', 'required': True },
-            'voucher_number': { 'tag': 'BookingReference', 'required': True },
-            'tour_options': { 'tag': 'TourOptions', 'required': True },
-            'basis_id': { 'tag': 'TourOptions', 'required': True },
-            'sub_basis_id': { 'tag': 'TourOptions', 'required': True },
-            'tour_time_id': { 'tag': 'TourOptions', 'required': True },
-            'basis': { 'tag': 'TourOptions', 'required': True },
-            'parameters': { 'tag': 'Parameter', 'required': True },
-            'age_band_map': { 'tag': 'Parameter', 'required': True },
-            'pax_adults': { 'tag': 'TourOptions', 'required': True },
-            'pax_infants': { 'tag': 'TourOptions', 'required': True },
-            'pax_child': { 'tag': 'TourOptions', 'required': True },
-            'pax_foc': { 'tag': 'TourOptions', 'required': True },
-            'pax_udef1': { 'tag': 'TourOptions', 'required': True },
-            'pickup_key': { 'tag': '', 'required': False },
-            'pickup_point': { 'tag': 'PickupPoint', 'required': False },
-            'lead_traveller': { 'tag': 'Traveller', 'required': True },
-            'first_name': { 'tag': 'GivenName', 'required': True },
-            'last_name': { 'tag': 'SurName', 'required': True },
-            'traveller_identifier': { 'tag': 'TravellerIdentifier', 'required': True },
-            'contact_detail': { 'tag': 'ContactDetail', 'required': False },
-            'email': { 'tag': 'ContactValue', 'required': False },
-            'mobile': { 'tag': 'ContactValue', 'required': False },
-            'general_comments': { 'tag': '', 'required': False }
-        }
-        self.availability_mapping = {
-            'api_key': { 'tag': 'ApiKey', 'required': True },
-            'external_reference': { 'tag': 'ExternalReference', 'required': True },
-            'timestamp': { 'tag': 'Timestamp', 'required': True },
-            'distributor_id': { 'tag': 'ResellerId', 'required': True },
-            'tour_code': { 'tag': 'SupplierProductCode', 'required': True },
-            'start_date': { 'tag': 'StartDate', 'required': True },
-            'end_date': { 'tag': 'EndDate', 'required': False },
-            'tour_options': { 'tag': 'TourOptions', 'required': False },
-            'basis_id': { 'tag': 'TourOptions', 'required': False },
-            'sub_basis_id': { 'tag': 'TourOptions', 'required': False },
-            'tour_time_id': { 'tag': 'TourOptions', 'required': False },
-            'basis': { 'tag': 'TourOptions', 'required': False },
-            'parameters': { 'tag': 'Parameter', 'required': False },
-            'age_band_map': { 'tag': 'Parameter', 'required': False }
-        }
-        self.tour_list_mapping = {
-            'api_key': { 'tag': 'ApiKey', 'required': True },
-            'external_reference': { 'tag': 'ExternalReference', 'required': True },
-            'timestamp': { 'tag': 'Timestamp', 'required': True },
-            'distributor_id': { 'tag': 'ResellerId', 'required': True },
-            'parameters': { 'tag': 'Parameter', 'required': False },
-            'age_band_map': { 'tag': 'Parameter', 'required': False }
-        }
+        self.record = ViatorRequest()
+        self.root_elements = None
 
     def check_booking_data( self ):
         """
@@ -135,11 +233,10 @@ class Viator( XmlManager ):
         checks if any is empty or missing
         :return: Mixed (True on success, String tag name on failure)
         """
-        for field, info in self.booking_mapping.iteritems():
-            if info['required']:
-                value = getattr( self, 'get_' + field )()
-                if value == '' or value is None:
-                    return info['tag'] + ' - ' + field
+        for getter, error_tag in BOOKING_REQUIRED:
+            value = getattr( self, getter )()
+            if value == '' or value is None:
+                return error_tag
         return True
 
     def check_availability_data( self ):
@@ -148,11 +245,10 @@ class Viator( XmlManager ):
         checks if any is empty or missing
         :return: Mixed (True on success, String tag name on failure)
         """
-        for field, info in self.availability_mapping.iteritems():
-            if info['required']:
-                value = getattr( self, 'get_' + field )()
-                if value == '' or value is None:
-                    return info['tag'] + ' - ' + field
+        for getter, error_tag in AVAILABILITY_REQUIRED:
+            value = getattr( self, getter )()
+            if value == '' or value is None:
+                return error_tag
         return True
 
     def check_tour_list_data( self ):
@@ -161,11 +257,10 @@ class Viator( XmlManager ):
         checks if any is empty or missing
         :return: Mixed (True on success, String tag name on failure)
         """
-        for field, info in self.tour_list_mapping.iteritems():
-            if info['required']:
-                value = getattr( self, 'get_' + field )()
-                if value == '' or value is None:
-                    return info['tag'] + ' - ' + field
+        for getter, error_tag in TOUR_LIST_REQUIRED:
+            value = getattr( self, getter )()
+            if value == '' or value is None:
+                return error_tag
         return True
 
     def get_content( self, field ):
@@ -173,16 +268,57 @@ class Viator( XmlManager ):
         Returns content of a given field
         :return: String
         """
-        if getattr( self, field ) == '':
-            setattr( self, field, self.request_xml.get_element_text( self.booking_mapping[field]['tag'] ) )
-        return getattr( self, field )
+        if getattr( self.record, field ) == '':
+            setattr( self.record, field, self.get_root_element_text( self.booking_mapping[field].tag ) )
+        return getattr( self.record, field )
+
+    def get_root_elements( self ):
+        """
+        Returns the root elements of the request by tag name, extracted
+        all at once by the precompiled XPath
+        :return: Dictionary
+        """
+        if self.root_elements is None:
+            self.root_elements = {}
+            xml_root = self.request_xml.xml_root
+            if xml_root is not None:
+                for element in extract_root_elements( xml_root ):
+                    self.root_elements.setdefault( etree.QName( element ).localname, [] ).append( element )
+        return self.root_elements
+
+    def get_root_element( self, tag ):
+        """
+        Returns the first root element with the given tag name
+        :return: Mixed
+        """
+        elements = self.get_root_elements().get( tag )
+        if elements:
+            return elements[0]
+        return None
+
+    def get_root_element_text( self, tag ):
+        """
+        Returns the content of the first root element with the given tag name
+        :return: Mixed
+        """
+        element = self.get_root_element( tag )
+        if element is not None:
+            return element.text
+        return None
+
+    def get_root_element_list( self, tag ):
+        """
+        Returns all root elements with the given tag name
+        :return: List
+        """
+        return self.get_root_elements().get( tag, [] )
 
     def get_host_id( self ):
         """
         Returns host_id attribute
         :return: String
         """
-        return self.host_id
+        return self.record.host_id
 
     def get_api_key( self ):
         """
@@ -232,104 +368,104 @@ class Viator( XmlManager ):
         'YYYY-MM-DD' to 'DD-MMM-YYYY
         :return: String
         """
-        if self.tour_date == '':
-            tour_date = self.request_xml.get_element_text( self.booking_mapping['tour_date']['tag'] )
+        if self.record.tour_date == '':
+            tour_date = self.get_root_element_text( self.booking_mapping['tour_date'].tag )
             if tour_date:
                 try:
-                    self.tour_date = convert_date_format( tour_date, '%Y-%m-%d', '%Y-%b-%d' )
+                    self.record.tour_date = convert_date_format( tour_date, '%Y-%m-%d', '%Y-%b-%d' )
                 except ValueError:
-                    self.tour_date = ''
-        return self.tour_date
+                    self.record.tour_date = ''
+        return self.record.tour_date
 
     def get_basis_id( self ):
         """
         Gets basis_id out of tour options
         :return: String
         """
-        if self.basis_id == '':
+        if self.record.basis_id == '':
             self.get_tour_options()
-        return self.basis_id
+        return self.record.basis_id
 
     def get_sub_basis_id( self ):
         """
         Gets sub_basis_id out of tour options
         :return: String
         """
-        if self.sub_basis_id == '':
+        if self.record.sub_basis_id == '':
             self.get_tour_options()
-        return self.sub_basis_id
+        return self.record.sub_basis_id
 
     def get_tour_time_id( self ):
         """
         Gets tour_time_id out of tour options
         :return: String
         """
-        if self.tour_time_id == '':
+        if self.record.tour_time_id == '':
             self.get_tour_options()
-        return self.tour_time_id
+        return self.record.tour_time_id
 
     def get_basis( self ):
         """
         Gets Basis string
         :return: String
         """
-        if self.basis == '':
+        if self.record.basis == '':
             self.get_tour_options()
-        return self.basis
+        return self.record.basis
 
     def get_pax_adults( self ):
         """
         Gets pax_adults out of tour options
         :return: String
         """
-        if self.pax_adults == '':
+        if self.record.pax_adults == '':
             self.get_parameters()
-        return self.pax_adults
+        return self.record.pax_adults
 
     def get_pax_infants( self ):
         """
         Gets pax_infants out of tour options
         :return: String
         """
-        if self.pax_infants == '':
+        if self.record.pax_infants == '':
             self.get_parameters()
-        return self.pax_infants
+        return self.record.pax_infants
 
     def get_pax_child( self ):
         """
         Gets pax_child out of tour options
         :return: String
         """
-        if self.pax_child == '':
+        if self.record.pax_child == '':
             self.get_parameters()
-        return self.pax_child
+        return self.record.pax_child
 
     def get_pax_foc( self ):
         """
         Gets pax_foc out of tour options
         :return: String
         """
-        if self.pax_foc == '':
+        if self.record.pax_foc == '':
             self.get_parameters()
-        return self.pax_foc
+        return self.record.pax_foc
 
     def get_pax_udef1( self ):
         """
         Gets pax_udef1 out of tour options
         :return: String
         """
-        if self.pax_udef1 == '':
+        if self.record.pax_udef1 == '':
             self.get_parameters()
-        return self.pax_udef1
+        return self.record.pax_udef1
 
     def get_age_band_map( self ):
         """
         Gets AgeBandMap string
         :return: String
         """
-        if self.age_band_map == '':
+        if self.record.age_band_map == '':
             self.get_parameters()
-        return self.age_band_map
+        return self.record.age_band_map
 
     def get_pickup_point( self ):
         """
@@ -338,89 +474,67 @@ class Viator( XmlManager ):
         """
         return self.get_content( 'pickup_point' )
 
-    def get_pickup_key( self, tour_pickups ):
-        """
-        Returns PickupPoint tag from root xml
-        :param: Dictionary tour_pickups
-        :return: String
-        """
-        if self.pickup_key == '':
-            pickup_point = self.get_pickup_point()
-            if pickup_point:
-                found = False
-                if tour_pickups and len(tour_pickups) > 0:
-                    for pickup in tour_pickups:
-                        if self.pickup_key == "": # If no match is made, we default the value to the first of the list
-                            self.pickup_key = pickup['strPickupKey']
-                        if pickup_point.lower() == pickup['strPickupName'].lower():
-                            self.pickup_key = pickup['strPickupKey']
-                            found = True
-                            break
-                if not found:
-                    self.append_to_general_comments( 'Pickup point: ' + str( pickup_point ) )
-        return self.pickup_key
-
     def get_first_name( self ):
         """
         Gets first_name out of lead traveller
         :return: String
         """
-        if self.first_name == '':
+        if self.record.first_name == '':
             self.get_lead_traveller()
-        return self.first_name
+        return self.record.first_name
 
     def get_last_name( self ):
         """
         Gets last_name out of lead traveller
         :return: String
         """
-        if self.last_name == '':
+        if self.record.last_name == '':
             self.get_lead_traveller()
-        return self.last_name
+        return self.record.last_name
 
     def get_traveller_identifier( self ):
         """
         Gets last_name out of lead traveller
         :return: String
         """
-        if self.traveller_identifier == '':
+        if self.record.traveller_identifier == '':
             self.get_lead_traveller()
-        return self.traveller_identifier
+        return self.record.traveller_identifier
 
     def get_email( self ):
         """
         Gets email out of ContactDetail
         :return: String
         """
-        if self.email == '':
+        if self.record.email == '':
             self.get_contact_detail()
-        return self.email
+        return self.record.email
 
     def get_mobile( self ):
         """
         Gets mobile out of ContactDetail
         :return: String
         """
-        if self.mobile == '':
+        if self.record.mobile == '':
             self.get_contact_detail()
-        return self.mobile
+        return self.record.mobile
 
     def get_contact_detail( self ):
         """
         Returns ContactDetail tag from root xml
         :return: String
         """
-        if self.contact_detail == '':
-            self.contact_detail = self.request_xml.get_element( self.booking_mapping['contact_detail']['tag'] )
-            if self.contact_detail:
-                type = self.get_element_text( 'ContactType', self.contact_detail )
+        if self.record.contact_detail == '':
+            self.record.contact_detail = self.get_root_element( self.booking_mapping['contact_detail'].tag )
+            if self.record.contact_detail:
+                type = self.get_element_text( 'ContactType', self.record.contact_detail )
                 if type == 'MOBILE':
-                    self.mobile = self.get_element_text( 'ContactValue', self.contact_detail )
+                    self.record.mobile = self.get_element_text( 'ContactValue', self.record.contact_detail )
                 elif type == 'EMAIL':
-                    self.email = self.get_element_text( 'ContactValue', self.contact_detail )
+                    self.record.email = self.get_element_text( 'ContactValue', self.record.contact_detail )
                 elif type == 'NOT_CONTACTABLE':
                     self.append_to_general_comments( 'Contact type: ' + str( type ) )
-        return self.contact_detail
+        return self.record.contact_detail
 
     def get_general_comments( self ):
         """
@@ -429,7 +543,7 @@ class Viator( XmlManager ):
         """
 
         # Gets language information
-        if 'Language code: ' not in self.general_comments:
+        if 'Language code: ' not in self.record.general_comments:
             tour_options = self.get_tour_options()
             if tour_options:
                 language = self.request_xml.get_element( 'Language', tour_options )
@@ -442,15 +556,15 @@ class Viator( XmlManager ):
                         self.append_to_general_comments( 'Language option: ' + str( language_option ) )
 
         # Gets traveller age band information
-        if 'Lead traveller age band: ' not in self.general_comments:
+        if 'Lead traveller age band: ' not in self.record.general_comments:
             lead_traveller = self.get_lead_traveller()
             lead_traveller_age_band = self.request_xml.get_element_text( 'AgeBand', lead_traveller )
             if lead_traveller_age_band:
                 self.append_to_general_comments( 'Lead traveller age band: ' + str( lead_traveller_age_band ) )
 
         # Gets questions information
-        if 'Question: ' not in self.general_comments:
-            required_info = self.request_xml.get_element( 'RequiredInfo' )
+        if 'Question: ' not in self.record.general_comments:
+            required_info = self.get_root_element( 'RequiredInfo' )
             if required_info:
                 questions = self.request_xml.get_element_list( 'Question', required_info )
                 if questions:
@@ -462,39 +576,39 @@ class Viator( XmlManager ):
                             self.append_to_general_comments( 'Answer: ' + str( answer_text ) )
 
         # Gets special requirement information
-        if 'Special requirement: ' not in self.general_comments:
-            special_requirement = self.request_xml.get_element_text( 'SpecialRequirement' )
+        if 'Special requirement: ' not in self.record.general_comments:
+            special_requirement = self.get_root_element_text( 'SpecialRequirement' )
             if special_requirement:
                 self.append_to_general_comments( 'Special requirement: ' + str( special_requirement ) )
 
         #PROPERTY ADDED BY ADEMAR ON 21/04/2016
-        if 'Amount:' not in self.general_comments:
-            amount = self.request_xml.get_element_text('Amount')
+        if 'Amount:' not in self.record.general_comments:
+            amount = self.get_root_element_text( 'Amount' )
             if special_requirement:
                 self.append_to_general_comments('Amount: {0}'.format(amount))
 
          # Gets supplier option name information
         #PROPERTY ADDED BY ADEMAR ON 21/04/2016
-        if 'Tour grade name:' not in self.general_comments:
+        if 'Tour grade name:' not in self.record.general_comments:
             supplier_note = self.request_xml.get_element_text('SupplierOptionName', self.get_tour_options())
             if supplier_note:
                 self.append_to_general_comments('Tour grade name: {0}'.format(supplier_note))
 
         # Gets supplier note information
-        if 'Supplier note:' not in self.general_comments:
-            supplier_note = self.request_xml.get_element_text( 'SupplierNote' )
+        if 'Supplier note:' not in self.record.general_comments:
+            supplier_note = self.get_root_element_text( 'SupplierNote' )
             if supplier_note:
                 self.append_to_general_comments('Supplier note: {0}'.format(supplier_note))
 
         # Gets additional remarks information
-        if 'Remark: ' not in self.general_comments:
-            additional_remarks = self.request_xml.get_element( 'AdditionalRemarks' )
+        if 'Remark: ' not in self.record.general_comments:
+            additional_remarks = self.get_root_element( 'AdditionalRemarks' )
             if additional_remarks:
                 options = list( additional_remarks )
                 for option in options:
                     self.append_to_general_comments( 'Remark: ' + str( option.text ) )
 
-        return self.general_comments
+        return self.record.general_comments
 
     def get_start_date( self ):
         """
@@ -502,14 +616,14 @@ class Viator( XmlManager ):
         'YYYY-MM-DD' to 'DD-MMM-YYYY
         :return: String
         """
-        if self.start_date == '':
-            start_date = self.request_xml.get_element_text( self.availability_mapping['start_date']['tag'] )
+        if self.record.start_date == '':
+            start_date = self.get_root_element_text( self.availability_mapping['start_date'].tag )
             if start_date:
                 try:
-                    self.start_date = convert_date_format( start_date, '%Y-%m-%d', '%Y-%b-%d' )
+                    self.record.start_date = convert_date_format( start_date, '%Y-%m-%d', '%Y-%b-%d' )
                 except ValueError:
-                    self.start_date = ''
-        return self.start_date
+                    self.record.start_date = ''
+        return self.record.start_date
 
     def get_end_date( self ):
         """
@@ -517,31 +631,31 @@ class Viator( XmlManager ):
         'YYYY-MM-DD' to 'DD-MMM-YYYY
         :return: String
         """
-        if self.end_date == '':
-            end_date = self.request_xml.get_element_text( self.availability_mapping['end_date']['tag'] )
+        if self.record.end_date == '':
+            end_date = self.get_root_element_text( self.availability_mapping['end_date'].tag )
             if end_date:
                 try:
-                    self.end_date = convert_date_format( end_date, '%Y-%m-%d', '%Y-%b-%d' )
+                    self.record.end_date = convert_date_format( end_date, '%Y-%m-%d', '%Y-%b-%d' )
                 except ValueError:
-                    self.end_date = ''
-        return self.end_date
+                    self.record.end_date = ''
+        return self.record.end_date
 
     def get_lead_traveller( self ):
         """
         Retrieves TRAVELER INFORMATION to get FIRST AND LAST NAME
         :return: String
         """
-        if self.lead_traveller == '':
-            travellers = self.request_xml.get_element_list( self.booking_mapping['lead_traveller']['tag'] )
+        if self.record.lead_traveller == '':
+            travellers = self.get_root_element_list( self.booking_mapping['lead_traveller'].tag )
             if travellers:
-                self.lead_traveller = travellers
+                self.record.lead_traveller = travellers
                 for traveller in travellers:
                     lead_traveller = self.request_xml.get_element_text( 'LeadTraveller', traveller )
                     if lead_traveller and lead_traveller == 'true':
-                        self.first_name = self.request_xml.get_element_text( 'GivenName', traveller )
-                        self.last_name = self.request_xml.get_element_text( 'Surname', traveller )
-                        self.traveller_identifier = self.request_xml.get_element_text( 'TravellerIdentifier', traveller )
-        return self.lead_traveller
+                        self.record.first_name = self.request_xml.get_element_text( 'GivenName', traveller )
+                        self.record.last_name = self.request_xml.get_element_text( 'Surname', traveller )
+                        self.record.traveller_identifier = self.request_xml.get_element_text( 'TravellerIdentifier', traveller )
+        return self.record.lead_traveller
 
     def get_parameters( self ):
         """
@@ -549,35 +663,35 @@ class Viator( XmlManager ):
         methods
         :return: String
         """
-        if self.parameters == '':
-            self.parameters = self.request_xml.get_element_list( self.booking_mapping['parameters']['tag'] )
-            if self.parameters:
-                for parameter in self.parameters:
+        if self.record.parameters == '':
+            self.record.parameters = self.get_root_element_list( self.booking_mapping['parameters'].tag )
+            if self.record.parameters:
+                for parameter in self.record.parameters:
                     name = self.request_xml.get_element_text( 'Name', parameter )
                     value = self.request_xml.get_element_text( 'Value', parameter )
                     if name == "AgeBandMap":
-                        self.age_band_map = value
+                        self.record.age_band_map = value
                         self.get_age_band_values()
-        return self.parameters
+        return self.record.parameters
 
     def get_tour_options( self ):
         """
         Returns TourOptions tag from root xml
         :return: String
         """
-        if self.tour_options == '':
-            tour_options = self.request_xml.get_element( self.booking_mapping['tour_options']['tag'] )
+        if self.record.tour_options == '':
+            tour_options = self.get_root_element( self.booking_mapping['tour_options'].tag )
             if tour_options:
-                self.tour_options = tour_options
+                self.record.tour_options = tour_options
                 options = list( tour_options )
                 for option in options:
                     name = self.request_xml.get_element_text( 'Name', option )
                     value = self.request_xml.get_element_text( 'Value', option )
                     if name and value:
                         if name == 'Basis':
-                            self.basis = value
+                            self.record.basis = value
                             self.get_basis_values()
-        return self.tour_options
+        return self.record.tour_options
 
     def get_basis_values( self ):
         """
@@ -597,11 +711,11 @@ class Viator( XmlManager ):
                     sub_option = option.split( '=', 2 )
                     if len( sub_option ) > 1:
                         if sub_option[0] == 'B':
-                            self.basis_id = sub_option[1]
+                            self.record.basis_id = sub_option[1]
                         elif sub_option[0] == 'S':
-                            self.sub_basis_id = sub_option[1]
+                            self.record.sub_basis_id = sub_option[1]
                         elif sub_option[0] == 'T':
-                            self.tour_time_id = sub_option[1]
+                            self.record.tour_time_id = sub_option[1]
 
     def get_age_band_values( self ):
         """
@@ -631,7 +745,7 @@ class Viator( XmlManager ):
                 total_pax = 0
                 total_pax_per_type = { 'P1': 0, 'P2': 0, 'P3': 0, 'P4': 0, 'P5': 0 }
                 viator_traveler_map = { 'A': 'Adult', 'C': 'Child', 'Y': 'Youth', 'I': 'Infant', 'S': 'Senior' }
-                traveller_mix = self.request_xml.get_element( 'TravellerMix' )
+                traveller_mix = self.get_root_element( 'TravellerMix' )
                 if traveller_mix:
                     for ( code, tag ) in viator_traveler_map.iteritems():
                         quantity = self.request_xml.get_element_text( tag, traveller_mix )
@@ -639,11 +753,21 @@ class Viator( XmlManager ):
                             total_pax_per_type[age_band_map[code]] += int( quantity )
                             total_pax += int( quantity )
                     if total_pax > 0:
-                        self.pax_adults = total_pax_per_type['P1']
-                        self.pax_infants = total_pax_per_type['P2']
-                        self.pax_child = total_pax_per_type['P3']
-                        self.pax_foc = total_pax_per_type['P4']
-                        self.pax_udef1 = total_pax_per_type['P5']
+                        self.record.pax_adults = total_pax_per_type['P1']
+                        self.record.pax_infants = total_pax_per_type['P2']
+                        self.record.pax_child = total_pax_per_type['P3']
+                        self.record.pax_foc = total_pax_per_type['P4']
+                        self.record.pax_udef1 = total_pax_per_type['P5']
+
+    def get_booking_record( self ):
+        """
+        Returns all booking fields as an immutable record (e.g. for a booking
+        written by another process)
+        :return: BookingRecord
+        """
+        for field in BookingRecord._fields:
+            getattr( self, 'get_' + field )()
+        return self.record.freeze( BookingRecord )
 
     def append_to_general_comments( self, value ):
         """
@@ -651,72 +775,93 @@ class Viator( XmlManager ):
         :param: value
         :return: String
         """
-        if self.general_comments == '':
-            self.general_comments = value
-        else:
-            self.general_comments += os.linesep + value
+        self.record.general_comments = append_comment( self.record.general_comments, value )
 
-    def booking_response( self, confirmation_number, transaction_error, request_error_code = None,
-                          request_error_tag = None, request_error_message = None ):
+    def write_response_header( self, writer ):
         """
-        Formats response in XML for VIATOR
+        Writes the elements identifying the request (common to all responses)
 
-        :return: String
+        :param: XmlWriter writer
+        :return: None
         """
-
-        # Creates root tag to identify it as a Booking Response
-        self.response_xml.create_root_element( 'BookingResponse' )
-
-        # Creates elements to identify the booking request
-        self.response_xml.create_element( 'ApiKey', None, self.get_api_key() )
-        self.response_xml.create_element( 'ResellerId', None, self.get_distributor_id() )
-        self.response_xml.create_element( 'SupplierId', None, self.request_xml.get_element_text( 'SupplierId' ) )
-        self.response_xml.create_element( 'ExternalReference', None, self.get_external_reference() )
+        writer.write_element( 'ApiKey', self.get_api_key() )
+        writer.write_element( 'ResellerId', self.get_distributor_id() )
+        writer.write_element( 'SupplierId', self.get_root_element_text( 'SupplierId' ) )
+        writer.write_element( 'ExternalReference', self.get_external_reference() )
 
         # Creates element for TIMESTAMP
         now = datetime.datetime.now()
         timestamp = now.strftime( "%Y-%m-%dT%H:%M:%S.%j+10:00" ) # %z is not being recognized
-        self.response_xml.create_element( 'Timestamp', None, timestamp )
+        writer.write_element( 'Timestamp', timestamp )
 
-        # Creates element for PARAMETER
-        parameter_element = self.response_xml.create_element( 'Parameter' )
-        self.response_xml.create_element( 'Name', parameter_element, 'AgeBandMap' )
-        self.response_xml.create_element( 'Value', parameter_element, self.get_age_band_map() )
-
-        # Creates TourOptions made for RESPAX
-        """ At the moment test harness say this element is not expected
-        tour_options_element = self.response_xml.create_element( 'TourOptions' )
-        option_element = self.response_xml.create_element( 'Option', tour_options_element )
-        self.response_xml.create_element( 'Name', option_element, 'Basis' )
-        self.response_xml.create_element( 'Value', option_element, self.get_basis() )
+    def write_request_status( self, writer, request_error_code, request_error_tag, request_error_message ):
         """
+        Writes the Request Status element
 
-        # Creates elements to identify the Request Status
-        request_status_element = self.response_xml.create_element( 'RequestStatus' )
+        :param: XmlWriter writer
+        :return: String - request status
+        """
         request_status = 'ERROR' if request_error_code else 'SUCCESS'
-        self.response_xml.create_element( 'Status', request_status_element, request_status )
-        if request_status == 'ERROR':
-            request_error_element = self.response_xml.create_element( 'Error', request_status_element )
-            self.response_xml.create_element( 'ErrorCode', request_error_element, request_error_code )
-            self.response_xml.create_element( 'ErrorMessage', request_error_element, request_error_message )
-            self.response_xml.create_element( 'ErrorDetails', request_error_element, 'Error on TAG ' + request_error_tag )
-
-        # Creates elements to identify the Transaction Status
-        transaction_status_element = self.response_xml.create_element( 'TransactionStatus' )
-        transaction_status = 'CONFIRMED' if confirmation_number else 'REJECTED'
-        self.response_xml.create_element( 'Status', transaction_status_element, transaction_status )
-        if transaction_status == 'REJECTED':
-            reject_reason = 'Request Error' if request_status == 'ERROR' else str( transaction_error )
-            self.response_xml.create_element( 'RejectionReasonDetails', transaction_status_element, reject_reason )
-            self.response_xml.create_element( 'RejectionReason', transaction_status_element, 'OTHER' )
-
-        # Creates elements to identify the booking request
-        supplier_confirmation = confirmation_number if confirmation_number else ''
-        self.response_xml.create_element( 'SupplierConfirmationNumber', None, supplier_confirmation )
+        with writer.element( 'RequestStatus' ):
+            writer.write_element( 'Status', request_status )
+            if request_status == 'ERROR':
+                with writer.element( 'Error' ):
+                    writer.write_element( 'ErrorCode', request_error_code )
+                    writer.write_element( 'ErrorMessage', request_error_message )
+                    writer.write_element( 'ErrorDetails', 'Error on TAG ' + request_error_tag )
+        return request_status
+
+    @traced( 'serialize' )
+    def booking_response( self, confirmation_number, transaction_error, request_error_code = None,
+                          request_error_tag = None, request_error_message = None, transaction_status = None ):
+        """
+        Formats response in XML for VIATOR
+
+        :param: String transaction_status - overrides the status (e.g. 'PENDING' for queued bookings)
+        :return: String
+        """
+
+        # Creates root tag to identify it as a Booking Response
+        writer = XmlWriter()
+        with writer.document( 'BookingResponse' ):
+
+            # Creates elements to identify the booking request
+            self.write_response_header( writer )
+
+            # Creates element for PARAMETER
+            with writer.element( 'Parameter' ):
+                writer.write_element( 'Name', 'AgeBandMap' )
+                writer.write_element( 'Value', self.get_age_band_map() )
+
+            # Creates TourOptions made for RESPAX
+            """ At the moment test harness say this element is not expected
+            with writer.element( 'TourOptions' ):
+                with writer.element( 'Option' ):
+                    writer.write_element( 'Name', 'Basis' )
+                    writer.write_element( 'Value', self.get_basis() )
+            """
+
+            # Creates elements to identify the Request Status
+            request_status = self.write_request_status( writer, request_error_code, request_error_tag, request_error_message )
+
+            # Creates elements to identify the Transaction Status
+            if not transaction_status:
+                transaction_status = 'CONFIRMED' if confirmation_number else 'REJECTED'
+            with writer.element( 'TransactionStatus' ):
+                writer.write_element( 'Status', transaction_status )
+                if transaction_status == 'REJECTED':
+                    reject_reason = 'Request Error' if request_status == 'ERROR' else force_text( transaction_error )
+                    writer.write_element( 'RejectionReasonDetails', reject_reason )
+                    writer.write_element( 'RejectionReason', 'OTHER' )
+
+            # Creates elements to identify the booking request
+            supplier_confirmation = confirmation_number if confirmation_number else ''
+            writer.write_element( 'SupplierConfirmationNumber', supplier_confirmation )
 
         # Returns XML as string
-        return self.response_xml.return_xml_string()
+        return writer.get_value()
 
+    @traced( 'serialize' )
     def availability_response( self, results, transaction_error, request_error_code = None,
                                request_error_tag = None, request_error_message = None ):
         """
@@ -726,68 +871,53 @@ class Viator( XmlManager ):
         """
 
         # Creates root tag to identify it as an Availability Response
-        self.response_xml.create_root_element( 'AvailabilityResponse' )
-
-        # Creates elements to identify the  request
-        self.response_xml.create_element( 'ApiKey', None, self.get_api_key() )
-        self.response_xml.create_element( 'ResellerId', None, self.get_distributor_id() )
-        self.response_xml.create_element( 'SupplierId', None, self.request_xml.get_element_text( 'SupplierId' ) )
-        self.response_xml.create_element( 'ExternalReference', None, self.get_external_reference() )
-
-        # Creates element for TIMESTAMP
-        now = datetime.datetime.now()
-        timestamp = now.strftime( "%Y-%m-%dT%H:%M:%S.%j+10:00" ) # %z is not being recognized
-        self.response_xml.create_element( 'Timestamp', None, timestamp )
-
-        # Creates element for PARAMETER
-        age_band_map = self.get_age_band_map()
-        if age_band_map:
-            parameter_element = self.response_xml.create_element( 'Parameter' )
-            self.response_xml.create_element( 'Name', parameter_element, 'AgeBandMap' )
-            self.response_xml.create_element( 'Value', parameter_element, age_band_map )
-
-        # Creates elements to identify the Request Status
-        request_status_element = self.response_xml.create_element( 'RequestStatus' )
-        request_status = 'ERROR' if request_error_code else 'SUCCESS'
-        self.response_xml.create_element( 'Status', request_status_element, request_status )
-        if request_status == 'ERROR':
-            request_error_element = self.response_xml.create_element( 'Error', request_status_element )
-            self.response_xml.create_element( 'ErrorCode', request_error_element, request_error_code )
-            self.response_xml.create_element( 'ErrorMessage', request_error_element, request_error_message )
-            self.response_xml.create_element( 'ErrorDetails', request_error_element, 'Error on TAG ' + request_error_tag )
-
-        # Creates element for SUPPLIER PRODUCT CODE (TOUR CODE)
-        self.response_xml.create_element( 'SupplierProductCode', None, self.get_tour_code() )
-
-        # Iterates over RON results to build availability response for each prouct option
-        if results:
-            for result in results:
-
-                # creates root element
-                tour_availability = self.response_xml.create_element( 'TourAvailability' )
-
-                # converts date and creates its sub-element
-                tour_date = convert_date_format( result['dteTourDate'], '%Y-%b-%d', '%Y-%m-%d' )
-                self.response_xml.create_element( 'Date', tour_availability, tour_date )
-
-                # creates status element
-                availability_status = self.response_xml.create_element( 'AvailabilityStatus', tour_availability )
-                status = 'AVAILABLE' if result['intAvailability'] > 0 else 'UNAVAILABLE'
-                self.response_xml.create_element( 'Status', availability_status, status )
-                if status == 'UNAVAILABLE':
-                    unavailability_reason = 'SOLD_OUT' if result['boolTrip'] else 'BLOCKED_OUT'
-                    self.response_xml.create_element( 'UnavailabilityReason', availability_status, unavailability_reason )
-
-                # creates tour options element
-                tour_options = self.response_xml.create_element( 'TourOptions', tour_availability )
-                option = self.response_xml.create_element( 'Option', tour_options )
-                self.response_xml.create_element( 'Name', option, 'Basis' )
-                basis_values = "B=" + str( result['intBasisID'] ) + ";S=" + str( result['intSubBasisID'] ) + ";T=" + str( result['intTourTimeID'] )
-                self.response_xml.create_element( 'Value', option, basis_values )
+        writer = XmlWriter()
+        with writer.document( 'AvailabilityResponse' ):
+
+            # Creates elements to identify the  request
+            self.write_response_header( writer )
+
+            # Creates element for PARAMETER
+            age_band_map = self.get_age_band_map()
+            if age_band_map:
+                with writer.element( 'Parameter' ):
+                    writer.write_element( 'Name', 'AgeBandMap' )
+                    writer.write_element( 'Value', age_band_map )
+
+            # Creates elements to identify the Request Status
+            self.write_request_status( writer, request_error_code, request_error_tag, request_error_message )
+
+            # Creates element for SUPPLIER PRODUCT CODE (TOUR CODE)
+            writer.write_element( 'SupplierProductCode', self.get_tour_code() )
+
+            # Iterates over RON results to build availability response for each prouct option
+            if results:
+                for result in results:
+                    with writer.element( 'TourAvailability' ):
+
+                        # converts date and creates its sub-element
+                        tour_date = convert_date_format( result['dteTourDate'], '%Y-%b-%d', '%Y-%m-%d' )
+                        writer.write_element( 'Date', tour_date )
+
+                        # creates status element
+                        status = 'AVAILABLE' if result['intAvailability'] > 0 else 'UNAVAILABLE'
+                        with writer.element( 'AvailabilityStatus' ):
+                            writer.write_element( 'Status', status )
+                            if status == 'UNAVAILABLE':
+                                unavailability_reason = 'SOLD_OUT' if result['boolTrip'] else 'BLOCKED_OUT'
+                                writer.write_element( 'UnavailabilityReason', unavailability_reason )
+
+                        # creates tour options element
+                        with writer.element( 'TourOptions' ):
+                            with writer.element( 'Option' ):
+                                writer.write_element( 'Name', 'Basis' )
+                                basis_values = "B=" + str( result['intBasisID'] ) + ";S=" + str( result['intSubBasisID'] ) + ";T=" + str( result['intTourTimeID'] )
+                                writer.write_element( 'Value', basis_values )
 
         # Returns XML as string
-        return self.response_xml.return_xml_string()
+        return writer.get_value()
 
+    @traced( 'serialize' )
     def tour_list_response( self, tour_list, transaction_error, request_error_code = None,
                                request_error_tag = None, request_error_message = None ):
         """
@@ -795,68 +925,86 @@ class Viator( XmlManager ):
 
         :return: String
         """
+        return b''.join( self.iter_tour_list_response(
+            tour_list, transaction_error, request_error_code, request_error_tag, request_error_message
+        ) )
+
+    def iter_tour_list_response( self, tour_list, transaction_error, request_error_code = None,
+                                 request_error_tag = None, request_error_message = None, on_error = None ):
+        """
+        Formats response in XML for VIATOR, yielding it in parts: the
+        header first and then each Tour as soon as it's read from tour_list
+        (which can be a generator), so it can be streamed
+
+        The request status is in the first part, so an error reading or
+        writing a tour can't become an error response any more. With on_error,
+        the error is passed to it (inside the except block), the partly written
+        Tour is dropped and the list ends there, still closing the document
+
+        :param: Function on_error - called with the exception, None raises it
+        :return: Generator
+        """
 
         # Creates root tag to identify it as a Tour List Response
-        self.response_xml.create_root_element( 'TourListResponse' )
+        writer = XmlWriter()
+        with writer.document( 'TourListResponse' ):
 
-        # Creates elements to identify the  request
-        self.response_xml.create_element( 'ApiKey', None, self.get_api_key() )
-        self.response_xml.create_element( 'ResellerId', None, self.get_distributor_id() )
-        self.response_xml.create_element( 'SupplierId', None, self.request_xml.get_element_text( 'SupplierId' ) )
-        self.response_xml.create_element( 'ExternalReference', None, self.get_external_reference() )
+            # Creates elements to identify the  request
+            self.write_response_header( writer )
 
-        # Creates element for TIMESTAMP
-        now = datetime.datetime.now()
-        timestamp = now.strftime( "%Y-%m-%dT%H:%M:%S.%j+10:00" ) # %z is not being recognized
-        self.response_xml.create_element( 'Timestamp', None, timestamp )
+            # Creates element for PARAMETER
+            age_band_map = self.get_age_band_map()
+            if age_band_map:
+                with writer.element( 'Parameter' ):
+                    writer.write_element( 'Name', 'AgeBandMap' )
+                    writer.write_element( 'Value', age_band_map )
 
-        # Creates element for PARAMETER
-        age_band_map = self.get_age_band_map()
-        if age_band_map:
-            parameter_element = self.response_xml.create_element( 'Parameter' )
-            self.response_xml.create_element( 'Name', parameter_element, 'AgeBandMap' )
-            self.response_xml.create_element( 'Value', parameter_element, age_band_map )
+            # Creates elements to identify the Request Status
+            self.write_request_status( writer, request_error_code, request_error_tag, request_error_message )
+            yield writer.read()
 
-        # Creates elements to identify the Request Status
-        request_status_element = self.response_xml.create_element( 'RequestStatus' )
-        request_status = 'ERROR' if request_error_code else 'SUCCESS'
-        self.response_xml.create_element( 'Status', request_status_element, request_status )
-        if request_status == 'ERROR':
-            request_error_element = self.response_xml.create_element( 'Error', request_status_element )
-            self.response_xml.create_element( 'ErrorCode', request_error_element, request_error_code )
-            self.response_xml.create_element( 'ErrorMessage', request_error_element, request_error_message )
-            self.response_xml.create_element( 'ErrorDetails', request_error_element, 'Error on TAG ' + request_error_tag )
-
-        # Iterates over RON results to build tour list response for each tour option
-        if tour_list:
-            for tour in tour_list:
-
-                # creates tour root element
-                tour_element = self.response_xml.create_element( 'Tour' )
-
-                # creates main tour information elements
-                self.response_xml.create_element( 'SupplierProductCode', tour_element, tour['tour']['tour_code'] )
-                self.response_xml.create_element( 'SupplierProductName', tour_element, tour['tour']['tour_name'] )
-                self.response_xml.create_element( 'CountryCode', tour_element, tour['tour']['country_code'] )
-                self.response_xml.create_element( 'DestinationCode', tour_element, tour['tour']['destination_code'] )
-                self.response_xml.create_element( 'DestinationName', tour_element, tour['tour']['destination_name'] )
-                self.response_xml.create_element( 'TourDescription', tour_element, tour['tour']['tour_description'] )
-
-                # creates tour options elements
-                if tour['options']:
-                    for option in tour['options']:
-                        # Basic option info
-                        #creates a new TourOption each iteration
-                        tour_options_element = self.response_xml.create_element( 'TourOption', tour_element )
-                        
-                        #self.response_xml.create_element( 'SupplierOptionCode', tour_options_element, option['option_code'] )
-                        #self.response_xml.create_element( 'SupplierOptionName', tour_options_element, option['option_name'] )
-                        self.response_xml.create_element( 'TourDepartureTime', tour_options_element, option['departure_time'] )
-                        # Basis Info
-                        option_element = self.response_xml.create_element( 'Option', tour_options_element )
-                        self.response_xml.create_element( 'Name', option_element, 'Basis' )
-                        basis_values = "B=" + str( option['basis_id'] ) + ";S=" + str( option['sub_basis_id'] ) + ";T=" + str( option['tour_time_id'] )
-                        self.response_xml.create_element( 'Value', option_element, basis_values )
+            # Iterates over RON results to build tour list response for each tour option
+            if tour_list:
+                try:
+                    for tour in tour_list:
+                        self.write_tour( writer, tour )
+                        yield writer.read()
+                except Exception as error:
+                    if on_error is None:
+                        raise
+                    writer.read()
+                    on_error( error )
 
-        # Returns XML as string
-        return self.response_xml.return_xml_string()
+        # Closes root tag
+        yield writer.read()
+
+    def write_tour( self, writer, tour ):
+        """
+        Writes the Tour element of a tour list entry
+
+        :param: XmlWriter writer
+        :param: Dictionary tour
+        :return: None
+        """
+        with writer.element( 'Tour' ):
+
+            # creates main tour information elements
+            writer.write_element( 'SupplierProductCode', tour['tour']['tour_code'] )
+            writer.write_element( 'SupplierProductName', tour['tour']['tour_name'] )
+            writer.write_element( 'CountryCode', tour['tour']['country_code'] )
+            writer.write_element( 'DestinationCode', tour['tour']['destination_code'] )
+            writer.write_element( 'DestinationName', tour['tour']['destination_name'] )
+            writer.write_element( 'TourDescription', tour['tour']['tour_description'] )
+
+            # creates tour options elements (a new TourOption each iteration)
+            if tour['options']:
+                for option in tour['options']:
+                    with writer.element( 'TourOption' ):
+                        #writer.write_element( 'SupplierOptionCode', option['option_code'] )
+                        #writer.write_element( 'SupplierOptionName', option['option_name'] )
+                        writer.write_element( 'TourDepartureTime', option['departure_time'] )
+                        # Basis Info
+                        with writer.element( 'Option' ):
+                            writer.write_element( 'Name', 'Basis' )
+                            basis_values = "B=" + str( option['basis_id'] ) + ";S=" + str( option['sub_basis_id'] ) + ";T=" + str( option['tour_time_id'] )
+                            writer.write_element( 'Value', basis_values )
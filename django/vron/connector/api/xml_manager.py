@@ -12,10 +12,10 @@ We're using http://lxml.de/
 # Imports
 ##########################
 from lxml import etree, objectify
-from django.utils.html import strip_spaces_between_tags
-import codecs
+from django.utils import six
 from django.utils.encoding import force_text, force_str
-import re
+from contextlib import contextmanager
+import io
 
 
 
@@ -31,6 +31,12 @@ class XmlManager( object ):
 
     """
 
+    # Bytes read at once from file-like contents
+    chunk_size = 16384
+
+    # Namespace of the response root elements
+    namespace = "http://toursgds.com/api/01"
+
     def __init__( self, xml_raw = None ):
         """
         Constructor responsible to set class attributes
@@ -51,42 +57,66 @@ class XmlManager( object ):
         """
         Validate XML content
 
-        :param: xml_raw
+        The raw content is fed straight into the lxml parser (no intermediate
+        copies). Namespaces are kept, lookups are namespace-agnostic instead.
+
+        :param: xml_raw - String/bytes or file-like object (read in chunks)
         :return: Mixed - False on failure, lxml root on success
         """
 
-        # Removes space in the beginning and end
-        xml_raw = xml_raw.strip()
-
-        # Tests if it's empty
-        if xml_raw == '':
-            self.error_message = 'The content was empty'
-            return False
-
-        # Checks if the xml came URL encoded
-        if xml_raw[:5] == 'data=':
-            url_encoded = xml_raw.split( '=', 1 )
-            xml_raw = url_encoded[1]
-
-        # Removes empty lines and spaces between tags
-        xml = re.sub( r'\r|\n|\t|\b|\v', '', xml_raw )
-        xml = strip_spaces_between_tags( xml )
-
-        # Tests if it starts with a tag
-        if xml == '' or xml[0] != '<':
-            self.error_message = 'Invalid XML - Missing starting tag'
-            return False
+        # Reads the content in chunks
+        if hasattr( xml_raw, 'read' ):
+            chunks = iter( lambda: xml_raw.read( self.chunk_size ), b'' )
+        else:
+            chunks = [xml_raw]
 
-        # Tries to parse with lxml
+        # Feeds the parser, checking the beginning of the content first
+        parser = etree.XMLParser( remove_blank_text = True )
+        started = False
         try:
-            parser = etree.XMLParser( remove_blank_text = True )
-            xml_root = etree.fromstring( codecs.encode( xml, 'utf-8' ), parser )
-            self.xml_root = self.cleanup( xml_root )
+            for chunk in chunks:
+                if isinstance( chunk, six.text_type ):
+                    chunk = chunk.encode( 'utf-8' )
+                if not started:
+
+                    # Removes space in the beginning and checks if the xml came URL encoded
+                    chunk = chunk.lstrip()
+                    if chunk[:5] == b'data=':
+                        chunk = chunk[5:].lstrip()
+                    if not chunk:
+                        continue
+
+                    # Tests if it starts with a tag
+                    if chunk[:1] != b'<':
+                        self.error_message = 'Invalid XML - Missing starting tag'
+                        return False
+                    started = True
+                parser.feed( chunk )
+
+            # Tests if it's empty
+            if not started:
+                self.error_message = 'The content was empty'
+                return False
+            self.xml_root = parser.close()
             return True
         except etree.XMLSyntaxError as error:
             self.error_message = "Malformed xml (" + force_str( error ) + ")"
             return False
 
+    def get_path( self, element_name, base_element ):
+        """
+        Qualifies an element name with the namespace of the base element,
+        so lookups work whatever the (default) namespace of the request is
+
+        :param: String element_name
+        :param: Lxml element base_element
+        :return: String
+        """
+        tag = base_element.tag
+        if tag[:1] == '{':
+            return tag[:tag.index( '}' ) + 1] + element_name
+        return element_name
+
     def cleanup( self, xml_root ):
         """
         Cleanup ixml object
@@ -120,7 +150,7 @@ class XmlManager( object ):
         :param: String element_name
         :return: Boolean
         """
-        self.xml_root = etree.Element( element_name, xmlns = "http://toursgds.com/api/01" )
+        self.xml_root = etree.Element( element_name, xmlns = self.namespace )
         return True
 
     def get_tag_name( self, element = None, base_element = None ):
@@ -135,7 +165,7 @@ class XmlManager( object ):
             element = self.xml_root
         if not etree.iselement( element ):
             element = self.get_element( element, base_element )
-        return element.tag
+        return etree.QName( element ).localname
 
     def get_element( self, element_name, base_element = None ):
         """
@@ -151,7 +181,7 @@ class XmlManager( object ):
                 return None
         else:
             base_element = self.xml_root
-        element = base_element.find( element_name )
+        element = base_element.find( self.get_path( element_name, base_element ) )
         if element == 'None':
             return None
         return element
@@ -217,7 +247,7 @@ class XmlManager( object ):
         """
         if base_element is None:
             base_element = self.xml_root
-        elements = base_element.findall( element_name )
+        elements = base_element.findall( self.get_path( element_name, base_element ) )
         if elements == 'None':
             return None
         return elements
@@ -231,4 +261,93 @@ class XmlManager( object ):
         """
         if element is None:
             element = self.xml_root
-        return etree.tostring( element, xml_declaration = True, encoding = 'UTF-8' )
\ No newline at end of file
+        return etree.tostring( element, xml_declaration = True, encoding = 'UTF-8' )
+
+
+class XmlWriter( object ):
+    """
+    Writes xml documents incrementally (lxml xmlfile) straight to an
+    output buffer, instead of building the whole tree first. Usage:
+
+        writer = XmlWriter()
+        with writer.document( 'TourListResponse' ):
+            writer.write_element( 'ApiKey', api_key )
+            with writer.element( 'Tour' ):
+                writer.write_element( 'SupplierProductCode', tour_code )
+        writer.get_value()
+
+    The output is the same as XmlManager.return_xml_string would give
+    for the same elements.
+
+    """
+
+    def __init__( self ):
+        """
+        Constructor responsible to set class attributes
+
+        :return: None
+        """
+        self.output = io.BytesIO()
+        self.xml_file = None
+
+    @contextmanager
+    def document( self, root_name ):
+        """
+        Writes the xml declaration and the root element (with the
+        response namespace), closing it at the end of the block
+
+        :param: String root_name
+        :return: None
+        """
+        with etree.xmlfile( self.output, encoding = 'UTF-8' ) as xml_file:
+            xml_file.write_declaration()
+            with xml_file.element( root_name, xmlns = XmlManager.namespace ):
+                self.xml_file = xml_file
+                yield
+        self.xml_file = None
+
+    def element( self, element_name ):
+        """
+        Opens an element, closed at the end of the with block
+
+        :param: String element_name
+        :return: Context manager
+        """
+        return self.xml_file.element( element_name )
+
+    def write_element( self, element_name, text = None ):
+        """
+        Writes an element with its content (empty elements are self-closed,
+        exactly like XmlManager.create_element only sets a text when there's one)
+
+        :param: String element_name
+        :param: Mixed text
+        :return: None
+        """
+        if text:
+            with self.xml_file.element( element_name ):
+                self.xml_file.write( force_text( text ) )
+        else:
+            self.xml_file.write( etree.Element( element_name ) )
+
+    def read( self ):
+        """
+        Returns what was written since the last read (so documents can be
+        sent while they're written) and empties the output buffer
+
+        :return: Bytes
+        """
+        if self.xml_file is not None:
+            self.xml_file.flush()
+        value = self.output.getvalue()
+        self.output.seek( 0 )
+        self.output.truncate()
+        return value
+
+    def get_value( self ):
+        """
+        Returns the whole document written
+
+        :return: Bytes
+        """
+        return self.output.getvalue()
@@ -0,0 +1,27 @@
+"""
+Applications configurations file.
+
+Check documentation on: https://docs.djangoproject.com/en/1.7/ref/applications/
+"""
+
+##########################
+# Imports
+##########################
+from django.apps import AppConfig
+
+
+
+
+
+##########################
+# Classes definitions
+##########################
+class ConnectorConfig( AppConfig ):
+
+    name = 'vron.connector'
+    verbose_name = 'Connector'
+
+    def ready( self ):
+
+        # import signal handlers
+        import vron.connector.signals
@@ -0,0 +1,8 @@
+"""
+Benchmarks
+
+Measures the connector offline, against a local RON stand-in server
+(see the 'benchmark' management command), and the XML layer on its own
+(see the 'benchmark_xml' management command).
+
+"""
@@ -0,0 +1,242 @@
+"""
+RON Stand-in Server
+
+A local XML-RPC server answering the RON methods used by the connector
+with generated data, so the connector can be benchmarked offline. Every
+HTTP request (a single call or a whole multicall) waits for the
+configured latency before being answered, like a round trip to RON.
+
+Connections are kept alive (HTTP/1.1), as the RON connection pool expects.
+
+"""
+
+##########################
+# Imports
+##########################
+from SimpleXMLRPCServer import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+from SocketServer import ThreadingMixIn
+import threading
+import xmlrpclib
+import uuid
+import time
+
+
+
+
+
+##########################
+# Class definitions
+##########################
+class RonRequestHandler( SimpleXMLRPCRequestHandler ):
+    """
+    Keep-alive request handler accepting any path (the RON url
+    carries the config and the session id in the query string)
+
+    """
+    protocol_version = 'HTTP/1.1'
+    rpc_paths = ()
+
+    def log_message( self, format, *args ):
+        """
+        Requests are not logged
+
+        :return: None
+        """
+        pass
+
+
+class RonServer( ThreadingMixIn, SimpleXMLRPCServer ):
+    """
+    Emulates RON for a catalogue of generated tours
+
+    """
+    daemon_threads = True
+
+    def __init__( self, latency = 0.05, tour_count = 50, times_per_tour = 2, bases_per_tour = 2,
+                  pickups_per_tour = 5, port = 0 ):
+        """
+        Constructor responsible to set class attributes
+
+        :param: Float latency - seconds each HTTP request waits before being answered
+        :param: Integer tour_count - tours returned by readTours
+        :param: Integer times_per_tour
+        :param: Integer bases_per_tour
+        :param: Integer pickups_per_tour
+        :param: Integer port - 0 picks a free one
+        :return: None
+        """
+        SimpleXMLRPCServer.__init__(
+            self, ( '127.0.0.1', port ), requestHandler = RonRequestHandler,
+            logRequests = False, allow_none = True
+        )
+        self.latency = latency
+        self.tour_count = tour_count
+        self.times_per_tour = times_per_tour
+        self.bases_per_tour = bases_per_tour
+        self.pickups_per_tour = pickups_per_tour
+        self.tour_codes = ['BENCH{0:04d}'.format( i ) for i in range( 1, tour_count + 1 )]
+        self.known_tour_codes = frozenset( self.tour_codes )
+        self.lock = threading.Lock()
+        self.confirmation_number = 100000
+        self.thread = None
+
+        # RON methods
+        self.register_function( self.login, 'login' )
+        self.register_function( self.read_tours, 'readTours' )
+        self.register_function( self.read_tour_times, 'readTourTimes' )
+        self.register_function( self.read_tour_bases, 'readTourBases' )
+        self.register_function( self.read_tour_web_details, 'readTourWebDetails' )
+        self.register_function( self.read_tour_availability_range, 'readTourAvailabilityRange' )
+        self.register_function( self.read_tour_pickups, 'readTourPickups' )
+        self.register_function( self.write_reservation, 'writeReservation' )
+        self.register_multicall_functions()
+
+    def get_url( self ):
+        """
+        Returns the url to be set as the RON server on the config
+
+        :return: String
+        """
+        return 'http://127.0.0.1:{0}/server-ron.php?config=train'.format( self.server_address[1] )
+
+    def start( self ):
+        """
+        Serves requests in a background thread
+
+        :return: None
+        """
+        self.thread = threading.Thread( target = self.serve_forever, name = 'vron-ron-server' )
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop( self ):
+        """
+        Stops serving requests and closes the socket
+
+        :return: None
+        """
+        self.shutdown()
+        self.server_close()
+
+    def _marshaled_dispatch( self, data, dispatch_method = None, path = None ):
+        """
+        Answers a HTTP request after the configured latency
+
+        :return: String
+        """
+        if self.latency:
+            time.sleep( self.latency )
+        return SimpleXMLRPCServer._marshaled_dispatch( self, data, dispatch_method, path )
+
+    def check_tour_code( self, tour_code ):
+        """
+        Faults like RON for unknown tours
+
+        :param: String tour_code
+        :return: None
+        """
+        if tour_code not in self.known_tour_codes:
+            raise xmlrpclib.Fault( 1, 'Invalid tour code: {0}'.format( tour_code ) )
+
+    def login( self, username, password, reseller_id ):
+        """
+        Returns a new session id
+
+        :return: String
+        """
+        return 'PHPSESSID=' + uuid.uuid4().hex
+
+    def read_tours( self, host_id ):
+        """
+        Returns the code and name of every tour
+
+        :return: List
+        """
+        return [
+            { 'strTourCode': tour_code, 'strTourName': 'Benchmark Tour ' + tour_code[5:] }
+            for tour_code in self.tour_codes
+        ]
+
+    def read_tour_times( self, host_id, tour_code ):
+        """
+        Returns the departure times of a tour
+
+        :return: List
+        """
+        self.check_tour_code( tour_code )
+        return [
+            {
+                'intTourTimeID': i,
+                'strTourTime': '{0:02d}:00'.format( 7 + i ),
+                'dteTourTime': { 'iso8601': '19700101T{0:02d}:00:00'.format( 7 + i ) },
+            }
+            for i in range( 1, self.times_per_tour + 1 )
+        ]
+
+    def read_tour_bases( self, host_id, tour_code ):
+        """
+        Returns the bases (fare types) of a tour
+
+        :return: List
+        """
+        self.check_tour_code( tour_code )
+        return [
+            { 'intBasisID': i, 'intSubBasisID': i, 'strBasisDesc': 'Basis {0}'.format( i ) }
+            for i in range( 1, self.bases_per_tour + 1 )
+        ]
+
+    def read_tour_web_details( self, host_id, tour_code, images = True ):
+        """
+        Returns the promotional details of a tour
+
+        :return: Dictionary
+        """
+        self.check_tour_code( tour_code )
+        return {
+            'strTourCode': tour_code,
+            'strCatchPhrase': 'A benchmark tour with a short catch phrase ({0})'.format( tour_code ),
+            'strDescription': 'Generated by the RON stand-in server. ' * 10,
+        }
+
+    def read_tour_availability_range( self, options ):
+        """
+        Returns the availability of every option (a few are sold out)
+
+        :param: List options
+        :return: List
+        """
+        results = []
+        for i, option in enumerate( options ):
+            self.check_tour_code( option['strTourCode'] )
+            result = dict( option )
+            result['intAvailability'] = 0 if i % 7 == 6 else 20
+            result['boolTrip'] = True
+            results.append( result )
+        return results
+
+    def read_tour_pickups( self, host_id, tour_code, tour_time_id, basis_id ):
+        """
+        Returns the pickup points of a tour, time and basis
+
+        :return: List
+        """
+        self.check_tour_code( tour_code )
+        return [
+            {
+                'strPickupKey': '{0}-{1}'.format( tour_code, i ),
+                'strPickupName': 'Benchmark Hotel {0}'.format( i ),
+                'strPickupTime': '07:{0:02d}'.format( i ),
+            }
+            for i in range( 1, self.pickups_per_tour + 1 )
+        ]
+
+    def write_reservation( self, host_id, reservation_id, reservation, payment, options ):
+        """
+        Returns a new confirmation number
+
+        :return: Integer
+        """
+        self.check_tour_code( reservation['strTourCode'] )
+        with self.lock:
+            self.confirmation_number += 1
+            return self.confirmation_number
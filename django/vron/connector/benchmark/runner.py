@@ -0,0 +1,119 @@
+"""
+Benchmark Runner
+
+Replays Viator requests through the Api (as the API view does) from a
+number of concurrent threads, measuring the latency of each request and
+the RON calls it made.
+
+"""
+
+##########################
+# Imports
+##########################
+from django.core.cache import cache
+from django.db import connection
+from django.utils import six
+from vron.connector.api.api import Api
+import threading
+import logging
+import Queue
+import math
+import time
+
+
+
+
+
+##########################
+# Function definitions
+##########################
+def get_percentile( values, percentile ):
+    """
+    Returns a percentile of sorted values (nearest rank)
+
+    :param: List values - sorted
+    :param: Float percentile - 0 to 1
+    :return: Mixed - None when there are no values
+    """
+    if not values:
+        return None
+    rank = int( math.ceil( percentile * len( values ) ) )
+    return values[max( rank, 1 ) - 1]
+
+
+def replay( xml_raw, mode = 'train' ):
+    """
+    Handles a request through the Api, reading the whole response
+
+    :param: String xml_raw
+    :param: String mode
+    :return: Tuple ( Float latency, Integer ron_calls, Boolean succeeded )
+    """
+    start = time.time()
+    api = Api( xml_raw, mode )
+    content = api.process()
+    if not isinstance( content, six.binary_type ):
+        content = b''.join( content )
+    return time.time() - start, api.ron.call_count, b'<Status>SUCCESS</Status>' in content
+
+
+def run_benchmark( build_request, count, concurrency = 1, mode = 'train', cold = False ):
+    """
+    Replays requests and summarizes their latencies
+
+    :param: Function build_request - receives the request number, returns the request xml
+    :param: Integer count - requests replayed
+    :param: Integer concurrency - threads replaying them
+    :param: String mode
+    :param: Boolean cold - clears the cache before each request (so every request calls RON)
+    :return: Dictionary - requests, errors, elapsed and requests_per_second, latency
+             percentiles p50/p95/p99 (seconds) and average ron_calls per request
+    """
+    numbers = Queue.Queue()
+    for number in range( count ):
+        numbers.put( number )
+    results = []
+    lock = threading.Lock()
+
+    def work():
+        try:
+            while True:
+                try:
+                    number = numbers.get_nowait()
+                except Queue.Empty:
+                    return
+                if cold:
+                    cache.clear()
+                start = time.time()
+                try:
+                    result = replay( build_request( number ), mode )
+                except Exception:
+                    logging.getLogger( __name__ ).exception( 'Request %d failed', number )
+                    result = ( time.time() - start, 0, False )
+                with lock:
+                    results.append( result )
+        finally:
+            connection.close()
+
+    # Replays all requests
+    threads = [threading.Thread( target = work, name = 'vron-benchmark-{0}'.format( i ) ) for i in range( max( concurrency, 1 ) )]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+
+    # Summarizes results
+    latencies = sorted( latency for latency, ron_calls, succeeded in results )
+    requests = len( results )
+    return {
+        'requests': requests,
+        'errors': len( [result for result in results if not result[2]] ),
+        'elapsed': elapsed,
+        'requests_per_second': requests / elapsed if elapsed else 0,
+        'p50': get_percentile( latencies, 0.5 ),
+        'p95': get_percentile( latencies, 0.95 ),
+        'p99': get_percentile( latencies, 0.99 ),
+        'ron_calls': float( sum( result[1] for result in results ) ) / requests if requests else 0,
+    }
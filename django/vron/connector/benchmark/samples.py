@@ -0,0 +1,179 @@
+"""
+Viator Sample Requests
+
+Builds Viator requests (as sent by Viator's test harness) for the tours of
+the RON stand-in server, to be replayed by the benchmarks.
+
+"""
+
+##########################
+# Imports
+##########################
+import datetime
+
+
+
+
+
+##########################
+# Constants
+##########################
+BOOKING_REQUEST = u"""<?xml version="1.0" encoding="UTF-8"?>
+<BookingRequest xmlns="http://toursgds.com/api/01">
+    <ApiKey>{api_key}</ApiKey>
+    <ResellerId>{reseller_id}</ResellerId>
+    <SupplierId>{host_id}</SupplierId>
+    <ExternalReference>{external_reference}</ExternalReference>
+    <Timestamp>{timestamp}</Timestamp>
+    <Parameter>
+        <Name>AgeBandMap</Name>
+        <Value>A=P1;C=P3;Y=P1;I=P2;S=P1</Value>
+    </Parameter>
+    <BookingReference>{external_reference}</BookingReference>
+    <TravelDate>{travel_date}</TravelDate>
+    <SupplierProductCode>{tour_code}</SupplierProductCode>
+    <TourOptions>
+        <SupplierOptionCode>1</SupplierOptionCode>
+        <SupplierOptionName>Basis 1</SupplierOptionName>
+        <Option>
+            <Name>Basis</Name>
+            <Value>B=1;S=1;T=1</Value>
+        </Option>
+        <Language>
+            <LanguageCode>en</LanguageCode>
+            <LanguageOption>GUIDE</LanguageOption>
+        </Language>
+    </TourOptions>
+    <Amount>100.00</Amount>
+    <TravellerMix>
+        <Total>{travellers_total}</Total>
+        <Adult>{travellers_total}</Adult>
+    </TravellerMix>
+{travellers}
+    <ContactDetail>
+        <ContactType>EMAIL</ContactType>
+        <ContactName>Benchmark Traveller</ContactName>
+        <ContactValue>benchmark@example.com</ContactValue>
+    </ContactDetail>
+    <PickupPoint>Benchmark Hotel 2</PickupPoint>
+    <SpecialRequirement>Vegetarian meal</SpecialRequirement>
+    <SupplierNote>Replayed by the benchmark</SupplierNote>
+</BookingRequest>"""
+
+TRAVELLER = u"""    <Traveller>
+        <TravellerIdentifier>{number}</TravellerIdentifier>
+        <TravellerTitle>MR</TravellerTitle>
+        <GivenName>Traveller{number}</GivenName>
+        <Surname>Benchmark</Surname>
+        <AgeBand>ADULT</AgeBand>
+        <LeadTraveller>{lead}</LeadTraveller>
+    </Traveller>"""
+
+AVAILABILITY_REQUEST = u"""<?xml version="1.0" encoding="UTF-8"?>
+<AvailabilityRequest xmlns="http://toursgds.com/api/01">
+    <ApiKey>{api_key}</ApiKey>
+    <ResellerId>{reseller_id}</ResellerId>
+    <SupplierId>{host_id}</SupplierId>
+    <ExternalReference>{external_reference}</ExternalReference>
+    <Timestamp>{timestamp}</Timestamp>
+    <Parameter>
+        <Name>AgeBandMap</Name>
+        <Value>A=P1;C=P3;Y=P1;I=P2;S=P1</Value>
+    </Parameter>
+    <StartDate>{start_date}</StartDate>
+    <EndDate>{end_date}</EndDate>
+    <SupplierProductCode>{tour_code}</SupplierProductCode>
+</AvailabilityRequest>"""
+
+TOUR_LIST_REQUEST = u"""<?xml version="1.0" encoding="UTF-8"?>
+<TourListRequest xmlns="http://toursgds.com/api/01">
+    <ApiKey>{api_key}</ApiKey>
+    <ResellerId>{reseller_id}</ResellerId>
+    <SupplierId>{host_id}</SupplierId>
+    <ExternalReference>{external_reference}</ExternalReference>
+    <Timestamp>{timestamp}</Timestamp>
+</TourListRequest>"""
+
+
+
+
+
+##########################
+# Function definitions
+##########################
+def get_values( api_key, host_id, reseller_id, external_reference ):
+    """
+    Returns the values common to all requests
+
+    :param: String api_key
+    :param: String host_id
+    :param: String reseller_id
+    :param: String external_reference
+    :return: Dictionary
+    """
+    return {
+        'api_key': api_key,
+        'host_id': host_id,
+        'reseller_id': reseller_id,
+        'external_reference': external_reference,
+        'timestamp': datetime.datetime.now().strftime( '%Y-%m-%dT%H:%M:%S.000+10:00' ),
+    }
+
+
+def booking_request( api_key, host_id, reseller_id, external_reference, tour_code, days_ahead = 30, travellers = 2 ):
+    """
+    Returns a BookingRequest (with a pickup point, so pickups are read)
+
+    :param: String api_key
+    :param: String host_id
+    :param: String reseller_id
+    :param: String external_reference - must be unique, retries are answered without booking
+    :param: String tour_code
+    :param: Integer days_ahead - travel date
+    :param: Integer travellers - adults, the first one is the lead traveller
+    :return: String - utf-8
+    """
+    values = get_values( api_key, host_id, reseller_id, external_reference )
+    values['tour_code'] = tour_code
+    values['travellers_total'] = travellers
+    values['travellers'] = u'\n'.join(
+        TRAVELLER.format( number = number, lead = 'true' if number == 1 else 'false' )
+        for number in range( 1, travellers + 1 )
+    )
+    values['travel_date'] = ( datetime.date.today() + datetime.timedelta( days = days_ahead ) ).isoformat()
+    return BOOKING_REQUEST.format( **values ).encode( 'utf-8' )
+
+
+def availability_request( api_key, host_id, reseller_id, external_reference, tour_code, days = 7, days_ahead = 30 ):
+    """
+    Returns an AvailabilityRequest for all options of a tour over a date range
+
+    :param: String api_key
+    :param: String host_id
+    :param: String reseller_id
+    :param: String external_reference
+    :param: String tour_code
+    :param: Integer days - dates in the range
+    :param: Integer days_ahead - first date
+    :return: String - utf-8
+    """
+    start_date = datetime.date.today() + datetime.timedelta( days = days_ahead )
+    values = get_values( api_key, host_id, reseller_id, external_reference )
+    values['tour_code'] = tour_code
+    values['start_date'] = start_date.isoformat()
+    values['end_date'] = ( start_date + datetime.timedelta( days = max( days, 1 ) - 1 ) ).isoformat()
+    return AVAILABILITY_REQUEST.format( **values ).encode( 'utf-8' )
+
+
+def tour_list_request( api_key, host_id, reseller_id, external_reference ):
+    """
+    Returns a TourListRequest
+
+    :param: String api_key
+    :param: String host_id
+    :param: String reseller_id
+    :param: String external_reference
+    :return: String - utf-8
+    """
+    values = get_values( api_key, host_id, reseller_id, external_reference )
+    return TOUR_LIST_REQUEST.format( **values ).encode( 'utf-8' )
@@ -0,0 +1,243 @@
+"""
+XML Microbenchmarks
+
+Times the XML layer on its own (no RON, no DB): parsing and cleaning up
+requests (XmlManager), the Viator getters and required data checks, and
+the three response builders, for small, typical and very large inputs.
+
+Results can be saved as a JSON baseline and compared with later runs, so
+optimizations (and regressions) of the XML handling show up as numbers.
+
+"""
+
+##########################
+# Imports
+##########################
+from lxml import etree
+from collections import OrderedDict
+from vron.connector.api.xml_manager import XmlManager
+from vron.connector.api.viator import Viator
+from vron.connector.api.catalogue import build_tour_info
+from vron.connector.benchmark import samples
+import platform
+import datetime
+import timeit
+import json
+import copy
+
+
+
+
+
+##########################
+# Constants
+##########################
+
+# Input sizes: travellers per booking, tours in the tour list, options and dates of the availability results
+SIZES = OrderedDict( [
+    ( 'small', { 'travellers': 1, 'tours': 1, 'products': 1, 'days': 1 } ),
+    ( 'typical', { 'travellers': 4, 'tours': 50, 'products': 4, 'days': 7 } ),
+    ( 'large', { 'travellers': 100, 'tours': 500, 'products': 4, 'days': 365 } ),
+] )
+
+API_KEY = 'XMLBENCHMARKKEYBENCH'
+HOST_ID = 'BENCH'
+RESELLER_ID = '1000'
+
+
+
+
+
+##########################
+# Function definitions
+##########################
+def make_tour_list( count ):
+    """
+    Returns a tour list (as stored on the catalogue) with 2 times and 2 bases per tour
+
+    :param: Integer count - tours
+    :return: List
+    """
+    tour_list = []
+    for i in range( 1, count + 1 ):
+        tour = { 'strTourCode': 'BENCH{0:04d}'.format( i ), 'strTourName': 'Benchmark Tour {0:04d}'.format( i ) }
+        tour_times = [
+            { 'intTourTimeID': j, 'dteTourTime': { 'iso8601': '19700101T{0:02d}:00:00'.format( 7 + j ) } }
+            for j in range( 1, 3 )
+        ]
+        tour_bases = [
+            { 'intBasisID': j, 'intSubBasisID': j, 'strBasisDesc': 'Basis {0}'.format( j ) }
+            for j in range( 1, 3 )
+        ]
+        tour_web_details = { 'strCatchPhrase': u'A benchmark tour with a short catch phrase ({0:04d})'.format( i ) }
+        tour_list.append( build_tour_info( tour, tour_times, tour_bases, tour_web_details ) )
+    return tour_list
+
+
+def make_availability_results( products, days ):
+    """
+    Returns RON availability results for a number of options and dates (a few sold out)
+
+    :param: Integer products - basis/time options
+    :param: Integer days - dates from 30 days ahead
+    :return: List
+    """
+    start_date = datetime.date.today() + datetime.timedelta( days = 30 )
+    results = []
+    for product in range( 1, products + 1 ):
+        for day in range( days ):
+            results.append( {
+                'strTourCode': 'BENCH0001',
+                'intBasisID': product,
+                'intSubBasisID': product,
+                'intTourTimeID': product,
+                'dteTourDate': ( start_date + datetime.timedelta( days = day ) ).strftime( '%Y-%b-%d' ),
+                'intAvailability': 0 if day % 7 == 6 else 20,
+                'boolTrip': True,
+            } )
+    return results
+
+
+def get_cases( size ):
+    """
+    Returns the cases of a size, built once (inputs aren't part of the timings)
+
+    :param: String size - see SIZES
+    :return: List of ( String name, Function ) tuples
+    """
+    values = SIZES[size]
+    booking_xml = samples.booking_request(
+        API_KEY, HOST_ID, RESELLER_ID, 'xml-benchmark-booking', 'BENCH0001', travellers = values['travellers']
+    )
+    availability_xml = samples.availability_request(
+        API_KEY, HOST_ID, RESELLER_ID, 'xml-benchmark-availability', 'BENCH0001', values['days']
+    )
+    tour_list_xml = samples.tour_list_request( API_KEY, HOST_ID, RESELLER_ID, 'xml-benchmark-tour-list' )
+    booking_request = XmlManager( booking_xml )
+    availability_request = XmlManager( availability_xml )
+    tour_list_request = XmlManager( tour_list_xml )
+    tour_list = make_tour_list( values['tours'] )
+    results = make_availability_results( values['products'], values['days'] )
+
+    def read_booking():
+        Viator( booking_request, XmlManager() ).get_booking_record()
+
+    # Responses are built from requests already read (as the Api does)
+    booking_viator = Viator( booking_request, XmlManager() )
+    booking_viator.check_booking_data()
+    availability_viator = Viator( availability_request, XmlManager() )
+    availability_viator.check_availability_data()
+    tour_list_viator = Viator( tour_list_request, XmlManager() )
+    tour_list_viator.check_tour_list_data()
+
+    return [
+        ( 'xml.validate_and_load', lambda: XmlManager().validate_and_load( booking_xml ) ),
+        ( 'xml.cleanup', lambda: booking_request.cleanup( copy.deepcopy( booking_request.xml_root ) ) ),
+        ( 'viator.getters', read_booking ),
+        ( 'viator.check_booking_data', lambda: Viator( booking_request, XmlManager() ).check_booking_data() ),
+        ( 'viator.check_availability_data', lambda: Viator( availability_request, XmlManager() ).check_availability_data() ),
+        ( 'viator.check_tour_list_data', lambda: Viator( tour_list_request, XmlManager() ).check_tour_list_data() ),
+        ( 'viator.booking_response', lambda: booking_viator.booking_response( 123456, '' ) ),
+        ( 'viator.availability_response', lambda: availability_viator.availability_response( results, '' ) ),
+        ( 'viator.tour_list_response', lambda: tour_list_viator.tour_list_response( tour_list, '' ) ),
+    ]
+
+
+def measure( function, repeat = 5, min_time = 0.2 ):
+    """
+    Times a function (garbage collection off, like timeit): calls are looped
+    until a loop takes at least min_time, then the loop is repeated
+
+    :param: Function function
+    :param: Integer repeat - loops timed
+    :param: Float min_time - seconds a loop takes at least
+    :return: Dictionary - best and median seconds per call, number of calls per loop and repeat
+    """
+    timer = timeit.Timer( function )
+    number = 1
+    while number < 1000000:
+        if timer.timeit( number ) >= min_time:
+            break
+        number *= 2
+    times = sorted( elapsed / number for elapsed in timer.repeat( repeat, number ) )
+    return {
+        'best': times[0],
+        'median': times[len( times ) // 2],
+        'number': number,
+        'repeat': repeat,
+    }
+
+
+def run_xml_benchmarks( sizes = None, match = None, repeat = 5, min_time = 0.2 ):
+    """
+    Runs the cases of the sizes
+
+    :param: List sizes - None runs all
+    :param: String match - only cases whose name contains it
+    :param: Integer repeat
+    :param: Float min_time
+    :return: OrderedDict { 'case[size]': measurement (see measure) }
+    """
+    results = OrderedDict()
+    for size in sizes or SIZES.keys():
+        for name, function in get_cases( size ):
+            if match and match not in name:
+                continue
+            results['{0}[{1}]'.format( name, size )] = measure( function, repeat, min_time )
+    return results
+
+
+def save_baseline( path, results ):
+    """
+    Saves results as a JSON baseline (with the versions they were measured with)
+
+    :param: String path
+    :param: Dictionary results
+    :return: None
+    """
+    baseline = {
+        'created': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'lxml': etree.__version__,
+        'results': results,
+    }
+    with open( path, 'w' ) as baseline_file:
+        json.dump( baseline, baseline_file, indent = 2, sort_keys = True )
+
+
+def load_baseline( path ):
+    """
+    Loads a JSON baseline
+
+    :param: String path
+    :return: Dictionary
+    """
+    with open( path ) as baseline_file:
+        return json.load( baseline_file )
+
+
+def compare( results, baseline, threshold = 0.1 ):
+    """
+    Compares results with a baseline (best times per call)
+
+    :param: Dictionary results
+    :param: Dictionary baseline - see load_baseline
+    :param: Float threshold - change flagged as a regression (or improvement), 0.1 is 10%
+    :return: OrderedDict { 'case[size]': Dictionary - baseline and current seconds, ratio and status
+             ('regression', 'faster', 'same', or 'new' when it isn't on the baseline) }
+    """
+    comparison = OrderedDict()
+    for key, result in results.items():
+        previous = baseline['results'].get( key )
+        if previous is None:
+            comparison[key] = { 'baseline': None, 'current': result['best'], 'ratio': None, 'status': 'new' }
+            continue
+        ratio = result['best'] / previous['best'] if previous['best'] else 1.0
+        if ratio > 1 + threshold:
+            status = 'regression'
+        elif ratio < 1 - threshold:
+            status = 'faster'
+        else:
+            status = 'same'
+        comparison[key] = { 'baseline': previous['best'], 'current': result['best'], 'ratio': ratio, 'status': status }
+    return comparison
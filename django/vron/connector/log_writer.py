@@ -0,0 +1,283 @@
+"""
+Request Log Writer
+
+Log events are queued in memory and written to the DB by a background
+thread, so the Viator response doesn't wait for them. Events of the same
+external reference are coalesced and every batch is written in a single
+transaction (one update per existing log and a bulk insert for the others).
+Events without an external reference (e.g. malformed requests) can't be
+matched to a log, so each of them is inserted as a new log.
+"""
+
+##########################
+# Imports
+##########################
+from django.conf import settings
+from django.db import transaction, close_old_connections, IntegrityError
+from django.db.models import F
+from django.utils import timezone
+from vron.connector.models import Log
+from collections import OrderedDict
+import threading
+import logging
+import atexit
+import Queue
+import time
+import os
+
+
+
+
+
+##########################
+# Constants
+##########################
+# Request stats an event may carry (see Api.get_stats)
+STATS_FIELDS = ( 'request_type', 'host_id', 'duration', 'ron_time', 'ron_calls', 'response_size' )
+
+
+
+
+
+##########################
+# Class definitions
+##########################
+class LogWriter( object ):
+    """
+    Background writer for the request logs
+
+    """
+
+    def __init__( self, flush_interval, batch_size ):
+        """
+        Constructor responsible to set class attributes
+
+        :param: Float flush_interval - max seconds an event waits in the queue
+        :param: Integer batch_size - max events written at once
+        :return: None
+        """
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.queue = Queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+        self.logger = logging.getLogger( __name__ )
+
+    def enqueue( self, external_reference, log_status_id, error_message, ron_confirmation_number, stats = None ):
+        """
+        Queues a log event
+
+        :param: String external_reference
+        :param: Integer log_status_id
+        :param: String error_message
+        :param: Integer ron_confirmation_number
+        :param: Dictionary stats - request stats (see STATS_FIELDS)
+        :return: None
+        """
+        self.start()
+        self.queue.put( self.get_event( external_reference, log_status_id, error_message, ron_confirmation_number, stats ) )
+
+    def get_event( self, external_reference, log_status_id, error_message, ron_confirmation_number, stats = None ):
+        """
+        Returns a log event
+
+        :param: String external_reference
+        :param: Integer log_status_id
+        :param: String error_message
+        :param: Integer ron_confirmation_number
+        :param: Dictionary stats - request stats (see STATS_FIELDS)
+        :return: Dictionary
+        """
+        event = {
+            'external_reference': external_reference,
+            'log_status_id': log_status_id,
+            'error_message': error_message,
+            'ron_confirmation_number': ron_confirmation_number,
+        }
+        if stats:
+            event.update( stats )
+        return event
+
+    def start( self ):
+        """
+        Starts the writer thread (once per process, so it works after forking)
+
+        :return: None
+        """
+        if self.pid == os.getpid() and self.thread is not None and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.pid != os.getpid() or self.thread is None or not self.thread.is_alive():
+                if self.pid != os.getpid():
+                    self.queue = Queue.Queue()
+                self.pid = os.getpid()
+                self.thread = threading.Thread( target = self.run, name = 'vron-log-writer' )
+                self.thread.daemon = True
+                self.thread.start()
+
+    def run( self ):
+        """
+        Writer thread loop
+
+        :return: None
+        """
+        while True:
+            events = self.get_events()
+            if events:
+                close_old_connections()
+                self.write( events )
+
+    def get_events( self, block = True ):
+        """
+        Takes a batch of events from the queue, waiting up to
+        flush_interval for the batch to fill up
+
+        :param: Boolean block - waits for the first event
+        :return: List
+        """
+        events = []
+        try:
+            events.append( self.queue.get( block ) )
+        except Queue.Empty:
+            return events
+        deadline = time.time() + self.flush_interval
+        while len( events ) < self.batch_size:
+            timeout = deadline - time.time()
+            try:
+                if block and timeout > 0:
+                    events.append( self.queue.get( True, timeout ) )
+                else:
+                    events.append( self.queue.get_nowait() )
+            except Queue.Empty:
+                break
+        return events
+
+    def flush( self ):
+        """
+        Writes all queued events now (in the calling thread)
+
+        :return: None
+        """
+        events = self.get_events( False )
+        while events:
+            self.write( events )
+            events = self.get_events( False )
+
+    def coalesce( self, events ):
+        """
+        Merges events by external reference (last event wins, counting them all,
+        stats are kept from the last event carrying them). Events without an
+        external reference are never merged
+
+        :param: List events
+        :return: OrderedDict - entries by external reference (or event position)
+        """
+        entries = OrderedDict()
+        for position, event in enumerate( events ):
+            key = event['external_reference']
+            if key is None:
+                key = ( None, position )
+            entry = entries.setdefault( key, { 'count': 0 } )
+            entry.update( event )
+            entry['count'] += 1
+        return entries
+
+    def write( self, events ):
+        """
+        Writes a batch of events to the DB
+
+        Existing logs are updated with a single UPDATE each (attempts are
+        incremented in the DB), the others are bulk inserted. If another
+        process inserts one of them first, the unique external reference
+        makes the insert fail and the batch falls back to log by log upserts.
+
+        :param: List events
+        :return: None
+        """
+        entries = self.coalesce( events )
+        try:
+            with transaction.atomic():
+                missing = [entry for entry in entries.values() if not self.update( entry['external_reference'], entry )]
+                if missing:
+                    try:
+                        with transaction.atomic():
+                            Log.objects.bulk_create( [self.build( entry['external_reference'], entry ) for entry in missing] )
+                    except IntegrityError:
+                        for entry in missing:
+                            self.upsert( entry['external_reference'], entry )
+        except Exception:
+            self.logger.exception( 'Could not write %d request log events', len( events ) )
+
+    def build( self, reference, entry ):
+        """
+        Returns a new log for an entry (the first event counts as no attempt)
+
+        :param: String reference
+        :param: Dictionary entry
+        :return: Log
+        """
+        log = Log(
+            external_reference = reference,
+            log_status_id = entry['log_status_id'],
+            error_message = entry['error_message'],
+            ron_confirmation_number = entry['ron_confirmation_number'],
+            attempts = entry['count'] - 1,
+        )
+        for field in STATS_FIELDS:
+            setattr( log, field, entry.get( field ) )
+        return log
+
+    def update( self, reference, entry ):
+        """
+        Updates the log of an entry, if there's one (entries without an
+        external reference never match a log, they're always inserted)
+
+        :param: String reference
+        :param: Dictionary entry
+        :return: Boolean
+        """
+        if reference is None:
+            return False
+        values = {
+            'log_status': entry['log_status_id'],
+            'error_message': entry['error_message'],
+            'attempts': F( 'attempts' ) + entry['count'],
+            'modified_date': timezone.now(),
+        }
+
+        # A confirmation number is never cleared (retries of a booking are answered with it)
+        if entry['ron_confirmation_number'] is not None:
+            values['ron_confirmation_number'] = entry['ron_confirmation_number']
+
+        # Stats are set with the same update (events without them keep the ones stored)
+        for field in STATS_FIELDS:
+            if entry.get( field ) is not None:
+                values[field] = entry[field]
+        return Log.objects.filter( external_reference = reference ).update( **values ) > 0
+
+    def upsert( self, reference, entry ):
+        """
+        Inserts the log of an entry, or updates it when another process inserted it first
+
+        :param: String reference
+        :param: Dictionary entry
+        :return: None
+        """
+        try:
+            with transaction.atomic():
+                self.build( reference, entry ).save()
+        except IntegrityError:
+            if reference is None:
+                raise
+            self.update( reference, entry )
+
+
+
+
+
+##########################
+# Writer instance
+##########################
+log_writer = LogWriter( settings.LOG_FLUSH_INTERVAL, settings.LOG_BATCH_SIZE )
+atexit.register( log_writer.flush )
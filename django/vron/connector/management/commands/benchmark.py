@@ -0,0 +1,169 @@
+"""
+Benchmark Command
+
+Measures the connector's throughput offline: starts a local RON stand-in
+server, creates a test database (like the test runner, so no real data is
+touched) pointing the train RON server to it, replays Viator requests
+through the Api and reports requests/sec, latency percentiles and RON
+calls per request for each request type.
+
+    python manage.py benchmark --requests 500 --concurrency 8 --latency 0.05
+
+"""
+
+##########################
+# Imports
+##########################
+from optparse import make_option
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from vron.connector.models import Config, Key
+from vron.connector.log_writer import log_writer
+from vron.connector.benchmark.ron_server import RonServer
+from vron.connector.benchmark.runner import run_benchmark
+from vron.connector.benchmark import samples
+import uuid
+import time
+
+
+
+
+
+##########################
+# Constants
+##########################
+
+# Host and reseller the requests are sent for (the host's API key is created on the test database)
+HOST_ID = 'BENCH'
+RESELLER_ID = '1000'
+
+REQUEST_TYPES = ( 'booking', 'availability', 'tour_list' )
+
+
+
+
+
+##########################
+# Class definitions
+##########################
+class Command( BaseCommand ):
+    """
+    Offline benchmark of the API
+
+    """
+    help = 'Benchmarks the API against a local RON stand-in server (on a test database)'
+    option_list = BaseCommand.option_list + (
+        make_option( '--requests', type = 'int', dest = 'requests', default = 200,
+                     help = 'Requests replayed per request type (default: 200)' ),
+        make_option( '--concurrency', type = 'int', dest = 'concurrency', default = 1,
+                     help = 'Threads replaying the requests (default: 1)' ),
+        make_option( '--warmup', type = 'int', dest = 'warmup', default = 5,
+                     help = 'Requests replayed per request type before measuring (default: 5)' ),
+        make_option( '--types', dest = 'types', default = ','.join( REQUEST_TYPES ),
+                     help = 'Request types to replay, comma separated (default: all)' ),
+        make_option( '--latency', type = 'float', dest = 'latency', default = 0.05,
+                     help = 'Seconds the RON stand-in takes to answer each HTTP request (default: 0.05)' ),
+        make_option( '--tours', type = 'int', dest = 'tours', default = 50,
+                     help = 'Tours in the RON stand-in catalogue (default: 50)' ),
+        make_option( '--days', type = 'int', dest = 'days', default = 7,
+                     help = 'Dates in each availability request (default: 7)' ),
+        make_option( '--cold', action = 'store_true', dest = 'cold', default = False,
+                     help = 'Clears the cache before each request, so every request calls RON. '
+                            'Only meant for a local cache, as the configured cache is cleared' ),
+        make_option( '--noinput', action = 'store_false', dest = 'interactive', default = True,
+                     help = 'Destroys an old test database without asking' ),
+    )
+
+    def handle( self, *args, **options ):
+        """
+        Runs the benchmark
+
+        :return: None
+        """
+        request_types = [request_type.strip() for request_type in options['types'].split( ',' ) if request_type.strip()]
+        for request_type in request_types:
+            if request_type not in REQUEST_TYPES:
+                raise CommandError( 'Unknown request type: {0} (use {1})'.format( request_type, ', '.join( REQUEST_TYPES ) ) )
+        if options['requests'] < 1 or options['tours'] < 1:
+            raise CommandError( '--requests and --tours must be at least 1' )
+
+        # Starts RON stand-in and the test database
+        server = RonServer( options['latency'], options['tours'] )
+        server.start()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db( verbosity = 0, autoclobber = not options['interactive'] )
+        try:
+            api_key = self.setup( server.get_url() )
+            self.stdout.write( 'RON stand-in at {0}: {1} tours, {2}s latency, {3} requests per type '
+                               '({4} threads{5})'.format( server.get_url(), options['tours'], options['latency'],
+                                                          options['requests'], options['concurrency'],
+                                                          ', cold cache' if options['cold'] else '' ) )
+            self.stdout.write( '' )
+            self.stdout.write( '{0:<14}{1:>10}{2:>8}{3:>10}{4:>11}{5:>11}{6:>11}{7:>16}'.format(
+                'Request type', 'Requests', 'Errors', 'Req/s', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)', 'RON calls/req'
+            ) )
+
+            # Replays each request type
+            for request_type in request_types:
+                if options['warmup'] > 0:
+                    build_request = self.get_request_builder( request_type, api_key, server.tour_codes, options['days'] )
+                    run_benchmark( build_request, options['warmup'], 1, 'train', options['cold'] )
+                build_request = self.get_request_builder( request_type, api_key, server.tour_codes, options['days'] )
+                result = run_benchmark( build_request, options['requests'], options['concurrency'], 'train', options['cold'] )
+                self.stdout.write( '{0:<14}{1:>10}{2:>8}{3:>10.1f}{4:>11.1f}{5:>11.1f}{6:>11.1f}{7:>16.2f}'.format(
+                    request_type, result['requests'], result['errors'], result['requests_per_second'],
+                    ( result['p50'] or 0 ) * 1000, ( result['p95'] or 0 ) * 1000, ( result['p99'] or 0 ) * 1000,
+                    result['ron_calls']
+                ) )
+        finally:
+
+            # Writes pending request logs before the test database is destroyed
+            log_writer.flush()
+            time.sleep( settings.LOG_FLUSH_INTERVAL )
+            connection.creation.destroy_test_db( old_name, verbosity = 0 )
+            server.stop()
+
+    def setup( self, ron_url ):
+        """
+        Points the train RON server to the stand-in and creates
+        the benchmark API key (on the test database)
+
+        :param: String ron_url
+        :return: String - API key
+        """
+        config = Config.objects.get( pk = settings.ID_CONFIG_RON_TEST_URL )
+        config.value = ron_url
+        config.save()
+
+        # A username of its own, so the RON sessions shared through the cache never clash
+        config = Config.objects.get( pk = settings.ID_CONFIG_RON_USERNAME )
+        config.value = 'vron-benchmark'
+        config.save()
+
+        Key.objects.create( name = HOST_ID, comments = 'Benchmark' )
+        return Config.objects.get( pk = settings.ID_CONFIG_BASE_API_KEY ).value + HOST_ID
+
+    def get_request_builder( self, request_type, api_key, tour_codes, days ):
+        """
+        Returns a function building the requests of a type (every request has
+        a unique external reference, so bookings are never answered as retries,
+        and the tours are taken in turns)
+
+        :param: String request_type
+        :param: String api_key
+        :param: List tour_codes
+        :param: Integer days - dates in each availability request
+        :return: Function
+        """
+        run_id = uuid.uuid4().hex[:8]
+
+        def build_request( number ):
+            external_reference = '{0}-{1}-{2}'.format( request_type, run_id, number )
+            tour_code = tour_codes[number % len( tour_codes )]
+            if request_type == 'booking':
+                return samples.booking_request( api_key, HOST_ID, RESELLER_ID, external_reference, tour_code )
+            elif request_type == 'availability':
+                return samples.availability_request( api_key, HOST_ID, RESELLER_ID, external_reference, tour_code, days )
+            return samples.tour_list_request( api_key, HOST_ID, RESELLER_ID, external_reference )
+        return build_request
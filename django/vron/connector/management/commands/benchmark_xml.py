@@ -0,0 +1,113 @@
+"""
+XML Benchmark Command
+
+Runs the XML layer microbenchmarks (see vron.connector.benchmark.xml_benchmarks),
+optionally saving the results as a JSON baseline or comparing them with one.
+Comparisons fail (non-zero exit) when any case got slower than the threshold.
+
+    python manage.py benchmark_xml --save xml_baseline.json
+    python manage.py benchmark_xml --compare xml_baseline.json --threshold 0.1
+
+"""
+
+##########################
+# Imports
+##########################
+from optparse import make_option
+from django.core.management.base import BaseCommand, CommandError
+from vron.connector.benchmark.xml_benchmarks import SIZES, run_xml_benchmarks, save_baseline, load_baseline, compare
+
+
+
+
+
+##########################
+# Class definitions
+##########################
+class Command( BaseCommand ):
+    """
+    XML layer microbenchmarks
+
+    """
+    help = 'Microbenchmarks of the XML layer (XmlManager and Viator), with JSON baselines'
+    option_list = BaseCommand.option_list + (
+        make_option( '--sizes', dest = 'sizes', default = ','.join( SIZES.keys() ),
+                     help = 'Input sizes, comma separated (default: all)' ),
+        make_option( '--match', dest = 'match', default = None,
+                     help = 'Only runs the cases whose name contains this text (e.g. "response")' ),
+        make_option( '--repeat', type = 'int', dest = 'repeat', default = 5,
+                     help = 'Timed loops per case, the best one is reported (default: 5)' ),
+        make_option( '--min-time', type = 'float', dest = 'min_time', default = 0.2,
+                     help = 'Minimum seconds of each timed loop (default: 0.2)' ),
+        make_option( '--save', dest = 'save', default = None,
+                     help = 'Saves the results as a JSON baseline' ),
+        make_option( '--compare', dest = 'compare', default = None,
+                     help = 'Compares the results with a JSON baseline' ),
+        make_option( '--threshold', type = 'float', dest = 'threshold', default = 0.1,
+                     help = 'Change flagged when comparing, 0.1 is 10%% (default: 0.1)' ),
+    )
+
+    def handle( self, *args, **options ):
+        """
+        Runs the benchmarks
+
+        :return: None
+        """
+        sizes = [size.strip() for size in options['sizes'].split( ',' ) if size.strip()]
+        for size in sizes:
+            if size not in SIZES:
+                raise CommandError( 'Unknown size: {0} (use {1})'.format( size, ', '.join( SIZES.keys() ) ) )
+        if options['repeat'] < 1 or options['min_time'] <= 0:
+            raise CommandError( '--repeat must be at least 1 and --min-time more than 0' )
+        baseline = load_baseline( options['compare'] ) if options['compare'] else None
+
+        # Runs and prints results
+        results = run_xml_benchmarks( sizes, options['match'], options['repeat'], options['min_time'] )
+        if baseline is None:
+            self.stdout.write( '{0:<45}{1:>12}{2:>12}{3:>10}'.format( 'Case', 'Best', 'Median', 'Calls' ) )
+            for key, result in results.items():
+                self.stdout.write( '{0:<45}{1:>12}{2:>12}{3:>10}'.format(
+                    key, self.format_time( result['best'] ), self.format_time( result['median'] ), result['number']
+                ) )
+        else:
+            regressions = self.write_comparison( compare( results, baseline, options['threshold'] ) )
+
+        if options['save']:
+            save_baseline( options['save'], results )
+            self.stdout.write( 'Baseline saved to {0}'.format( options['save'] ) )
+        if baseline is not None and regressions:
+            raise CommandError( '{0} case(s) more than {1:.0%} slower than the baseline'.format( regressions, options['threshold'] ) )
+
+    def write_comparison( self, comparison ):
+        """
+        Prints a comparison with the baseline
+
+        :param: Dictionary comparison - see xml_benchmarks.compare
+        :return: Integer - regressions
+        """
+        self.stdout.write( '{0:<45}{1:>12}{2:>12}{3:>10}  {4}'.format( 'Case', 'Baseline', 'Current', 'Change', 'Status' ) )
+        regressions = 0
+        for key, result in comparison.items():
+            if result['status'] == 'regression':
+                regressions += 1
+            self.stdout.write( '{0:<45}{1:>12}{2:>12}{3:>10}  {4}'.format(
+                key,
+                self.format_time( result['baseline'] ) if result['baseline'] is not None else '-',
+                self.format_time( result['current'] ),
+                '{0:+.1%}'.format( result['ratio'] - 1 ) if result['ratio'] is not None else '-',
+                result['status'].upper() if result['status'] == 'regression' else result['status']
+            ) )
+        return regressions
+
+    def format_time( self, seconds ):
+        """
+        Formats a time per call
+
+        :param: Float seconds
+        :return: String
+        """
+        if seconds >= 1:
+            return '{0:.2f} s'.format( seconds )
+        if seconds >= 0.001:
+            return '{0:.2f} ms'.format( seconds * 1000 )
+        return '{0:.1f} us'.format( seconds * 1000000 )
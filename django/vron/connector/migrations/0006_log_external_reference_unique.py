@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.db.models import Count
+
+
+#######################
+# ACTIONS
+#######################
+def remove_duplicate_logs( apps, schema_editor ):
+
+    # Get models to use (historical version)
+    Log = apps.get_model( "connector", "Log" )
+
+    # Keeps one log per external reference, the latest with a confirmation number (a booking
+    # written in RON) or else the latest, adding up the attempts of all of them
+    duplicates = Log.objects.exclude(
+        external_reference__isnull = True
+    ).values(
+        'external_reference'
+    ).annotate(
+        total = Count( 'id' )
+    ).filter(
+        total__gt = 1
+    )
+    for duplicate in duplicates:
+        logs = list( Log.objects.filter( external_reference = duplicate['external_reference'] ).order_by( '-id' ) )
+        confirmed = [log for log in logs if log.ron_confirmation_number is not None]
+        kept = confirmed[0] if confirmed else logs[0]
+        kept.attempts = sum( log.attempts for log in logs )
+        kept.save()
+        Log.objects.filter( pk__in = [log.id for log in logs if log.id != kept.id] ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connector', '0005_log_ron_confirmation_number'),
+    ]
+
+    operations = [
+        migrations.RunPython( remove_duplicate_logs ),
+        migrations.AlterField(
+            model_name='log',
+            name='external_reference',
+            field=models.CharField(null=True, max_length=40, verbose_name='external reference', blank=True, unique=True),
+            preserve_default=True,
+        ),
+        migrations.AlterIndexTogether(
+            name='log',
+            index_together=set([('log_status', 'id')]),
+        ),
+    ]
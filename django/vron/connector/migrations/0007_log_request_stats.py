@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connector', '0006_log_external_reference_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='log',
+            name='request_type',
+            field=models.CharField(choices=[('booking', 'Booking'), ('availability', 'Availability'), ('tour_list', 'Tour List')], max_length=20, verbose_name='request type', blank=True, null=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='log',
+            name='host_id',
+            field=models.CharField(max_length=20, verbose_name='host id', blank=True, null=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='log',
+            name='duration',
+            field=models.FloatField(db_index=True, verbose_name='duration (s)', blank=True, null=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='log',
+            name='ron_time',
+            field=models.FloatField(verbose_name='RON time (s)', blank=True, null=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='log',
+            name='ron_calls',
+            field=models.IntegerField(verbose_name='RON calls', blank=True, null=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='log',
+            name='response_size',
+            field=models.IntegerField(verbose_name='response size (bytes)', blank=True, null=True),
+            preserve_default=True,
+        ),
+    ]
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+#######################
+# ACTIONS
+#######################
+def create_snapshot_versions( apps, schema_editor ):
+
+    # Get models to use (historical version)
+    SnapshotVersion = apps.get_model( "connector", "SnapshotVersion" )
+
+    # Creates the versions of the config and API key snapshots
+    SnapshotVersion.objects.create( name = 'config' )
+    SnapshotVersion.objects.create( name = 'keys' )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connector', '0007_log_request_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, verbose_name='ID', primary_key=True, serialize=False)),
+                ('created_date', models.DateTimeField(auto_now_add=True, verbose_name='created date')),
+                ('modified_date', models.DateTimeField(auto_now=True, verbose_name='modified date')),
+                ('name', models.CharField(unique=True, verbose_name='name', max_length=20)),
+                ('version', models.CharField(blank=True, default='', verbose_name='version', max_length=32)),
+            ],
+            options={
+                'default_permissions': [],
+            },
+            bases=(models.Model,),
+        ),
+        migrations.RunPython( create_snapshot_versions ),
+    ]
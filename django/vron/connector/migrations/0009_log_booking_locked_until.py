@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connector', '0008_snapshotversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='log',
+            name='booking_locked_until',
+            field=models.DateTimeField(null=True, verbose_name='booking locked until', blank=True),
+            preserve_default=True,
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connector', '0009_log_booking_locked_until'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='key',
+            name='reseller_id',
+            field=models.CharField(max_length=20, null=True, verbose_name='reseller id', blank=True),
+            preserve_default=True,
+        ),
+    ]
@@ -43,6 +43,7 @@ class Key( BaseModel ):
 
     name = models.CharField( "name", max_length = 20 )
     comments = models.CharField( "comments", max_length = 255, blank = True, null = True )
+    reseller_id = models.CharField( "reseller id", max_length = 20, blank = True, null = True )
 
     # META Options
     class Meta:
@@ -60,11 +61,24 @@ class Log( BaseModel ):
     Stores every request received and set its status
     """
 
-    external_reference = models.CharField( "external reference", max_length = 40, blank = True, null = True )
+    REQUEST_TYPES = (
+        ( 'booking', 'Booking' ),
+        ( 'availability', 'Availability' ),
+        ( 'tour_list', 'Tour List' ),
+    )
+
+    external_reference = models.CharField( "external reference", max_length = 40, blank = True, null = True, unique = True )
     log_status = models.ForeignKey( 'LogStatus' )
     error_message = models.TextField( "error message", blank = True, null = True )
     ron_confirmation_number = models.IntegerField( "confirmation number", blank = True, null = True )
     attempts = models.IntegerField( "attempts", default = 1 )
+    request_type = models.CharField( "request type", max_length = 20, choices = REQUEST_TYPES, blank = True, null = True )
+    host_id = models.CharField( "host id", max_length = 20, blank = True, null = True )
+    duration = models.FloatField( "duration (s)", blank = True, null = True, db_index = True )
+    ron_time = models.FloatField( "RON time (s)", blank = True, null = True )
+    ron_calls = models.IntegerField( "RON calls", blank = True, null = True )
+    response_size = models.IntegerField( "response size (bytes)", blank = True, null = True )
+    booking_locked_until = models.DateTimeField( "booking locked until", blank = True, null = True )
 
     # META Options
     class Meta:
@@ -72,6 +86,9 @@ class Log( BaseModel ):
         permissions = (
             ( "admin_view_request", "ADMIN: Can view logs" ),
         )
+        index_together = [
+            ( 'log_status', 'id' ),
+        ]
 
     # Class Methods
     @staticmethod
@@ -87,12 +104,27 @@ class Log( BaseModel ):
             'log_status'
         ).only(
             'id', 'modified_date', 'external_reference', 'log_status__name',
-            'ron_confirmation_number'
+            'ron_confirmation_number', 'request_type', 'host_id', 'duration',
+            'ron_time', 'ron_calls', 'response_size'
         ).order_by(
             '-id'
         )
         return logs
 
+class SnapshotVersion( BaseModel ):
+    """
+    Version of the data every process keeps in memory (see connector.snapshots),
+    a new random token set in the same transaction as the data it versions
+    """
+
+    name = models.CharField( "name", max_length = 20, unique = True )
+    version = models.CharField( "version", max_length = 32, blank = True, default = '' )
+
+    # META Options
+    class Meta:
+        default_permissions = []
+
+
 class LogStatus( BaseModel ):
     """
     The status of a request: 'complete', 'received', 'error on ron call', etc.
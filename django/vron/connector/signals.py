@@ -0,0 +1,42 @@
+"""
+Signal handlers for the connector app
+
+"""
+
+##########################
+# Imports
+##########################
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from vron.connector.models import Config, Key
+from vron.connector.snapshots import config_snapshot, key_snapshot
+
+
+
+
+
+##########################
+# Signal handlers
+##########################
+@receiver( post_save, sender = Config )
+@receiver( post_delete, sender = Config )
+def config_changed( sender, **kwargs ):
+    """
+    Makes all processes reload their config snapshot
+
+    :param: sender
+    :return: None
+    """
+    config_snapshot.bump()
+
+
+@receiver( post_save, sender = Key )
+@receiver( post_delete, sender = Key )
+def key_changed( sender, **kwargs ):
+    """
+    Makes all processes reload their API key index
+
+    :param: sender
+    :return: None
+    """
+    key_snapshot.bump()
@@ -0,0 +1,180 @@
+"""
+Process-local snapshots of connector data (config options, API keys)
+
+Every process keeps its own copy of the data, so the API hot path doesn't
+load it from the DB. Whenever the data changes (signals on save/delete), its
+version (a SnapshotVersion row) gets a new token in the same transaction and every
+process reloads its copy the next time it checks the version, a single row
+read at most every SNAPSHOT_CHECK_INTERVAL seconds. The version is kept in the
+DB, not the cache, as the cache may be local to each process (see CACHES).
+"""
+
+##########################
+# Imports
+##########################
+from django.conf import settings
+from vron.connector.models import Config, Key, SnapshotVersion
+import threading
+import uuid
+import time
+
+
+
+
+
+##########################
+# Class definitions
+##########################
+class VersionedSnapshot( object ):
+    """
+    Process-local copy of data loaded from the DB, reloaded
+    when its version in the DB changes
+
+    """
+
+    def __init__( self, name, loader, check_interval ):
+        """
+        Constructor responsible to set class attributes
+
+        :param: String name
+        :param: Function loader - returns the data to be kept
+        :param: Integer check_interval - seconds between version checks
+        :return: None
+        """
+        self.name = name
+        self.loader = loader
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.data = None
+        self.version = None
+        self.checked_at = 0
+
+    def get_version( self ):
+        """
+        Returns the current version token of the data (empty if it was never changed)
+
+        :return: String
+        """
+        version = SnapshotVersion.objects.filter( name = self.name ).values_list( 'version', flat = True ).first()
+        return version or ''
+
+    def get( self, force = False ):
+        """
+        Returns the data, reloading it if it has changed
+
+        :param: Boolean force - checks the version now, ignoring the check interval
+        :return: Mixed
+        """
+        now = time.time()
+        if not force and self.data is not None and now - self.checked_at < self.check_interval:
+            return self.data
+        with self.lock:
+            if force or self.data is None or now - self.checked_at >= self.check_interval:
+
+                # Version is read before the data, so the data is never older than the version
+                version = self.get_version()
+                if self.data is None or version != self.version:
+                    self.data = self.loader()
+                    self.version = version
+                self.checked_at = now
+        return self.data
+
+    def bump( self ):
+        """
+        Marks the data as changed for all processes (called in the transaction
+        changing the data, so the new version is never seen before the data).
+        Tokens are random, so a rolled back change never reuses a version
+
+        :return: None
+        """
+        version = uuid.uuid4().hex
+        if not SnapshotVersion.objects.filter( name = self.name ).update( version = version ):
+            SnapshotVersion.objects.create( name = self.name, version = version )
+        with self.lock:
+            self.checked_at = 0
+
+
+
+
+
+class ExpiringSet( object ):
+    """
+    Small in-process set whose items expire after a timeout
+    (e.g. RON servers without multicall), cleared when it grows too big
+
+    """
+
+    def __init__( self, timeout, max_size ):
+        """
+        Constructor responsible to set class attributes
+
+        :param: Integer timeout - seconds an item is kept
+        :param: Integer max_size
+        :return: None
+        """
+        self.timeout = timeout
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.items = {}
+
+    def __contains__( self, item ):
+        expires_at = self.items.get( item )
+        return expires_at is not None and expires_at > time.time()
+
+    def add( self, item ):
+        """
+        Adds an item
+
+        :param: item
+        :return: None
+        """
+        with self.lock:
+            if len( self.items ) >= self.max_size:
+                self.items = {}
+            self.items[item] = time.time() + self.timeout
+
+    def clear( self ):
+        """
+        Removes all items
+
+        :return: None
+        """
+        with self.lock:
+            self.items = {}
+
+
+
+
+
+##########################
+# Function definitions
+##########################
+def load_config():
+    """
+    Returns all config options as a dictionary { id: value }
+
+    :return: Dictionary
+    """
+    config = {}
+    for config_option in Config.objects.all():
+        config[config_option.id] = config_option.value
+    return config
+
+
+def load_host_ids():
+    """
+    Returns all host ids with an API key
+
+    :return: Frozenset
+    """
+    return frozenset( Key.objects.values_list( 'name', flat = True ) )
+
+
+
+
+
+##########################
+# Snapshot instances
+##########################
+config_snapshot = VersionedSnapshot( 'config', load_config, settings.SNAPSHOT_CHECK_INTERVAL )
+key_snapshot = VersionedSnapshot( 'keys', load_host_ids, settings.SNAPSHOT_CHECK_INTERVAL )
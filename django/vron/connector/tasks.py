@@ -7,9 +7,17 @@ Tasks for the connector app, including celery tasks
 # Imports
 ##########################
 from __future__ import absolute_import
-#from celery import shared_task
-from django.db.models import F
-from vron.connector.models import Log
+from celery import shared_task
+from django.conf import settings
+from vron.connector.models import Key
+from vron.connector.log_writer import log_writer
+from vron.connector.snapshots import config_snapshot
+from vron.connector.api.catalogue import tour_catalogue
+from django.utils.encoding import force_text
+import xmlrpclib
+import httplib
+import logging
+import socket
 
 
 
@@ -18,22 +26,79 @@ from vron.connector.models import Log
 ##########################
 # Celery Tasks
 ##########################
-#@shared_task
-def log_request( external_reference, log_status_id, error_message, ron_confirmation_number ):
-
-    log, created = Log.objects.get_or_create(
-        external_reference = external_reference,
-        defaults = {
-            'external_reference': external_reference,
-            'log_status_id': log_status_id,
-            'error_message': error_message,
-            'ron_confirmation_number': ron_confirmation_number,
-            'attempts': 0,
-        }
-    )
-    if not created:
-        log.log_status_id = log_status_id
-        log.error_message = error_message
-        log.ron_confirmation_number = ron_confirmation_number
-        log.attempts = F( 'attempts' ) + 1
-        log.save()
\ No newline at end of file
+def log_request( external_reference, log_status_id, error_message, ron_confirmation_number, stats = None, wait = False ):
+    """
+    Logs a request event. Events are written in the background by the log
+    writer (or right away when LOG_ASYNC is off)
+
+    :param: String external_reference
+    :param: Integer log_status_id
+    :param: String error_message
+    :param: Integer ron_confirmation_number
+    :param: Dictionary stats - request stats written with the event (duration, RON calls, etc.)
+    :param: Boolean wait - writes the event right away
+    :return: None
+    """
+    if settings.LOG_ASYNC and not wait:
+        log_writer.enqueue( external_reference, log_status_id, error_message, ron_confirmation_number, stats )
+    else:
+        log_writer.write( [log_writer.get_event( external_reference, log_status_id, error_message, ron_confirmation_number, stats )] )
+
+
+@shared_task( ignore_result = True )
+def warm_tour_catalogues():
+    """
+    Reloads the tour catalogue of every host (periodic task), so
+    TourListRequests are served from the cache
+
+    Hosts are read from the keys, each one for the reseller recorded
+    on it (the default reseller when none is recorded yet). It only
+    helps the web processes when CACHES is a shared backend.
+    """
+
+    config = config_snapshot.get()
+    for host_id, reseller_id in Key.objects.values_list( 'name', 'reseller_id' ):
+        if reseller_id is None:
+            reseller_id = settings.TOUR_CATALOGUE_DEFAULT_RESELLER_ID
+        for mode in ( 'train', 'live' ):
+
+            # A host that can't be reloaded never stops the others
+            try:
+                tour_catalogue.refresh( config, mode, host_id, reseller_id )
+            except Exception:
+                logging.getLogger( __name__ ).exception( 'Tour catalogue of %s (%s) could not be reloaded', host_id, mode )
+
+
+@shared_task( bind = True, ignore_result = True, acks_late = True )
+def write_booking( self, record, mode ):
+    """
+    Makes a booking queued by a BookingRequest (async bookings) and logs
+    its result. When RON can't be reached it's retried with exponential
+    backoff, up to the max failed attempts set on the config, unless the
+    reservation was already sent (it may have been written in RON). Other
+    errors fail the booking right away
+
+    :param: Dictionary record - the booking fields (see viator.BookingRecord)
+    :param: String mode
+    :return: None
+    """
+    from vron.connector.api.api import Api # imported here, as the api module imports this one
+    from vron.connector.api.viator import BookingRecord
+
+    record = BookingRecord( **record )
+    api = Api( None, mode )
+    try:
+        api.queued_booking( record )
+    except ( socket.error, httplib.HTTPException, xmlrpclib.ProtocolError ) as error:
+        max_attempts = int( config_snapshot.get()[settings.ID_CONFIG_MAX_FAILED_ATTEMPTS] )
+        if api.ron.reservation_sent:
+            api.fail_queued_booking( record, u'RON connection error while writing the reservation (check RON '
+                                             u'before booking it again): ' + force_text( error ) )
+        elif self.request.retries + 1 < max_attempts:
+            countdown = settings.BOOKING_RETRY_DELAY * 2 ** self.request.retries
+            raise self.retry( exc = error, countdown = countdown, max_retries = max_attempts - 1 )
+        else:
+            api.fail_queued_booking( record, force_text( error ) )
+    except Exception as error:
+        logging.getLogger( __name__ ).exception( 'Queued booking %s failed', record.external_reference )
+        api.fail_queued_booking( record, force_text( error ) )
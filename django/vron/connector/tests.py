@@ -0,0 +1,435 @@
+"""
+Connector Tests
+
+Requests are sent through the Api to the stand-in RON server of the
+benchmarks (see vron.connector.benchmark.ron_server), on the test database
+
+"""
+
+##########################
+# Imports
+##########################
+from django.test import TestCase, TransactionTestCase, RequestFactory
+from django.db import connection
+from django.conf import settings
+from django.test.utils import override_settings
+from django.core.cache import cache
+from lxml import etree
+from vron.connector.api.api import Api
+from vron.connector.api.booking_guard import booking_guard
+from vron.connector.api.catalogue import tour_catalogue
+from vron.connector.api.ron_pool import RonConnectionPool, ron_pool
+from vron.connector.api.availability import AvailabilityOptions, availability_cache, get_tour_dates
+from vron.connector.api.ron_executor import RonExecutor
+from vron.connector.api.ron_metrics import get_fault_class
+from vron.connector.api.ron import RonBatch
+from vron.connector.benchmark.ron_server import RonServer
+from vron.connector.benchmark import samples
+from vron.connector.management.commands.benchmark import Command, HOST_ID, RESELLER_ID
+from vron.connector.snapshots import VersionedSnapshot, config_snapshot, key_snapshot, load_host_ids
+from vron.connector.tasks import write_booking, warm_tour_catalogues
+from vron.connector.tracing import tracer
+from vron.connector import views
+from vron.connector.models import Log, Key
+import threading
+import datetime
+import time
+import xmlrpclib
+import socket
+
+
+
+
+
+##########################
+# Class definitions
+##########################
+class RonServerMixin( object ):
+    """
+    Test case with a stand-in RON server and an API key for it
+
+    """
+    ron_latency = 0
+
+    def setUp( self ):
+        cache.clear()
+        self.ron_server = RonServer( latency = self.ron_latency, tour_count = 2 )
+        self.ron_server.start()
+        self.first_confirmation_number = self.ron_server.confirmation_number
+        self.api_key = Command().setup( self.ron_server.get_url() )
+        config_snapshot.get( True )
+        key_snapshot.get( True )
+
+    def tearDown( self ):
+        ron_pool.clear()
+        self.ron_server.stop()
+
+    def get_booking_request( self, external_reference ):
+        """
+        Returns a BookingRequest for the first tour of the RON server
+
+        :param: String external_reference
+        :return: String
+        """
+        return samples.booking_request( self.api_key, HOST_ID, RESELLER_ID, external_reference, self.ron_server.tour_codes[0] )
+
+    def book( self, external_reference ):
+        """
+        Sends a BookingRequest and returns the response
+
+        :param: String external_reference
+        :return: String
+        """
+        return Api( self.get_booking_request( external_reference ), 'train' ).process()
+
+    def get_confirmation_number( self, response ):
+        """
+        Returns the SupplierConfirmationNumber of a BookingResponse (or None)
+
+        :param: String response
+        :return: Mixed
+        """
+        values = etree.fromstring( response ).xpath( '//*[local-name()="SupplierConfirmationNumber"]/text()' )
+        return values[0] if values else None
+
+    def get_reservation_count( self ):
+        """
+        Returns the reservations written in the RON server
+
+        :return: Integer
+        """
+        return self.ron_server.confirmation_number - self.first_confirmation_number
+
+
+@override_settings( LOG_ASYNC = False )
+class RonServerTestCase( RonServerMixin, TestCase ):
+    """
+    Test case with a stand-in RON server, in a transaction
+
+    """
+    pass
+
+
+class BookingGuardTest( RonServerTestCase ):
+    """
+    Duplicate BookingRequests (same ExternalReference) never write a second reservation
+
+    """
+
+    def test_completed_duplicate( self ):
+        confirmation_number = self.get_confirmation_number( self.book( 'guard-completed' ) )
+        self.assertTrue( confirmation_number )
+        self.assertEqual( self.get_confirmation_number( self.book( 'guard-completed' ) ), confirmation_number )
+
+        # Also once the cached confirmation is gone (read from the request log)
+        cache.clear()
+        self.assertEqual( self.get_confirmation_number( self.book( 'guard-completed' ) ), confirmation_number )
+        self.assertEqual( self.get_reservation_count(), 1 )
+
+    def test_duplicate_in_flight( self ):
+        self.addCleanup( setattr, booking_guard, 'wait_timeout', booking_guard.wait_timeout )
+        booking_guard.wait_timeout = 0
+        self.assertTrue( booking_guard.acquire( 'guard-in-flight' ) )
+        response = self.book( 'guard-in-flight' )
+        self.assertIn( b'VRONERR005', response )
+        self.assertEqual( self.get_reservation_count(), 0 )
+
+    def test_duplicate_held( self ):
+
+        # A queued booking held by another process (on its request log) is never written again
+        response = self.book( 'guard-held' )
+        Log.objects.filter( external_reference = 'guard-held' ).update( ron_confirmation_number = None )
+        cache.clear()
+        booking_guard.hold( 'guard-held', 60 )
+        self.addCleanup( setattr, booking_guard, 'wait_timeout', booking_guard.wait_timeout )
+        booking_guard.wait_timeout = 0
+        self.assertIn( b'VRONERR005', self.book( 'guard-held' ) )
+        self.assertEqual( self.get_reservation_count(), 1 )
+
+
+@override_settings( LOG_ASYNC = False, CACHES = { 'default': { 'BACKEND': 'django.core.cache.backends.dummy.DummyCache' } } )
+class ConcurrentBookingTest( RonServerMixin, TransactionTestCase ):
+    """
+    Concurrent duplicates (each with its own DB connection and no shared cache,
+    like requests on different processes) write a single reservation
+
+    """
+    serialized_rollback = True
+    ron_latency = 0.3
+
+    def test_concurrent_duplicate( self ):
+        responses = []
+        def book():
+            try:
+                responses.append( self.book( 'guard-concurrent' ) )
+            finally:
+                connection.close()
+        datetime.datetime.strptime( '2015-01-01', '%Y-%m-%d' ) # imports _strptime before the threads (Python issue 7980)
+        threads = [threading.Thread( target = book ) for i in range( 2 )]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        confirmation_numbers = [self.get_confirmation_number( response ) for response in responses]
+        self.assertEqual( len( confirmation_numbers ), 2 )
+        self.assertTrue( confirmation_numbers[0] )
+        self.assertEqual( confirmation_numbers[0], confirmation_numbers[1] )
+        self.assertEqual( self.get_reservation_count(), 1 )
+
+
+class QueuedBookingTest( RonServerTestCase ):
+    """
+    The write_booking task (async bookings) writes a reservation once, even when run again
+
+    """
+
+    def get_record( self, external_reference ):
+        """
+        Returns the booking fields sent to the write_booking task
+
+        :param: String external_reference
+        :return: Dictionary
+        """
+        api = Api( self.get_booking_request( external_reference ), 'train' )
+        return dict( api.viator.get_booking_record()._asdict() )
+
+    def test_repeated_task( self ):
+        record = self.get_record( 'queued-repeated' )
+        write_booking( record, 'train' )
+        write_booking( record, 'train' )
+        self.assertEqual( self.get_reservation_count(), 1 )
+        self.assertEqual(
+            set( Log.objects.filter( external_reference = 'queued-repeated' ).values_list( 'ron_confirmation_number', flat = True ) ),
+            set( [self.first_confirmation_number + 1] )
+        )
+
+    def test_connection_error( self ):
+
+        # RON can't be reached: the error is raised (so the task is retried) and the booking stays in flight
+        record = self.get_record( 'queued-unreachable' )
+        self.assertTrue( booking_guard.acquire( 'queued-unreachable', False ) )
+        booking_guard.hold( 'queued-unreachable', 60 )
+        ron_pool.clear()
+        self.ron_server.stop()
+        with self.assertRaises( socket.error ):
+            write_booking( record, 'train' )
+        self.assertFalse( booking_guard.acquire( 'queued-unreachable', False ) )
+
+
+class TourListTest( RonServerTestCase ):
+    """
+    Streamed tour lists are always logged, and only cached when complete
+
+    """
+
+    def get_tour_list( self, external_reference ):
+        """
+        Sends a TourListRequest and returns the Api and its (streamed) response
+
+        :param: String external_reference
+        :return: Tuple
+        """
+        api = Api( samples.tour_list_request( self.api_key, HOST_ID, RESELLER_ID, external_reference ), 'train' )
+        return api, api.process()
+
+    def get_log( self, external_reference ):
+        """
+        Returns the request log of a reference
+
+        :param: String external_reference
+        :return: Log
+        """
+        return Log.objects.get( external_reference = external_reference )
+
+    def test_complete( self ):
+        api, response = self.get_tour_list( 'tour-list-complete' )
+        content = b''.join( response )
+        self.assertEqual( len( etree.fromstring( content ).xpath( '//*[local-name()="Tour"]' ) ), 2 )
+        log = self.get_log( 'tour-list-complete' )
+        self.assertEqual( log.log_status_id, settings.ID_LOG_STATUS_COMPLETE_APPROVED )
+        self.assertEqual( log.response_size, len( content ) )
+        self.assertTrue( tour_catalogue.get( 'train', api.ron.host_id, RESELLER_ID ) )
+
+    def test_warm( self ):
+
+        # The periodic task (another process, own cache) warms the reseller recorded on the key
+        b''.join( self.get_tour_list( 'tour-list-warm' )[1] )
+        self.assertEqual( Key.objects.get( name = HOST_ID ).reseller_id, RESELLER_ID )
+        cache.clear()
+        warm_tour_catalogues()
+        self.assertTrue( tour_catalogue.get( 'train', HOST_ID, RESELLER_ID ) )
+
+    def test_not_read( self ):
+
+        # The response is never read (the client went away before it): logged as pending, with its stats
+        api, response = self.get_tour_list( 'tour-list-not-read' )
+        log = self.get_log( 'tour-list-not-read' )
+        self.assertEqual( log.log_status_id, settings.ID_LOG_STATUS_PENDING )
+        self.assertEqual( log.request_type, 'tour_list' )
+        self.assertEqual( log.host_id, HOST_ID )
+
+    def test_closed( self ):
+
+        # The client goes away after the first part
+        api, response = self.get_tour_list( 'tour-list-closed' )
+        first_part = next( response )
+        response.close()
+        log = self.get_log( 'tour-list-closed' )
+        self.assertEqual( log.log_status_id, settings.ID_LOG_STATUS_ERROR )
+        self.assertEqual( log.response_size, len( first_part ) )
+        self.assertIsNone( tour_catalogue.get( 'train', api.ron.host_id, RESELLER_ID ) )
+
+    def test_error( self ):
+        api = Api( samples.tour_list_request( self.api_key, HOST_ID, RESELLER_ID, 'tour-list-error' ), 'train' )
+        api.deferred_log = []
+        def read_tours():
+            yield { 'tour': { 'tour_code': 'BENCH0001' } }
+        content = b''.join( api.stream_tour_list( read_tours(), True ) )
+
+        # Still a well formed document, without the tour that failed
+        self.assertEqual( etree.fromstring( content ).xpath( '//*[local-name()="Tour"]' ), [] )
+        self.assertEqual( self.get_log( 'tour-list-error' ).log_status_id, settings.ID_LOG_STATUS_ERROR )
+        self.assertIsNone( tour_catalogue.get( 'train', api.ron.host_id, RESELLER_ID ) )
+
+
+class AvailabilityCacheTest( RonServerTestCase ):
+    """
+    Availability is read chunk by chunk, from the cache and RON, in the options order
+
+    """
+
+    def test_partly_cached( self ):
+        api = Api( samples.availability_request( self.api_key, HOST_ID, RESELLER_ID, 'availability-cached', self.ron_server.tour_codes[0] ), 'train' )
+        api.ron.host_id = HOST_ID
+        self.assertTrue( api.ron.login( RESELLER_ID ) )
+        options = AvailabilityOptions( HOST_ID, self.ron_server.tour_codes[0], get_tour_dates(
+            '2015-Jan-01', datetime.date( 2015, 1, 1 ), datetime.date( 2015, 1, 10 )
+        ) )
+        options.add_product( 1, 1, 1 )
+        options.add_product( 2, 2, 1 )
+        results, errors = availability_cache.read( api.ron, options, 4 )
+        self.assertEqual( errors, [] )
+        self.assertEqual( len( results ), 20 )
+
+        # Only the chunk with the slot booked is read again
+        availability_cache.delete( 'train', HOST_ID, self.ron_server.tour_codes[0], 2, 2, 1, '2015-Jan-05' )
+        call_count = api.ron.call_count
+        self.assertEqual( availability_cache.read( api.ron, options, 4 ), ( results, [] ) )
+        self.assertEqual( api.ron.call_count - call_count, 1 )
+
+
+class RonFaultTest( RonServerTestCase ):
+    """
+    RON faults (any text) are answered as rejected bookings
+
+    """
+
+    def test_non_ascii_fault_class( self ):
+        self.assertEqual( get_fault_class( u'Insufficient pickup \xe0 l\'h\xf4tel' ), 'insufficient_pickup' )
+        self.assertEqual( get_fault_class( u'R\xe9servation refus\xe9e' ), 'other' )
+
+    def test_non_ascii_fault( self ):
+        def write_reservation( *params ):
+            raise xmlrpclib.Fault( 1, u'R\xe9servation refus\xe9e' )
+        self.ron_server.register_function( write_reservation, 'writeReservation' )
+        self.assertIn( b'REJECTED', self.book( 'fault-non-ascii' ) )
+        self.assertEqual( self.get_reservation_count(), 0 )
+
+    def test_non_ascii_multicall_fault( self ):
+        batch = RonBatch( None )
+        self.assertFalse( batch.is_unknown_method( xmlrpclib.Fault( 1, u'Donn\xe9es invalides' ) ) )
+        self.assertTrue( batch.is_unknown_method( xmlrpclib.Fault( 1, u'Method not found: m\xe9thode' ) ) )
+
+
+class RonConnectionPoolTest( TestCase ):
+    """
+    Pooled RON connections never wait longer than the socket timeout
+
+    """
+
+    def test_socket_timeout( self ):
+        ron_server = RonServer( latency = 1, tour_count = 1 )
+        ron_server.start()
+        self.addCleanup( ron_server.stop )
+        pool = RonConnectionPool( 1, 60, 0.2 )
+        transport = pool.acquire( ron_server.get_url() )
+        self.addCleanup( pool.discard, transport )
+        ron = xmlrpclib.ServerProxy( ron_server.get_url(), transport = transport )
+        with self.assertRaises( socket.timeout ):
+            ron.login( 'username', 'password', RESELLER_ID )
+
+
+class RonExecutorTest( TestCase ):
+    """
+    A slow RON host never takes the executor threads shared with the other hosts
+
+    """
+
+    def test_slow_host( self ):
+        executor = RonExecutor( 2, 4 )
+        released = threading.Event()
+        self.addCleanup( released.set )
+        started = threading.Semaphore( 0 )
+        def slow_call( item ):
+            started.release()
+            released.wait( 5 )
+        slow = threading.Thread( target = executor.map, args = ( 'http://slow.example', slow_call, range( 6 ) ) )
+        slow.daemon = True
+        slow.start()
+        started.acquire()
+        started.acquire()
+
+        # Its calls beyond max_in_flight wait in its own thread, not on the pool
+        started_at = time.time()
+        self.assertEqual( executor.map( 'http://fast.example', lambda item: item * 2, range( 4 ) ), [0, 2, 4, 6] )
+        self.assertLess( time.time() - started_at, 1 )
+        released.set()
+        slow.join()
+
+
+@override_settings( IS_PROD = True, INTERNAL_IPS = ( '10.0.0.1', ) )
+class ForcedTraceTest( TestCase ):
+    """
+    Only internal IPs can force a request trace to be written
+
+    """
+
+    def get_traces( self, ip ):
+        """
+        Sends a request asking for its trace and returns the traces written
+
+        :param: String ip
+        :return: List
+        """
+        traces = []
+        self.addCleanup( setattr, tracer, 'sample_rate', tracer.sample_rate )
+        tracer.sample_rate = 0
+        tracer.write = traces.append
+        self.addCleanup( delattr, tracer, 'write' )
+        views.api( RequestFactory().get( '/api/?trace', REMOTE_ADDR = ip ) )
+        return traces
+
+    def test_internal_ip( self ):
+        self.assertEqual( len( self.get_traces( '10.0.0.1' ) ), 1 )
+
+    def test_other_ip( self ):
+        self.assertEqual( self.get_traces( '203.0.113.9' ), [] )
+
+
+class SnapshotTest( TestCase ):
+    """
+    Changes reach the snapshots of every process (versions are kept in the DB, not the cache)
+
+    """
+
+    def test_version_in_db( self ):
+
+        # Another process' snapshot: its own copy and no shared cache
+        snapshot = VersionedSnapshot( 'keys', load_host_ids, 0 )
+        self.assertNotIn( 'SNAPSHOTHOST', snapshot.get() )
+        key = Key.objects.create( name = 'SNAPSHOTHOST' )
+        cache.clear()
+        self.assertIn( 'SNAPSHOTHOST', snapshot.get() )
+        key.delete()
+        cache.clear()
+        self.assertNotIn( 'SNAPSHOTHOST', snapshot.get() )
@@ -0,0 +1,297 @@
+"""
+Request Tracing
+
+Breaks API requests down into timed spans (xml parse, config load, key
+validation, RON login, each RON call, response serialization and log
+writes). Every request is traced in memory; sampled and slow ones are
+written to a rotating JSON lines file, and the traces of a request can be
+read back by its correlation id (the ExternalReference).
+
+The current trace is kept per thread, so spans can be opened anywhere
+with the module-level 'span' function (doing nothing when there's none).
+
+"""
+
+##########################
+# Imports
+##########################
+from django.conf import settings
+from contextlib import contextmanager
+from functools import wraps
+from logging.handlers import RotatingFileHandler
+import threading
+import logging
+import random
+import json
+import uuid
+import time
+import io
+import os
+
+
+
+
+
+##########################
+# Class definitions
+##########################
+class Trace( object ):
+    """
+    Spans of a single request
+
+    """
+
+    def __init__( self, name, sampled = False ):
+        """
+        Constructor responsible to set class attributes
+
+        :param: String name - request name (e.g. 'api')
+        :param: Boolean sampled - always written (not only when slow)
+        :return: None
+        """
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.sampled = sampled
+        self.correlation_id = None
+        self.started = time.time()
+        self.duration = None
+        self.spans = []
+
+    @contextmanager
+    def span( self, name, **attributes ):
+        """
+        Times a block of code as a span
+
+        :param: String name
+        :param: Dictionary attributes - extra information to be stored
+        :return: Dictionary - the span (attributes can be added while it's open)
+        """
+        start = time.time()
+        span = { 'name': name, 'start': round( ( start - self.started ) * 1000, 3 ) }
+        if attributes:
+            span['attributes'] = attributes
+        try:
+            yield span
+        finally:
+            span['duration'] = round( ( time.time() - start ) * 1000, 3 )
+            self.spans.append( span )
+
+    def add_span( self, name, start, duration, **attributes ):
+        """
+        Adds a span already timed
+
+        :param: String name
+        :param: Float start - time it started
+        :param: Float duration - seconds
+        :param: Dictionary attributes
+        :return: None
+        """
+        span = { 'name': name, 'start': round( ( start - self.started ) * 1000, 3 ), 'duration': round( duration * 1000, 3 ) }
+        if attributes:
+            span['attributes'] = attributes
+        self.spans.append( span )
+
+    def finish( self ):
+        """
+        Ends the trace
+
+        :return: None
+        """
+        if self.duration is None:
+            self.duration = time.time() - self.started
+
+    def to_dict( self ):
+        """
+        Returns the trace as a dictionary (durations in milliseconds)
+
+        :return: Dictionary
+        """
+        return {
+            'trace_id': self.trace_id,
+            'correlation_id': self.correlation_id,
+            'name': self.name,
+            'started': self.started,
+            'duration': round( ( self.duration or 0 ) * 1000, 3 ),
+            'spans': sorted( self.spans, key = lambda span: span['start'] ),
+        }
+
+
+class Tracer( object ):
+    """
+    Starts traces, keeps the current one per thread and writes them
+
+    """
+
+    def __init__( self, path, sample_rate, slow_threshold, max_bytes, backup_count ):
+        """
+        Constructor responsible to set class attributes
+
+        :param: String path - JSON lines file
+        :param: Float sample_rate - share of the requests always written (0 to 1)
+        :param: Float slow_threshold - seconds after which a request is always written
+        :param: Integer max_bytes - size the file is rotated at
+        :param: Integer backup_count - rotated files kept
+        :return: None
+        """
+        self.path = path
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.logger = None
+
+    def start( self, name, sampled = None ):
+        """
+        Starts a trace and makes it the current one of this thread
+
+        :param: String name
+        :param: Boolean sampled - None samples it randomly
+        :return: Trace
+        """
+        if sampled is None:
+            sampled = random.random() < self.sample_rate
+        trace = Trace( name, sampled )
+        self.activate( trace )
+        return trace
+
+    def activate( self, trace ):
+        """
+        Makes a trace the current one of this thread (e.g. a thread
+        working for the request), None clears it
+
+        :param: Trace trace
+        :return: None
+        """
+        self.local.trace = trace
+
+    def get_current( self ):
+        """
+        Returns the current trace of this thread (or None)
+
+        :return: Mixed
+        """
+        return getattr( self.local, 'trace', None )
+
+    def finish( self, trace ):
+        """
+        Ends a trace, writing it when sampled or slow
+
+        :param: Trace trace
+        :return: None
+        """
+        trace.finish()
+        if self.get_current() is trace:
+            self.activate( None )
+        if trace.sampled or trace.duration >= self.slow_threshold:
+            self.write( trace )
+
+    def get_logger( self ):
+        """
+        Returns the logger writing to the rotating traces file
+
+        :return: Logger
+        """
+        if self.logger is None:
+            with self.lock:
+                if self.logger is None:
+                    directory = os.path.dirname( self.path )
+                    if directory and not os.path.isdir( directory ):
+                        os.makedirs( directory )
+                    handler = RotatingFileHandler( self.path, maxBytes = self.max_bytes, backupCount = self.backup_count )
+                    handler.setFormatter( logging.Formatter( '%(message)s' ) )
+                    logger = logging.getLogger( 'vron.traces' )
+                    logger.propagate = False
+                    logger.setLevel( logging.INFO )
+                    logger.addHandler( handler )
+                    self.logger = logger
+        return self.logger
+
+    def write( self, trace ):
+        """
+        Writes a trace to the file (one JSON object per line)
+
+        :param: Trace trace
+        :return: None
+        """
+        try:
+            self.get_logger().info( json.dumps( trace.to_dict(), default = str ) )
+        except Exception:
+            logging.getLogger( __name__ ).exception( 'Could not write trace %s', trace.trace_id )
+
+    def read( self, correlation_id, limit = 20 ):
+        """
+        Returns the traces written for a correlation id, newest first
+
+        :param: String correlation_id
+        :param: Integer limit
+        :return: List of dictionaries
+        """
+        traces = []
+        needle = json.dumps( correlation_id )
+        paths = [self.path] + ['{0}.{1}'.format( self.path, i ) for i in range( 1, self.backup_count + 1 )]
+        for path in paths:
+            if not os.path.isfile( path ):
+                continue
+            with io.open( path, encoding = 'utf-8' ) as trace_file:
+                found = [json.loads( line ) for line in trace_file if needle in line]
+            found = [trace for trace in found if trace.get( 'correlation_id' ) == correlation_id]
+            traces.extend( reversed( found ) )
+            if len( traces ) >= limit:
+                break
+        return traces[:limit]
+
+
+
+
+
+##########################
+# Tracer instance
+##########################
+tracer = Tracer(
+    settings.TRACE_FILE,
+    settings.TRACE_SAMPLE_RATE,
+    settings.TRACE_SLOW_THRESHOLD,
+    settings.TRACE_MAX_BYTES,
+    settings.TRACE_BACKUP_COUNT
+)
+
+
+
+
+
+##########################
+# Function definitions
+##########################
+@contextmanager
+def span( name, **attributes ):
+    """
+    Times a block of code as a span of the current trace (if there's one)
+
+    :param: String name
+    :param: Dictionary attributes
+    :return: Mixed - the span Dictionary, None when there's no trace
+    """
+    trace = tracer.get_current()
+    if trace is None:
+        yield None
+    else:
+        with trace.span( name, **attributes ) as current_span:
+            yield current_span
+
+
+def traced( name ):
+    """
+    Decorator timing every call of a function as a span of the current trace
+
+    :param: String name
+    :return: Function
+    """
+    def decorator( function ):
+        @wraps( function )
+        def wrapper( *args, **kwargs ):
+            with span( name ):
+                return function( *args, **kwargs )
+        return wrapper
+    return decorator
@@ -21,4 +21,7 @@ urlpatterns = patterns('',
     # API
     url( r'^api/$', views.api, name = 'api' ),
 
+    # Metrics
+    url( r'^metrics/$', views.metrics, name = 'metrics' ),
+
 )
\ No newline at end of file
@@ -7,9 +7,14 @@ These are the views that control the requests received
 ##########################
 # Imports
 ##########################
-from django.http import HttpResponse
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import six
 from django.views.decorators.csrf import csrf_exempt
 from vron.connector.api.api import Api
+from vron.connector.api.ron_metrics import ron_metrics
+from vron.core.decorators import restrict_internal_ips, is_internal_ip
+from vron.connector.tracing import tracer
 import requests
 
 
@@ -44,8 +49,48 @@ def api( request ):
     else:
         config = 'train'
 
-    # Handles API request
-    api = Api( xml_raw, config )
+    # Traces the request (always written when 'trace' is in the query string of an internal IP, like the metrics)
+    trace = tracer.start( 'api', True if 'trace' in request.GET and is_internal_ip( request ) else None )
+    try:
 
-    # Returns XML response
-    return HttpResponse( api.process(), content_type = "application/xml" )
\ No newline at end of file
+        # Handles API request (bookings are queued when async, unless the caller asks for 'sync')
+        async_booking = settings.BOOKING_ASYNC and 'sync' not in request.GET
+        api = Api( xml_raw, config, async_booking )
+        trace.correlation_id = api.viator.get_external_reference()
+        content = api.process()
+    except Exception:
+        tracer.finish( trace )
+        raise
+
+    # Returns XML response (large ones are streamed while they're built)
+    if isinstance( content, six.binary_type ):
+        tracer.finish( trace )
+        return HttpResponse( content, content_type = "application/xml" )
+    return StreamingHttpResponse( stream_traced( content, trace ), content_type = "application/xml" )
+
+
+def stream_traced( content, trace ):
+    """
+    Streams a response, keeping its trace open until it's all sent
+
+    :param: Iterable content
+    :param: Trace trace
+    :return: Generator
+    """
+    tracer.activate( trace )
+    try:
+        for part in content:
+            yield part
+    finally:
+        tracer.finish( trace )
+
+
+@restrict_internal_ips
+def metrics( request ):
+    """
+    Exports the RON call metrics of this process (Prometheus text format)
+
+    :param: request
+    :return: String
+    """
+    return HttpResponse( ron_metrics.export(), content_type = "text/plain; version=0.0.4; charset=utf-8" )
@@ -29,6 +29,24 @@ from django.utils.decorators import available_attrs
 ##########################
 # Function definitions
 ##########################
+def is_internal_ip( request ):
+    """
+    Checks if the request comes from one of the internal IPs defined in
+    settings (any IP is accepted when not on the production server)
+
+    :param: request
+    :return: Boolean
+    """
+
+    # Pre-process the IP address
+    x_forwarded_for = request.META.get( 'HTTP_X_FORWARDED_FOR' )
+    if x_forwarded_for:
+        ip = x_forwarded_for.split(',')[0]
+    else:
+        ip = request.META.get( 'REMOTE_ADDR' )
+    return ip in settings.INTERNAL_IPS or settings.IS_PROD != True
+
+
 def restrict_internal_ips( view_func ):
     """
     A view decorator which returns the provided view function,
@@ -39,16 +57,9 @@ def restrict_internal_ips( view_func ):
     @wraps( view_func, assigned = available_attrs( view_func ) )
     def _wrapped_view( request, *args, **kwargs ):
 
-        # Pre-process the IP address
-        x_forwarded_for = request.META.get( 'HTTP_X_FORWARDED_FOR' )
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get( 'REMOTE_ADDR' )
-        
         # If current IP is not in the internal ips list and I am on the
         # production server, redirects the user to the home.
-        if ip not in settings.INTERNAL_IPS and settings.IS_PROD == True:
+        if not is_internal_ip( request ):
             return HttpResponseRedirect( reverse( 'site:home' ) )
         return view_func( request, *args, **kwargs )
 
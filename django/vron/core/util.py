@@ -178,6 +178,8 @@ def build_datatable_json( request, objects, info, support = ['edit', 'delete'] )
                 values.append( str( value ) )
             else:
                 value = getattr( obj, field )
+                if value is None:
+                    value = ''
                 if 'prepend' in info and field in info['prepend']:
                     value = info['prepend'][field] + value
                 values.append( str( value ) )
@@ -249,6 +251,25 @@ def get_list_or_false( klass, *args, **kwargs ):
 
 
 
+##########################
+# Class definitions
+##########################
+class FrozenDict( dict ):
+    """
+    Read-only dictionary, for module level constants shared by
+    all requests (and threads) of a process
+
+    """
+
+    def read_only( self, *args, **kwargs ):
+        raise TypeError( 'FrozenDict is read-only' )
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = read_only
+
+
+
+
+
 ###########################
 # DEBUGGING FUNCTIONS 
 ###########################